@@ -0,0 +1,228 @@
+"""コレクターの負荷ベンチマーク
+
+bench/fake_vrchat.py のフェイクサーバーを同じプロセス内で起動し、本物の VRChatAPI・collector を
+そこへ向けて（VRC_API_BASE_URL）ログイン → discover_instances → collect_metrics を繰り返す。
+サイクルごとの所要時間・実際に出たリクエストレート・保存サンプル数/秒・429 の回数を JSON のレポートに書き出す。
+--replicas N ではレプリカ（VRChatAPI と DB 接続を別々に持つスレッド）を N 個同時に回し、
+リースによる分担で重複取得（duplicates）が出ないことと、スループットの伸びを確認できる。
+
+使い方（apps/backend で実行。接続先は DB_HOST / DB_PORT / DB_USER / DB_PASSWORD）:
+    python bench/collector_load.py --instances 200 --latency-ms 150 --client-rps 5 --concurrency 8
+    python bench/collector_load.py --replay recorded.jsonl --group-id grp_xxx --speed 60
+    python bench/collector_load.py --instances 200 --client-rps 5 --replicas 4
+
+--database（デフォルト vrc_monitor_bench）は毎回作り直すので、本番のデータベースは指定しないこと。
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from fake_vrchat import FakeVRChat, Replay, SyntheticGroup
+from read_path import BENCH_DIR, INIT_SQL, git_commit, reset_database
+
+
+def prepare_database() -> None:
+    """スキーマを作り、既存データを消す"""
+    from db import Database
+
+    db = Database()
+    if not db.connect():
+        sys.exit("cannot connect to benchmark database")
+    with db.conn.cursor() as cur:
+        cur.execute(INIT_SQL.read_text())
+    db.conn.commit()
+    db.run_migrations()
+    with db.conn.cursor() as cur:
+        cur.execute("""
+            TRUNCATE instances, metrics, event_groups,
+                     metrics_rollup_1m, metrics_rollup_15m, metrics_rollup_1h,
+                     instance_leases, collector_replicas
+            RESTART IDENTITY CASCADE
+        """)
+    db.conn.commit()
+    db.close()
+
+
+def count_metrics(db) -> dict[int, int]:
+    """インスタンスごとの metrics 行数"""
+    with db.conn.cursor() as cur:
+        cur.execute("SELECT instance_id, COUNT(*) FROM metrics GROUP BY instance_id")
+        counts = dict(cur.fetchall())
+    db.conn.commit()
+    return counts
+
+
+def run(args, fake: FakeVRChat) -> dict:
+    # collector のモジュール定数は import 時に環境変数を読むため、ここで初めて import する
+    import collector
+    from db import Database
+    from vrc_api import VRChatAPI
+
+    # レプリカごとに別のクライアント（= 別のレート予算）と DB 接続を持たせる
+    replicas = []
+    for n in range(args.replicas):
+        db = Database()
+        if not db.connect():
+            sys.exit("cannot connect to benchmark database")
+        replicas.append((f"bench-{n}", VRChatAPI(), db))
+    api, db = replicas[0][1], replicas[0][2]
+
+    started = time.perf_counter()
+    for _, replica_api, _ in replicas:
+        if not replica_api.login():
+            sys.exit("login to fake VRChat API failed")
+    login_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    collector.discover_instances(api, db, [args.group_id])
+    discover_seconds = time.perf_counter() - started
+    active = len(db.get_active_instances())
+    for replica_id, _, replica_db in replicas:
+        replica_db.heartbeat_replica(replica_id)
+
+    def collect(replica) -> None:
+        replica_id, replica_api, replica_db = replica
+        # サイクルを間隔なしで回すため、取得済みのインスタンスもすぐ次のサイクルの対象にする
+        collector.collect_metrics(replica_api, replica_db, poll_interval=0, replica_id=replica_id)
+
+    cycles = []
+    pool = ThreadPoolExecutor(max_workers=len(replicas))
+    for n in range(args.cycles):
+        requests_before = dict(fake.stats)
+        rows_before = count_metrics(db)
+        started = time.perf_counter()
+        list(pool.map(collect, replicas))
+        elapsed = time.perf_counter() - started
+        rows_after = count_metrics(db)
+        per_instance = [rows_after[i] - rows_before.get(i, 0) for i in rows_after]
+        saved = sum(per_instance)
+        duplicates = sum(max(count - 1, 0) for count in per_instance)
+
+        def delta(key):
+            return fake.stats.get(key, 0) - requests_before.get(key, 0)
+
+        cycles.append({
+            "cycle": n + 1,
+            "seconds": round(elapsed, 3),
+            "requests": delta("requests"),
+            "requests_per_second": round(delta("requests") / elapsed, 2),
+            "rate_limited": delta("rate_limited"),
+            "logins": delta("logins"),
+            "samples": saved,
+            "samples_per_second": round(saved / elapsed, 2),
+            "duplicates": duplicates,
+        })
+        c = cycles[-1]
+        print(f"  cycle {c['cycle']:>3}: {c['seconds']:>7.2f} s  {c['requests_per_second']:>7.2f} req/s  "
+              f"{c['samples']:>5} samples ({c['samples_per_second']:.1f}/s)  "
+              f"429={c['rate_limited']} logins={c['logins']} duplicates={c['duplicates']}")
+        if args.interval and n + 1 < args.cycles:
+            time.sleep(args.interval)
+    pool.shutdown()
+
+    for replica_id, replica_api, replica_db in replicas:
+        replica_db.remove_replica(replica_id)
+        replica_db.close()
+        replica_api.close()
+
+    total_seconds = sum(c["seconds"] for c in cycles) or 1e-6
+    return {
+        "active_instances": active,
+        "login_seconds": round(login_seconds, 3),
+        "discover_seconds": round(discover_seconds, 3),
+        "cycles": cycles,
+        "summary": {
+            "median_cycle_seconds": sorted(c["seconds"] for c in cycles)[len(cycles) // 2] if cycles else None,
+            "requests_per_second": round(sum(c["requests"] for c in cycles) / total_seconds, 2),
+            "samples_per_second": round(sum(c["samples"] for c in cycles) / total_seconds, 2),
+            "coverage": round(sum(c["samples"] for c in cycles) / max(active * len(cycles), 1), 3),
+            "rate_limited": sum(c["rate_limited"] for c in cycles),
+            "duplicates": sum(c["duplicates"] for c in cycles),
+        },
+        "server_stats": dict(fake.stats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=5, help="collect_metrics の実行回数")
+    parser.add_argument("--interval", type=float, default=0.0, help="サイクル間の待ち時間（秒）")
+    parser.add_argument("--group-id", default="grp_00000000-0000-0000-0000-000000000000")
+    parser.add_argument("--instances", type=int, default=50, help="合成インスタンス数")
+    parser.add_argument("--replay", help="合成データの代わりに再生する JSONL（fake_vrchat.py --record で作成）")
+    parser.add_argument("--speed", type=float, default=60.0, help="模擬時間の倍速")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="フェイクサーバーの平均遅延（ミリ秒）")
+    parser.add_argument("--rate", type=float, default=0.0, help="フェイクサーバー側のレート制限（リクエスト/秒、0 で無制限）")
+    parser.add_argument("--burst", type=int, default=10, help="フェイクサーバー側のバースト")
+    parser.add_argument("--session-ttl", type=float, default=0.0, help="セッションの有効秒数（0 で無期限）")
+    parser.add_argument("--require-2fa", action="store_true", help="ログイン時に 2FA を要求する")
+    parser.add_argument("--client-rps", type=float, default=10.0, help="コレクター側 VRC_REQUESTS_PER_SECOND")
+    parser.add_argument("--client-burst", type=int, default=2, help="コレクター側 VRC_REQUEST_BURST")
+    parser.add_argument("--concurrency", type=int, default=4, help="COLLECT_CONCURRENCY")
+    parser.add_argument("--replicas", type=int, default=1, help="同時に回すコレクターのレプリカ数")
+    parser.add_argument("--database", default="vrc_monitor_bench", help="ベンチマーク用データベース名（作り直される）")
+    parser.add_argument("--output", type=Path, help="レポートの出力先（デフォルト bench/results/collector_load-<commit>.json）")
+    args = parser.parse_args()
+
+    if args.database == os.environ.get("DB_NAME", "vrc_monitor"):
+        sys.exit(f"refusing to reset {args.database}: use a dedicated benchmark database")
+
+    from db import connect_params
+
+    reset_database({**connect_params(), "database": "postgres"}, args.database)
+    os.environ["DB_NAME"] = args.database
+    prepare_database()
+
+    source = Replay(args.replay, args.speed) if args.replay else SyntheticGroup(args.group_id, args.instances, args.speed)
+    fake = FakeVRChat(
+        source,
+        latency_ms=args.latency_ms,
+        rate=args.rate,
+        burst=args.burst,
+        session_ttl=args.session_ttl,
+        require_2fa=args.require_2fa,
+    )
+    server = fake.serve()
+    os.environ.update({
+        "VRC_API_BASE_URL": f"http://127.0.0.1:{server.server_port}/api/1",
+        "VRC_USERNAME": "bench",
+        "VRC_PASSWORD": "bench",
+        "TOTP_SECRET": "JBSWY3DPEHPK3PXP",
+        "VRC_REQUESTS_PER_SECOND": str(args.client_rps),
+        "VRC_REQUEST_BURST": str(args.client_burst),
+        "COLLECT_CONCURRENCY": str(args.concurrency),
+    })
+
+    print(f"fake VRChat API on port {server.server_port}: "
+          f"{'replay ' + args.replay if args.replay else f'{args.instances} synthetic instances'}, "
+          f"latency {args.latency_ms} ms, server rate {args.rate or 'unlimited'}")
+    commit = git_commit()
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "database")},
+        **run(args, fake),
+    }
+    server.shutdown()
+
+    summary = report["summary"]
+    print(f"median cycle {summary['median_cycle_seconds']} s, {summary['requests_per_second']} req/s, "
+          f"{summary['samples_per_second']} samples/s, coverage {summary['coverage']:.0%}, "
+          f"429 x{summary['rate_limited']}, duplicates x{summary['duplicates']}")
+
+    output = args.output or BENCH_DIR / "results" / f"collector_load-{commit or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    print(f"report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
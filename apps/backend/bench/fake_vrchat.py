@@ -0,0 +1,526 @@
+"""ローカルで動く VRChat API の代用サーバー
+
+コレクターが vrchatapi SDK 経由で呼ぶエンドポイントだけを実装する。
+
+  GET  /api/1/auth/user                      ログイン（Basic 認証 → auth Cookie）/ セッション確認
+  POST /api/1/auth/twofactorauth/totp/verify 2FA（--require-2fa のとき）
+  GET  /api/1/groups/{groupId}/instances     グループのインスタンス一覧
+  GET  /api/1/instances/{worldId}:{instanceId} インスタンス詳細
+
+データの出どころは 3 通り:
+  - 合成（デフォルト）: --instances 個のインスタンスが generateMockMetrics と同じ
+    「満員まで増えたあと待機列が山型に増減する」形で推移する。--speed 倍速で時間が進む
+  - 再生（--replay FILE）: --record で保存したレスポンスを、記録時の経過時間に合わせて返す（--speed 倍速）
+  - 記録（--record FILE --upstream URL）: 本物の API へ中継し、グループ・インスタンスのレスポンスを JSONL に保存する
+    （認証まわりのレスポンスは個人情報を含むため保存しない）
+
+レイテンシ（--latency-ms / --jitter）、サーバー側のレート制限（--rate / --burst、超過時は 429 + Retry-After）、
+セッション期限（--session-ttl 秒で 401 になり再ログインが必要）を再現できる。
+
+コレクターを向けるには VRC_API_BASE_URL=http://127.0.0.1:<port>/api/1 を設定する。
+
+使い方（apps/backend で実行）:
+    python bench/fake_vrchat.py --port 8090 --instances 200 --latency-ms 150 --rate 5
+"""
+
+import argparse
+import base64
+import bisect
+import json
+import math
+import random
+import re
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+API_PREFIX = "/api/1"
+SESSION_MINUTES = 5 * 60
+CAPACITIES = [80, 40, 60, 32]
+
+_GROUP_INSTANCES_RE = re.compile(r"^/groups/(?P<group_id>[^/]+)/instances$")
+_INSTANCE_RE = re.compile(r"^/instances/(?P<location>[^/]+:[^/]+)$")
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+# ---------------------------------------------------------------------------
+# レスポンスの雛形（SDK のモデルが必須とするフィールドをすべて含める）
+# ---------------------------------------------------------------------------
+
+def current_user_body(username: str) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "acceptedTOSVersion": 10,
+        "ageVerificationStatus": "hidden",
+        "ageVerified": False,
+        "allowAvatarCopying": False,
+        "currentAvatar": "avtr_00000000-0000-0000-0000-000000000000",
+        "currentAvatarImageUrl": "https://example.invalid/avatar.png",
+        "currentAvatarTags": [],
+        "currentAvatarThumbnailImageUrl": "https://example.invalid/avatar_thumb.png",
+        "date_joined": "2020-01-01",
+        "developerType": "none",
+        "displayName": username,
+        "emailVerified": True,
+        "friendGroupNames": [],
+        "friendKey": "fake",
+        "friends": [],
+        "hasBirthday": False,
+        "hasEmail": True,
+        "hasLoggedInFromClient": True,
+        "hasPendingEmail": False,
+        "homeLocation": "",
+        "id": "usr_00000000-0000-0000-0000-000000000000",
+        "isAdult": True,
+        "isFriend": False,
+        "last_login": _iso(now),
+        "last_platform": "standalonewindows",
+        "obfuscatedEmail": "f***@example.invalid",
+        "obfuscatedPendingEmail": "",
+        "oculusId": "",
+        "pastDisplayNames": [],
+        "pronouns": "",
+        "pronounsHistory": [],
+        "state": "online",
+        "status": "active",
+        "statusDescription": "",
+        "statusFirstTime": False,
+        "statusHistory": [],
+        "steamDetails": {},
+        "steamId": "",
+        "tags": [],
+        "twoFactorAuthEnabled": True,
+        "unsubscribe": False,
+        "usesGeneratedPassword": False,
+    }
+
+
+def world_body(world_id: str, capacity: int) -> dict:
+    created = _iso(datetime(2024, 1, 1, tzinfo=timezone.utc))
+    return {
+        "authorId": "usr_00000000-0000-0000-0000-000000000000",
+        "authorName": "fake",
+        "capacity": capacity,
+        "created_at": created,
+        "description": "",
+        "featured": False,
+        "heat": 0,
+        "id": world_id,
+        "imageUrl": f"https://example.invalid/{world_id}/image.png",
+        "labsPublicationDate": "none",
+        "name": "Fake Event World",
+        "organization": "vrchat",
+        "popularity": 0,
+        "publicationDate": "none",
+        "recommendedCapacity": capacity,
+        "releaseStatus": "public",
+        "tags": [],
+        "thumbnailImageUrl": f"https://example.invalid/{world_id}/thumb.png",
+        "updated_at": created,
+        "version": 1,
+        "visits": 0,
+    }
+
+
+def error_body(status: int, message: str) -> dict:
+    return {"error": {"message": message, "status_code": status}}
+
+
+# ---------------------------------------------------------------------------
+# データソース
+# ---------------------------------------------------------------------------
+
+class SyntheticGroup:
+    """合成インスタンス群。各インスタンスは開始時刻をずらした 5 時間のセッションを繰り返す。"""
+
+    def __init__(self, group_id: str, instances: int, speed: float, seed: int = 0):
+        rng = random.Random(seed)
+        self.group_id = group_id
+        self.speed = speed
+        self.started = time.monotonic()
+        self.instances = []
+        for n in range(instances):
+            world_id = "wrld_00000000-0000-0000-0000-%012d" % (n // 8)
+            instance_id = f"{10000 + n}~group({group_id})~groupAccessType(public)~region(jp)"
+            capacity = CAPACITIES[n % len(CAPACITIES)]
+            self.instances.append({
+                "world_id": world_id,
+                "instance_id": instance_id,
+                "location": f"{world_id}:{instance_id}",
+                "capacity": capacity,
+                "offset": rng.uniform(0, SESSION_MINUTES),
+            })
+        self._by_location = {inst["location"]: inst for inst in self.instances}
+
+    def _sim_minutes(self) -> float:
+        return (time.monotonic() - self.started) * self.speed / 60
+
+    def _counts(self, inst: dict) -> tuple[int, int]:
+        """(n_users, queue_size) を現在の模擬時刻から計算する"""
+        elapsed = (self._sim_minutes() + inst["offset"]) % SESSION_MINUTES
+        ratio = elapsed / SESSION_MINUTES
+        capacity = inst["capacity"]
+        if ratio < 0.15:
+            return int(capacity * ratio / 0.15), 0
+        after_fill = (ratio - 0.15) / 0.85
+        k = int(elapsed)
+        noise = 0.85 + math.sin(k * 1.7) * 0.1 + math.cos(k * 0.9) * 0.05
+        return capacity, max(0, int(capacity * 0.5 * math.sin(after_fill * math.pi) * noise))
+
+    def group_instances(self, group_id: str) -> tuple[int, object]:
+        if group_id != self.group_id:
+            return 404, error_body(404, "Group not found")
+        body = []
+        for inst in self.instances:
+            n_users, _ = self._counts(inst)
+            body.append({
+                "instanceId": inst["instance_id"],
+                "location": inst["location"],
+                "memberCount": n_users,
+                "world": world_body(inst["world_id"], inst["capacity"]),
+            })
+        return 200, body
+
+    def instance(self, location: str) -> tuple[int, object]:
+        inst = self._by_location.get(location)
+        if inst is None:
+            return 404, error_body(404, "Instance not found")
+        n_users, queue_size = self._counts(inst)
+        name = inst["instance_id"].split("~", 1)[0]
+        return 200, {
+            "active": True,
+            "capacity": inst["capacity"],
+            "clientNumber": "unknown",
+            "full": n_users >= inst["capacity"],
+            "id": inst["location"],
+            "instanceId": inst["instance_id"],
+            "location": inst["location"],
+            "n_users": n_users,
+            "name": name,
+            "permanent": False,
+            "photonRegion": "jp",
+            "platforms": {"android": n_users - int(n_users * 0.6), "standalonewindows": int(n_users * 0.6)},
+            "queueEnabled": True,
+            "queueSize": queue_size,
+            "recommendedCapacity": inst["capacity"],
+            "region": "jp",
+            "secureName": name,
+            "strict": False,
+            "tags": [],
+            "type": "group",
+            "userCount": n_users,
+            "world": world_body(inst["world_id"], inst["capacity"]),
+            "worldId": inst["world_id"],
+        }
+
+
+class Replay:
+    """記録した JSONL をパスごとに時系列で引き、模擬経過時間の時点で最新のレスポンスを返す"""
+
+    def __init__(self, path: str, speed: float):
+        self.speed = speed
+        self.started = time.monotonic()
+        self._records: dict[str, tuple[list[float], list[dict]]] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                times, records = self._records.setdefault(record["path"], ([], []))
+                times.append(record["t"])
+                records.append(record)
+
+    def lookup(self, path: str) -> tuple[int, object]:
+        entry = self._records.get(path)
+        if entry is None:
+            return 404, error_body(404, "Not recorded")
+        times, records = entry
+        elapsed = (time.monotonic() - self.started) * self.speed
+        index = max(0, bisect.bisect_right(times, elapsed) - 1)
+        return records[index]["status"], records[index]["body"]
+
+    def group_instances(self, group_id: str) -> tuple[int, object]:
+        return self.lookup(f"/groups/{group_id}/instances")
+
+    def instance(self, location: str) -> tuple[int, object]:
+        return self.lookup(f"/instances/{location}")
+
+
+class Recorder:
+    """本物の API に中継し、グループ・インスタンスのレスポンスを JSONL に追記する"""
+
+    def __init__(self, upstream: str, path: str):
+        self.upstream = upstream.rstrip("/")
+        self.started = time.monotonic()
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def forward(self, method: str, path: str, query: str, headers: dict, body: Optional[bytes]):
+        url = f"{self.upstream}{path}" + (f"?{query}" if query else "")
+        forwarded = {k: v for k, v in headers.items()
+                     if k.lower() in ("authorization", "cookie", "user-agent", "content-type")}
+        request = urllib.request.Request(url, data=body, method=method, headers=forwarded)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as resp:
+                status, resp_headers, data = resp.status, resp.headers, resp.read()
+        except urllib.error.HTTPError as e:
+            status, resp_headers, data = e.code, e.headers, e.read()
+
+        if _GROUP_INSTANCES_RE.match(path) or _INSTANCE_RE.match(path):
+            try:
+                record = {
+                    "t": round(time.monotonic() - self.started, 3),
+                    "path": path,
+                    "status": status,
+                    "body": json.loads(data),
+                }
+            except ValueError:
+                record = None
+            if record:
+                with self._lock:
+                    self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    self._file.flush()
+        # Set-Cookie は複数ありうるので組のリストで返す。Domain はフェイクサーバーのホストで使えるよう外す
+        passthrough = [
+            (k, re.sub(r";\s*Domain=[^;]*", "", v, flags=re.IGNORECASE))
+            for k, v in resp_headers.items() if k.lower() in ("set-cookie", "retry-after")
+        ]
+        return status, passthrough, data
+
+
+# ---------------------------------------------------------------------------
+# サーバー
+# ---------------------------------------------------------------------------
+
+class FakeVRChat:
+    """フェイクサーバーの設定と状態（セッション・レート制限・統計）"""
+
+    def __init__(
+        self,
+        source=None,
+        recorder: Optional[Recorder] = None,
+        latency_ms: float = 0.0,
+        jitter: float = 0.3,
+        rate: float = 0.0,
+        burst: int = 10,
+        session_ttl: float = 0.0,
+        require_2fa: bool = False,
+    ):
+        self.source = source
+        self.recorder = recorder
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.rate = rate
+        self.burst = burst
+        self.session_ttl = session_ttl
+        self.require_2fa = require_2fa
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        # auth Cookie -> (期限の monotonic 時刻, 2FA 済みか)
+        self._sessions: dict[str, list] = {}
+        self.stats: dict[str, int] = {}
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def take_token(self) -> Optional[float]:
+        """レート制限のトークンを 1 つ取る。足りなければ補充までの秒数を返す。"""
+        if self.rate <= 0:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return (1 - self._tokens) / self.rate
+
+    def new_session(self, verified: bool) -> str:
+        token = "authcookie_" + secrets.token_hex(16)
+        expires = time.monotonic() + self.session_ttl if self.session_ttl > 0 else math.inf
+        with self._lock:
+            self._sessions[token] = [expires, verified]
+        return token
+
+    def session(self, token: Optional[str]) -> Optional[list]:
+        if not token:
+            return None
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry and entry[0] < time.monotonic():
+                del self._sessions[token]
+                self.stats["session_expired"] = self.stats.get("session_expired", 0) + 1
+                return None
+            return entry
+
+    def make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # noqa: A002 - BaseHTTPRequestHandler の引数名
+                pass
+
+            def _send(self, status: int, body, headers=()) -> None:
+                data = body if isinstance(body, bytes) else json.dumps(body, separators=(",", ":")).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers.items() if isinstance(headers, dict) else headers):
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+                fake.count(f"status_{status}")
+
+            def _cookie(self, name: str) -> Optional[str]:
+                for part in (self.headers.get("Cookie") or "").split(";"):
+                    key, _, value = part.strip().partition("=")
+                    if key == name:
+                        return value
+                return None
+
+            def _handle(self, method: str) -> None:
+                path, _, query = self.path.partition("?")
+                if path == "/_stats":
+                    self._send(200, fake.stats)
+                    return
+                if not path.startswith(API_PREFIX):
+                    self._send(404, error_body(404, "Not found"))
+                    return
+                path = path[len(API_PREFIX):]
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else None
+                fake.count("requests")
+
+                if fake.latency_ms > 0:
+                    spread = fake.latency_ms * fake.jitter
+                    time.sleep(max(0.0, random.uniform(fake.latency_ms - spread, fake.latency_ms + spread)) / 1000)
+
+                wait = fake.take_token()
+                if wait is not None:
+                    fake.count("rate_limited")
+                    self._send(429, error_body(429, "Too many requests"),
+                               {"Retry-After": str(max(1, math.ceil(wait)))})
+                    return
+
+                if fake.recorder:
+                    status, headers, data = fake.recorder.forward(method, path, query, dict(self.headers), body)
+                    self._send(status, data, headers)
+                    return
+
+                if path == "/auth/user" and method == "GET":
+                    self._auth_user()
+                elif path == "/auth/twofactorauth/totp/verify" and method == "POST":
+                    self._verify_2fa()
+                elif method == "GET" and (m := _GROUP_INSTANCES_RE.match(path)):
+                    if self._require_session():
+                        fake.count("group_instances")
+                        self._send(*fake.source.group_instances(m.group("group_id")))
+                elif method == "GET" and (m := _INSTANCE_RE.match(path)):
+                    if self._require_session():
+                        fake.count("instance_detail")
+                        self._send(*fake.source.instance(m.group("location")))
+                else:
+                    self._send(404, error_body(404, "Not found"))
+
+            def _require_session(self) -> bool:
+                entry = fake.session(self._cookie("auth"))
+                if entry is None or not entry[1]:
+                    self._send(401, error_body(401, "Missing Credentials"))
+                    return False
+                return True
+
+            def _auth_user(self) -> None:
+                entry = fake.session(self._cookie("auth"))
+                if entry is not None and entry[1]:
+                    self._send(200, current_user_body("fake-user"))
+                    return
+                authorization = self.headers.get("Authorization") or ""
+                if not authorization.startswith("Basic "):
+                    self._send(401, error_body(401, "Missing Credentials"))
+                    return
+                username = base64.b64decode(authorization[6:]).decode().split(":", 1)[0]
+                fake.count("logins")
+                token = fake.new_session(verified=not fake.require_2fa)
+                cookie = {"Set-Cookie": f"auth={token}; Path=/; HttpOnly"}
+                if fake.require_2fa:
+                    # SDK はこの本文の形（空白なし）で 2FA 要求を判定する
+                    self._send(200, {"requiresTwoFactorAuth": ["totp", "otp"]}, cookie)
+                else:
+                    self._send(200, current_user_body(username), cookie)
+
+            def _verify_2fa(self) -> None:
+                entry = fake.session(self._cookie("auth"))
+                if entry is None:
+                    self._send(401, error_body(401, "Missing Credentials"))
+                    return
+                entry[1] = True
+                fake.count("2fa_verified")
+                self._send(200, {"verified": True},
+                           {"Set-Cookie": f"twoFactorAuth=fake_{secrets.token_hex(8)}; Path=/; HttpOnly"})
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        return Handler
+
+    def serve(self, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+        """バックグラウンドスレッドでサーバーを起動して返す（port=0 で空きポート）"""
+        server = ThreadingHTTPServer((host, port), self.make_handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="fake-vrchat", daemon=True).start()
+        return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--group-id", default="grp_00000000-0000-0000-0000-000000000000")
+    parser.add_argument("--instances", type=int, default=20, help="合成インスタンス数")
+    parser.add_argument("--speed", type=float, default=1.0, help="模擬時間の倍速（合成・再生）")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="レスポンスの平均遅延（ミリ秒）")
+    parser.add_argument("--jitter", type=float, default=0.3, help="遅延のばらつき（平均に対する割合）")
+    parser.add_argument("--rate", type=float, default=0.0, help="許可するリクエスト/秒（0 で無制限）")
+    parser.add_argument("--burst", type=int, default=10, help="レート制限のバースト")
+    parser.add_argument("--session-ttl", type=float, default=0.0, help="セッションの有効秒数（0 で無期限）")
+    parser.add_argument("--require-2fa", action="store_true", help="ログイン時に TOTP の 2FA を要求する")
+    parser.add_argument("--replay", help="--record で保存した JSONL を再生する")
+    parser.add_argument("--record", help="本物の API への中継結果を保存する JSONL")
+    parser.add_argument("--upstream", default="https://api.vrchat.cloud/api/1", help="--record の中継先")
+    args = parser.parse_args()
+
+    if args.record:
+        fake = FakeVRChat(recorder=Recorder(args.upstream, args.record),
+                          latency_ms=args.latency_ms, jitter=args.jitter, rate=args.rate, burst=args.burst)
+    else:
+        source = Replay(args.replay, args.speed) if args.replay else SyntheticGroup(args.group_id, args.instances, args.speed)
+        fake = FakeVRChat(source, latency_ms=args.latency_ms, jitter=args.jitter, rate=args.rate, burst=args.burst,
+                          session_ttl=args.session_ttl, require_2fa=args.require_2fa)
+
+    server = ThreadingHTTPServer((args.host, args.port), fake.make_handler())
+    print(f"fake VRChat API on http://{args.host}:{server.server_port}{API_PREFIX} (group {args.group_id})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""読み取り系 API のベンチマーク
+
+ベンチマーク専用のデータベースに合成データ（instances / metrics）を投入し、
+/api/event-groups・/api/metrics・/api/instances のレイテンシ・ピークメモリ・ペイロードサイズを
+データ規模ごとに測って JSON のレポートに書き出す。コミット間の比較は --compare で行う。
+
+合成データはフロントエンドの generateMockMetrics と同じ形:
+  1 日 1 イベント × N インスタンス、各 5 時間、1〜2 分間隔。
+  最初の 15% で満員まで増え、その後は満員のまま待機列が山型に増減する。
+
+使い方（apps/backend で実行。接続先は DB_HOST / DB_PORT / DB_USER / DB_PASSWORD）:
+    python bench/read_path.py --scales 5x7,10x30,20x90
+    python bench/read_path.py --compare bench/results/read_path-abc1234.json
+
+--database（デフォルト vrc_monitor_bench）は毎回作り直すので、本番のデータベースは指定しないこと。
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / "src"
+INIT_SQL = BENCH_DIR.parents[2] / "charts" / "vrc-queue-monitor" / "files" / "init.sql"
+sys.path.insert(0, str(SRC_DIR))
+
+CAPACITIES = [80, 40, 60, 32]
+SESSION_MINUTES = 5 * 60
+
+ENDPOINTS = [
+    "/api/event-groups?days=30",
+    "/api/event-groups?days=90",
+    "/api/event-groups?days=30&format=columnar",
+    "/api/metrics?hours=24",
+    "/api/metrics?hours=168",
+    "/api/metrics?hours=168&resolution=auto",
+    "/api/metrics?hours=720&instance_id=1",
+    "/api/instances?active_only=false",
+]
+
+
+# ---------------------------------------------------------------------------
+# 合成データ
+# ---------------------------------------------------------------------------
+
+def session_samples(start: datetime, capacity: int, rng: random.Random):
+    """1 インスタンス分のメトリクス（generateMockMetrics と同じ満員→待機列のパターン）を返す。
+
+    Yields:
+        (timestamp, n_users, queue_size, queue_enabled, pc_users)
+    """
+    fill_up_ratio = 0.15
+    peak_queue = capacity * 0.5
+    elapsed = 0.0
+    k = 0
+    while elapsed < SESSION_MINUTES:
+        ratio = elapsed / SESSION_MINUTES
+        if ratio < fill_up_ratio:
+            users = int(capacity * ratio / fill_up_ratio)
+            queue = 0
+        else:
+            users = capacity
+            after_fill = (ratio - fill_up_ratio) / (1 - fill_up_ratio)
+            noise = 0.85 + math.sin(k * 1.7) * 0.1 + math.cos(k * 0.9) * 0.05
+            queue = max(0, int(peak_queue * math.sin(after_fill * math.pi) * noise))
+        yield start + timedelta(minutes=elapsed), users, queue, queue > 0, int(users * 0.6)
+        elapsed += rng.uniform(1.0, 2.0)
+        k += 1
+
+
+def reset_database(admin_params: dict, database: str) -> None:
+    import psycopg2
+
+    conn = psycopg2.connect(**admin_params)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (database,))
+        if not cur.fetchone():
+            cur.execute(f'CREATE DATABASE "{database}"')
+    conn.close()
+
+
+def seed(instances: int, days: int, rng: random.Random) -> dict:
+    """スキーマを作り、instances × days の合成データを投入する（既存データは消す）"""
+    from db import Database
+
+    db = Database()
+    if not db.connect():
+        sys.exit("cannot connect to benchmark database")
+
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    with db.conn.cursor() as cur:
+        cur.execute(INIT_SQL.read_text())
+    db.conn.commit()
+    # init.sql にない列（n_users など）やパーティション化はコレクターと同じマイグレーションで用意する
+    db.run_migrations()
+
+    with db.conn.cursor() as cur:
+        cur.execute("""
+            TRUNCATE instances, metrics, event_groups,
+                     metrics_rollup_1m, metrics_rollup_15m, metrics_rollup_1h
+            RESTART IDENTITY CASCADE
+        """)
+        db.conn.commit()
+
+        buf = io.StringIO()
+        for day in range(days):
+            # day=0 は直近 5 時間（開催中、instance_id=1 から）、それ以外は過去の同じ時刻帯
+            start = now - timedelta(days=day, minutes=SESSION_MINUTES)
+            for n in range(instances):
+                capacity = CAPACITIES[n % len(CAPACITIES)]
+                cur.execute("""
+                    INSERT INTO instances (location, name, world_name, capacity, instance_type,
+                                           region, created_at, is_active)
+                    VALUES (%s, %s, %s, %s, 'group', 'jp', %s, %s)
+                    RETURNING id
+                """, (f"wrld_bench:{day}-{n}~group(grp_bench)", str(n), "Bench World",
+                      capacity, start, day == 0))
+                instance_id = cur.fetchone()[0]
+                for ts, users, queue, enabled, pc in session_samples(start, capacity, rng):
+                    buf.write(f"{ts.isoformat()}\t{instance_id}\t{queue}\t{users}\t{'t' if enabled else 'f'}\t{pc}\n")
+        buf.seek(0)
+        cur.copy_expert(
+            "COPY metrics (timestamp, instance_id, queue_size, n_users, queue_enabled, pc_users) FROM STDIN",
+            buf,
+        )
+        db.conn.commit()
+        cur.execute("SELECT COUNT(*) FROM metrics")
+        rows = cur.fetchone()[0]
+
+    # 本番と同じ読み取り経路になるよう、集計テーブルも埋める
+    db.rebuild_event_groups()
+    db.refresh_rollups(lookback_minutes=None)
+    with db.conn.cursor() as cur:
+        cur.execute("ANALYZE")
+    db.conn.commit()
+    db.close()
+
+    return {"rows": rows, "seed_seconds": round(time.perf_counter() - started, 2)}
+
+
+# ---------------------------------------------------------------------------
+# 計測
+# ---------------------------------------------------------------------------
+
+async def measure_endpoints(paths: list[str], repeat: int) -> list[dict]:
+    import httpx
+
+    import api
+
+    results = []
+    async with api.app.router.lifespan_context(api.app):
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            for path in paths:
+                api.cache.invalidate()
+                started = time.perf_counter()
+                first = await client.get(path, headers={"Accept-Encoding": "identity"})
+                first_ms = (time.perf_counter() - started) * 1000
+
+                latencies = []
+                for _ in range(repeat):
+                    api.cache.invalidate()
+                    started = time.perf_counter()
+                    await client.get(path, headers={"Accept-Encoding": "identity"})
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+                # メモリは別の 1 回で測る（tracemalloc はレイテンシを歪めるため）
+                api.cache.invalidate()
+                tracemalloc.start()
+                await client.get(path, headers={"Accept-Encoding": "identity"})
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                gzipped = await client.get(path, headers={"Accept-Encoding": "gzip"})
+                latencies.sort()
+                results.append({
+                    "path": path,
+                    "status": first.status_code,
+                    "latency_ms": {
+                        "first": round(first_ms, 2),
+                        "min": round(latencies[0], 2),
+                        "median": round(statistics.median(latencies), 2),
+                        "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+                    },
+                    "peak_memory_bytes": peak,
+                    "payload_bytes": len(first.content),
+                    "payload_gzip_bytes": gzipped.num_bytes_downloaded,
+                })
+                print(f"  {path:<55} {results[-1]['latency_ms']['median']:>9.1f} ms "
+                      f"{peak / 1e6:>8.1f} MB peak {len(first.content) / 1e6:>8.2f} MB")
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline_path: Path) -> None:
+    """ベースラインのレポートと中央値レイテンシ・ペイロードを比べて表示する"""
+    baseline = json.loads(baseline_path.read_text())
+    base_index = {
+        (scale["instances"], scale["days"], ep["path"]): ep
+        for scale in baseline["scales"] for ep in scale["endpoints"]
+    }
+    print(f"\ncompared with {baseline_path} ({baseline.get('git_commit')})")
+    for scale in report["scales"]:
+        for ep in scale["endpoints"]:
+            base = base_index.get((scale["instances"], scale["days"], ep["path"]))
+            if not base:
+                continue
+            ratio = ep["latency_ms"]["median"] / max(base["latency_ms"]["median"], 1e-6)
+            payload = ep["payload_bytes"] / max(base["payload_bytes"], 1)
+            flag = "  REGRESSION" if ratio > 1.2 else ""
+            print(f"  {scale['instances']}x{scale['days']} {ep['path']:<55} "
+                  f"latency x{ratio:.2f} payload x{payload:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="5x7,10x30,20x90",
+                        help="データ規模のリスト（<1日あたりのインスタンス数>x<日数> をカンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=10, help="エンドポイントごとの計測回数")
+    parser.add_argument("--database", default="vrc_monitor_bench", help="ベンチマーク用データベース名（作り直される）")
+    parser.add_argument("--seed", type=int, default=42, help="乱数シード")
+    parser.add_argument("--output", type=Path, help="レポートの出力先（デフォルト bench/results/read_path-<commit>.json）")
+    parser.add_argument("--compare", type=Path, help="比較するベースラインのレポート")
+    args = parser.parse_args()
+
+    if args.database == os.environ.get("DB_NAME", "vrc_monitor"):
+        sys.exit(f"refusing to reset {args.database}: use a dedicated benchmark database")
+
+    from db import connect_params
+
+    admin_params = {**connect_params(), "database": "postgres"}
+    reset_database(admin_params, args.database)
+    os.environ["DB_NAME"] = args.database
+
+    commit = git_commit()
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "scales": [],
+    }
+    rng = random.Random(args.seed)
+    for scale in args.scales.split(","):
+        instances, days = (int(v) for v in scale.lower().split("x"))
+        print(f"scale {instances} instances x {days} days: seeding...")
+        seeded = seed(instances, days, rng)
+        print(f"  {seeded['rows']} metrics rows in {seeded['seed_seconds']} s")
+        report["scales"].append({
+            "instances": instances,
+            "days": days,
+            "rows": seeded["rows"],
+            "seed_seconds": seeded["seed_seconds"],
+            "endpoints": asyncio.run(measure_endpoints(ENDPOINTS, args.repeat)),
+        })
+
+    output = args.output or BENCH_DIR / "results" / f"read_path-{commit or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"report written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
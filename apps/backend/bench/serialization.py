@@ -0,0 +1,122 @@
+"""API レスポンスのシリアライズ時間を比較するベンチマーク
+
+/api/event-groups と同じ形の合成データを作り、次の 2 通りでエンコードする時間を測る。
+
+- pydantic: FastAPI の response_model 経由（検証 → JSON 用の dict へダンプ → json.dumps）
+- fast:     api._encode（検証なしで orjson により直接エンコード）
+
+使い方（apps/backend で実行、DB 接続は不要）:
+    python bench/serialization.py --instances 20 --metrics 2000
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from pydantic import TypeAdapter  # noqa: E402
+
+import api  # noqa: E402
+
+
+def build_event_groups(instances: int, metrics: int) -> list[dict]:
+    """_build_event_groups と同じ形のデータ（1 グループ = 1 日）を作る"""
+    start = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    groups = []
+    for n in range(instances):
+        created = start + timedelta(days=n // 4)
+        series = [
+            {
+                "timestamp": created + timedelta(minutes=2 * k),
+                "instance_id": n + 1,
+                "queue_size": (k * 7) % 40,
+                "current_users": min(80, k),
+                "pc_users": k % 30,
+            }
+            for k in range(metrics)
+        ]
+        instance = {
+            "id": n + 1,
+            "location": f"wrld_bench:{n}~group(grp_bench)",
+            "name": f"{n}",
+            "display_name": None,
+            "world_name": "Bench World",
+            "capacity": 80,
+            "world_thumbnail_url": "https://example.com/thumb.png",
+            "world_image_url": None,
+            "instance_type": "group",
+            "region": "jp",
+            "created_at": created,
+            "is_active": True,
+            "metrics": series,
+            "peak_queue": 39,
+            "peak_users": 80,
+            "sample_count": metrics,
+        }
+        event_date = created.date().isoformat()
+        if not groups or groups[-1]["eventDate"] != event_date:
+            groups.append({
+                "eventDate": event_date,
+                "startTime": series[0]["timestamp"],
+                "endTime": series[-1]["timestamp"],
+                "instances": [],
+            })
+        groups[-1]["instances"].append(instance)
+    return groups
+
+
+def encode_pydantic(adapter: TypeAdapter, data: list[dict]) -> bytes:
+    """FastAPI が response_model で行う処理（serialize_response + JSONResponse.render）"""
+    validated = adapter.validate_python(data)
+    content = adapter.dump_python(validated, mode="json", by_alias=True)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def encode_fast(data: list[dict]) -> bytes:
+    return api._encode(data, "application/json")
+
+
+def measure(fn, repeat: int) -> float:
+    """repeat 回実行したうちの中央値（ミリ秒）"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instances", type=int, default=20, help="インスタンス数")
+    parser.add_argument("--metrics", type=int, default=2000, help="インスタンスあたりのメトリクス数")
+    parser.add_argument("--repeat", type=int, default=7, help="計測回数（中央値を表示）")
+    args = parser.parse_args()
+
+    data = build_event_groups(args.instances, args.metrics)
+    adapter = TypeAdapter(List[api.EventGroupResponse])
+
+    slow_body = encode_pydantic(adapter, data)
+    fast_body = encode_fast(data)
+    if json.loads(slow_body) != json.loads(fast_body):
+        sys.exit("output mismatch between pydantic and fast encoders")
+
+    slow = measure(lambda: encode_pydantic(adapter, data), args.repeat)
+    fast = measure(lambda: encode_fast(data), args.repeat)
+
+    samples = args.instances * args.metrics
+    print(f"event-groups: {args.instances} instances x {args.metrics} metrics = {samples} samples, "
+          f"{len(fast_body) / 1e6:.1f} MB")
+    print(f"  pydantic (response_model): {slow:8.1f} ms")
+    print(f"  fast (orjson, no revalidation): {fast:8.1f} ms")
+    print(f"  speedup: {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,33 @@
 """FastAPI Application - REST API Server"""
 
 import os
+import asyncio
+import hashlib
 import logging
-from typing import List, Optional
-from datetime import datetime, timezone
-from contextlib import asynccontextmanager
-from zoneinfo import ZoneInfo
+from typing import Callable, Iterator, List, Optional, TypeVar
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from contextlib import ExitStack, asynccontextmanager, closing
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, ConfigDict
+from starlette.concurrency import run_in_threadpool
 
-from db import Database
+import anyio
+
+import msgpack
+import orjson
+
+from instrumentation import MetricsMiddleware, render_latest
+from query_profiler import profiler
+from db import METRICS_CHANNEL, ROLLUP_AGGREGATES, ROLLUP_RESOLUTIONS, Database, DatabasePool, DatabaseUnavailable
+from downsample import downsample_by_instance, lttb
+from listener import NotificationListener
+from metric_stream import MetricBroadcaster
+from response_cache import ResponseCache
 from scheduler import ScheduleConfig
 
 logging.basicConfig(
@@ -20,7 +36,39 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-JST = ZoneInfo("Asia/Tokyo")
+T = TypeVar("T")
+
+# /api/metrics で resolution=auto のとき、これ以上の点数が得られる最も粗い解像度を選ぶ
+METRICS_TARGET_POINTS = int(os.getenv("METRICS_TARGET_POINTS", "300"))
+
+# レスポンスキャッシュ（コレクターの NOTIFY で破棄。TTL は通知を取りこぼしたときの保険）
+API_CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "128"))
+API_CACHE_TTL_SECONDS = float(os.getenv("API_CACHE_TTL_SECONDS", "120"))
+# キャッシュするエンコード済み本文の合計サイズの上限（MB、0 で無制限）
+API_CACHE_MAX_MB = float(os.getenv("API_CACHE_MAX_MB", "64"))
+
+# コレクターのポーリング間隔（/api/config で返す。期間指定の ETag はこの刻みで変わる）
+POLL_INTERVAL_MINUTES = int(os.getenv("POLL_INTERVAL_MINUTES", "2"))
+
+# これ以上のサイズのレスポンスを Accept-Encoding: gzip のクライアントに圧縮して返す
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1024"))
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# /api/metrics のキーセットページング（since / until / cursor / limit）で limit 省略時の件数
+METRICS_PAGE_LIMIT = int(os.getenv("METRICS_PAGE_LIMIT", "1000"))
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_PG_INT_MAX = 2**31 - 1
+
+# /api/metrics/export でサーバーサイドカーソルから 1 回に取得し、1 チャンクとして送る行数
+METRICS_EXPORT_BATCH_ROWS = int(os.getenv("METRICS_EXPORT_BATCH_ROWS", "2000"))
+
+# /api/stream/metrics で新着がないときにコメント行を送る間隔（プロキシのアイドル切断対策）
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+# /debug/queries（クエリの集計と遅いクエリのプラン）を有効にする
+API_DEBUG_ENDPOINTS = os.getenv("API_DEBUG_ENDPOINTS", "false").lower() == "true"
 
 
 # ---------------------------------------------------------------------------
@@ -46,6 +94,7 @@ class InstanceResponse(BaseModel):
     world_image_url: Optional[str] = None
     instance_type: Optional[str] = None
     region: Optional[str] = None
+    group_id: Optional[str] = None
     created_at: datetime
     is_active: bool
 
@@ -61,9 +110,14 @@ class InstanceWithMetricsResponse(BaseModel):
     world_image_url: Optional[str] = None
     instance_type: Optional[str] = None
     region: Optional[str] = None
+    group_id: Optional[str] = None
     created_at: datetime
     is_active: bool
     metrics: List[MetricResponse]
+    # event_groups の集計値（メトリクスを間引いても変わらない）
+    peak_queue: Optional[int] = None
+    peak_users: Optional[int] = None
+    sample_count: Optional[int] = None
 
 
 class EventGroupResponse(BaseModel):
@@ -76,69 +130,245 @@ class EventGroupResponse(BaseModel):
 
 
 # ---------------------------------------------------------------------------
-# ヘルパー（表示用の計算ロジック）
+# ヘルパー
 # ---------------------------------------------------------------------------
 
-def _compute_metric(
-    n_users: int,
-    queue_size: int,
-    capacity: int,
-    legacy_current_users: int = 0,
-) -> tuple[int, int]:
-    """生値から (current_users, effective_queue_size) を計算する。
+def _pick_resolution(hours: int, target_points: int) -> str:
+    """期間 hours で target_points 以上の点数になる最も粗いロールアップ解像度を返す。
 
-    n_users=0 は migration 前の旧データを示す可能性があるため legacy にフォールバック。
-    queue_size は VRChat が返した値をそのまま信頼する（queue_enabled によるゲートは行わない）。
+    どの解像度でも足りない（期間が短い）場合は生データ "raw" を使う。
     """
-    if n_users == 0 and legacy_current_users > 0:
-        return legacy_current_users, queue_size
+    for name, (minutes, _, _) in sorted(ROLLUP_RESOLUTIONS.items(), key=lambda kv: -kv[1][0]):
+        if hours * 60 // minutes >= target_points:
+            return name
+    return "raw"
+
 
-    if capacity > 0 and n_users > capacity:
-        # n_users が capacity を超えている場合は超過分を待機列とする
-        return capacity, n_users - capacity
+def _metric_columns(metrics: list[dict]) -> dict:
+    """メトリクス行を列ごとの配列にする（timestamp は epoch 秒、昇順）"""
+    metrics = sorted(metrics, key=lambda m: m["timestamp"])
+    return {
+        "timestamp": [int(m["timestamp"].timestamp()) for m in metrics],
+        "queue_size": [m["queue_size"] for m in metrics],
+        "current_users": [m["current_users"] for m in metrics],
+        "pc_users": [m["pc_users"] for m in metrics],
+    }
 
-    return n_users, queue_size
 
+def _metrics_to_columnar(rows: list[dict]) -> list[dict]:
+    """複数インスタンスが混在する行をインスタンスごとの列形式にまとめる"""
+    series: dict[int, list[dict]] = {}
+    for row in rows:
+        series.setdefault(row["instance_id"], []).append(row)
+    return [{"instance_id": instance_id, **_metric_columns(points)} for instance_id, points in series.items()]
 
-def _event_date_jst(created_at: datetime) -> str:
-    """インスタンスの created_at を JST 日付文字列に変換する。"""
-    if created_at.tzinfo is None:
-        created_at = created_at.replace(tzinfo=timezone.utc)
-    return created_at.astimezone(JST).strftime("%Y-%m-%d")
 
+def _encode_cursor(row: dict) -> str:
+    """ページ最後の行から次ページのカーソル（"<epoch マイクロ秒>-<instance_id>"）を作る"""
+    micros = (row["timestamp"] - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}-{row['instance_id']}"
 
-def _build_metric_response(row: dict) -> dict:
-    """DB の生行から MetricResponse 用の dict を構築する。"""
-    current_users, effective_queue = _compute_metric(
-        row["n_users"],
-        row["queue_size"],
-        row["capacity"],
-        row["legacy_current_users"],
-    )
-    return {
-        "timestamp": row["timestamp"],
-        "instance_id": row["instance_id"],
-        "queue_size": effective_queue,
-        "current_users": current_users,
-        "pc_users": row["pc_users"] or 0,
-    }
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """_encode_cursor の逆変換。壊れたカーソルや範囲外の値は 400 にする"""
+    try:
+        micros, instance_id = cursor.split("-", 1)
+        after = (_EPOCH + timedelta(microseconds=int(micros)), int(instance_id))
+    except (ValueError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # 行から作ったカーソルなので、時刻は現在より先にならず、instance_id は INTEGER に収まる
+    if not (_EPOCH <= after[0] <= datetime.now(timezone.utc) + timedelta(days=1)
+            and 0 < after[1] <= _PG_INT_MAX):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after
+
+
+def _response_media_type(request: Request) -> str:
+    """format=columnar のエンコーディングを Accept から決める（msgpack か JSON）"""
+    accept = request.headers.get("accept", "")
+    if MSGPACK_MEDIA_TYPE in accept or "application/x-msgpack" in accept:
+        return MSGPACK_MEDIA_TYPE
+    return "application/json"
+
+
+def _encode_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def _encode(content, media_type: str) -> bytes:
+    """レスポンスを media_type でバイト列にする
+
+    重いエンドポイントはクエリ結果がすでにレスポンスモデルの形（SQL で型・派生値を確定済み）なので、
+    response_model での再検証を通さずに直接エンコードする。response_model はスキーマ（OpenAPI）用。
+    JSON は Pydantic の出力と同じ表記（UTC は "Z"）にそろえる。
+    """
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.packb(content, default=_encode_default)
+    return orjson.dumps(content, default=_encode_default, option=orjson.OPT_UTC_Z)
+
+
+class _ReleasingStreamingResponse(StreamingResponse):
+    """送信の終了後に release をスレッドプールで必ず呼ぶ StreamingResponse
+
+    StreamingResponse の background は切断や送信失敗のときに呼ばれないことがあるため、
+    __call__ 全体を try/finally で包む（キャンセルされても release は中断しない）。
+    """
+
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(self.release)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match と ETag を弱い比較で照合する（W/ の有無は無視）"""
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def _window_start(window: timedelta, now: datetime) -> datetime:
+    """直近 window の期間の開始時刻をポーリング間隔の刻みに切り捨てる（ETag 用）"""
+    step = timedelta(minutes=max(POLL_INTERVAL_MINUTES, 1))
+    return _EPOCH + ((now - window - _EPOCH) // step) * step
+
+
+def _not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """条件付きリクエストに対して 304 を返せるか判定する。
+
+    If-None-Match があればそれだけで判定し、If-Modified-Since は無視する（RFC 9110）。
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
 
 
 # ---------------------------------------------------------------------------
 # アプリケーション
 # ---------------------------------------------------------------------------
 
-db = Database()
+pool = DatabasePool()
+cache = ResponseCache(
+    max_entries=API_CACHE_MAX_ENTRIES,
+    ttl_seconds=API_CACHE_TTL_SECONDS,
+    max_bytes=int(API_CACHE_MAX_MB * 1024 * 1024),
+)
+
+
+async def _run_db(fn: Callable[[Database], T]) -> T:
+    """プールから接続を借りて fn をスレッドプールで実行する。
+
+    psycopg2 は同期ドライバのため、クエリと後処理をイベントループ外で行い、
+    リクエストごとに別の接続を使う。
+    """
+    def _call() -> T:
+        with pool.connection() as conn_db:
+            return fn(conn_db)
+
+    try:
+        return await run_in_threadpool(_call)
+    except DatabaseUnavailable as e:
+        logger.error(f"Database unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Database connection error")
+
+
+async def _conditional(
+    request: Request,
+    response: Response,
+    scope: tuple,
+    instance_id: Optional[int] = None,
+    window: Optional[timedelta] = None,
+) -> Optional[Response]:
+    """ETag / Last-Modified を response に設定し、クライアントのキャッシュが有効なら 304 を返す。
+
+    検証子は metrics の書き込み番号（コミット順）と instances の最終更新時刻から作り、
+    scope（エンドポイント + パラメータ）を混ぜてパラメータごとに別の値にする。
+    どちらもコレクターの NOTIFY まで変わらないのでレスポンスキャッシュに載せる。
+    window（直近 N 時間・N 日の期間）を渡すと、書き込みがなくても期間から古い行が外れるので、
+    期間の開始時刻をポーリング間隔の刻みで混ぜ、Last-Modified もその時刻より前にしない。
+    """
+    version = await cache.get_or_load(
+        ("version", instance_id),
+        lambda: _run_db(lambda conn_db: conn_db.get_data_version(instance_id)),
+    )
+    if not version:
+        return None
+
+    # TIMESTAMP 列の値はこれまでどおりローカル時刻として UTC にそろえてから比べる
+    updated = [
+        t.astimezone(timezone.utc) for t in (version["metrics_updated_at"], version["instances_updated_at"]) if t
+    ]
+    window_start = _window_start(window, datetime.now(timezone.utc)) if window else None
+    if window_start and updated:
+        updated.append(window_start)
+    last_modified = max(updated) if updated else None
+    digest = hashlib.sha1(
+        repr((scope, version["metrics_version"], version["instances_updated_at"], window_start)).encode()
+    ).hexdigest()[:20]
+    etag = f'W/"{digest}"'
+
+    # no-cache: ブラウザに保存はさせるが、使う前に必ず再検証させる
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    response.headers.update(headers)
+
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
+
+
+async def _fetch_metrics_since(after_version: int) -> tuple[int, list[dict]]:
+    return await _run_db(
+        lambda conn_db: conn_db.get_metrics_since(after_version)
+    )
+
+
+async def _fetch_latest_version() -> Optional[int]:
+    version = await _run_db(lambda conn_db: conn_db.get_data_version())
+    return version["metrics_version"]
+
+
+broadcaster = MetricBroadcaster(_fetch_metrics_since, _fetch_latest_version)
+
+
+def _on_metrics_updated(payload: Optional[str]) -> None:
+    """コレクターの NOTIFY（または LISTEN 再接続）ごとにイベントループ上で呼ばれる"""
+    cache.invalidate()
+    broadcaster.notify(payload)
+
+
+listener = NotificationListener(METRICS_CHANNEL, _on_metrics_updated)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # migration はコレクター (main.py) のみで実行するため、ここでは接続のみ
+    # migration はコレクター (main.py) のみで実行するため、ここではプール作成のみ
     logger.info("Starting FastAPI server...")
-    db.connect()
+    pool.open()
+    listener.start(asyncio.get_running_loop())
     yield
     logger.info("Shutting down FastAPI server...")
-    db.close()
+    listener.stop()
+    pool.close()
 
 
 app = FastAPI(
@@ -155,6 +385,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# text/event-stream（/api/stream/metrics）は圧縮対象外
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+# 最も外側に置き、圧縮を含めたエンドポイントごとのレイテンシを記録する
+app.add_middleware(MetricsMiddleware)
 
 
 # ---------------------------------------------------------------------------
@@ -166,6 +400,27 @@ async def root():
     return {"status": "ok", "message": "VRC Queue Monitor API is running", "version": "1.0.0"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 形式の計測値（フロントエンドのプロキシは /api/* のみ中継するため外部には出ない）"""
+    body, media_type = render_latest()
+    return Response(content=body, media_type=media_type)
+
+
+@app.get("/debug/queries", include_in_schema=False)
+async def debug_queries(
+    limit: int = Query(50, ge=1, le=500, description="返す文の数（合計時間の長い順）"),
+    reset: bool = Query(False, description="返したあと集計とリングバッファを空にする"),
+):
+    """このプロセスのクエリ集計と遅いクエリ（API_DEBUG_ENDPOINTS=true のときのみ）"""
+    if not API_DEBUG_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    snapshot = profiler.snapshot(limit)
+    if reset:
+        profiler.reset()
+    return snapshot
+
+
 @app.get("/api/config")
 async def get_config():
     schedule = ScheduleConfig()
@@ -175,25 +430,33 @@ async def get_config():
         "schedule_days": schedule.schedule_days,
         "start_time": schedule.start_time.strftime("%H:%M"),
         "duration_minutes": schedule.duration_minutes,
-        "poll_interval_minutes": int(os.getenv("POLL_INTERVAL_MINUTES", "2")),
+        "poll_interval_minutes": POLL_INTERVAL_MINUTES,
         "is_active_now": schedule.is_active_now(),
         "next_start": next_start.isoformat() if next_start else None,
     }
 
 
+async def _get_instances_cached(active_only: bool, group_id: Optional[str]) -> list[dict]:
+    return await cache.get_or_load(
+        ("instances", active_only, group_id),
+        lambda: _run_db(lambda conn_db: conn_db.get_instances(active_only, group_id)),
+    )
+
+
 @app.get("/api/instances", response_model=List[InstanceResponse])
-async def get_instances(active_only: bool = Query(True)):
-    if not db.ensure_connected():
-        raise HTTPException(status_code=503, detail="Database connection error")
+async def get_instances(
+    request: Request,
+    response: Response,
+    active_only: bool = Query(True),
+    group_id: Optional[str] = Query(None),
+):
     try:
-        with db.conn.cursor() as cur:
-            sql = "SELECT * FROM instances"
-            if active_only:
-                sql += " WHERE is_active = TRUE"
-            sql += " ORDER BY created_at DESC"
-            cur.execute(sql)
-            cols = [d[0] for d in cur.description]
-            return [dict(zip(cols, row)) for row in cur.fetchall()]
+        not_modified = await _conditional(request, response, ("instances", active_only, group_id))
+        if not_modified:
+            return not_modified
+        return await _get_instances_cached(active_only, group_id)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching instances: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -201,73 +464,110 @@ async def get_instances(active_only: bool = Query(True)):
 
 @app.get("/api/instances/{instance_id}", response_model=InstanceResponse)
 async def get_instance(instance_id: int):
-    if not db.ensure_connected():
-        raise HTTPException(status_code=503, detail="Database connection error")
     try:
-        with db.conn.cursor() as cur:
-            cur.execute("SELECT * FROM instances WHERE id = %s", (instance_id,))
-            cols = [d[0] for d in cur.description]
-            row = cur.fetchone()
-            if not row:
-                raise HTTPException(status_code=404, detail="Instance not found")
-            return dict(zip(cols, row))
+        instance = await _run_db(lambda conn_db: conn_db.get_instance(instance_id))
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error fetching instance: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    if not instance:
+        raise HTTPException(status_code=404, detail="Instance not found")
+    return instance
+
+
+def _build_event_groups(
+    conn_db: Database,
+    days: int,
+    max_points: Optional[int] = None,
+    include_metrics: bool = True,
+    columnar: bool = False,
+    group_id: Optional[str] = None,
+) -> list[dict]:
+    """イベントグループのレスポンスを構築する（スレッドプール上で実行）
+
+    グループ分けと開始・終了時刻・ピーク値はコレクターが更新する event_groups を読む。
+    生のメトリクス系列は include_metrics のときだけ、対象インスタンス分を取得する。
+    max_points を指定するとインスタンスごとの系列を LTTB でその点数までに間引く。
+    columnar のときは各インスタンスの metrics を列形式（_metric_columns）で返す。
+    """
+    summaries = conn_db.get_event_group_summaries(days, group_id)
+
+    metrics_by_instance: dict[int, list[dict]] = {}
+    if include_metrics and summaries:
+        for row in conn_db.get_metrics_for_instances([s["id"] for s in summaries], days):
+            metrics_by_instance.setdefault(row["instance_id"], []).append(row)
+
+    groups: dict[str, dict] = {}
+    for summary in summaries:
+        event_date = summary["event_date"].isoformat()
+        group = groups.setdefault(event_date, {
+            "eventDate": event_date,
+            "startTime": summary["start_time"],
+            "endTime": summary["end_time"],
+            "instances": [],
+        })
+        group["startTime"] = min(group["startTime"], summary["start_time"])
+        group["endTime"] = max(group["endTime"], summary["end_time"])
+
+        metrics = metrics_by_instance.get(summary["id"], [])
+        if max_points:
+            metrics = lttb(metrics, max_points)
+        if columnar:
+            metrics = _metric_columns(metrics)
+        group["instances"].append({
+            "id": summary["id"],
+            "location": summary["location"],
+            "name": summary["name"],
+            "display_name": summary["display_name"],
+            "world_name": summary["world_name"],
+            "capacity": summary["capacity"],
+            "world_thumbnail_url": summary["world_thumbnail_url"],
+            "world_image_url": summary["world_image_url"],
+            "instance_type": summary["instance_type"],
+            "region": summary["region"],
+            "group_id": summary["group_id"],
+            "created_at": summary["created_at"],
+            "is_active": summary["is_active"],
+            "metrics": metrics,
+            "peak_queue": summary["peak_queue"],
+            "peak_users": summary["peak_users"],
+            "sample_count": summary["sample_count"],
+        })
+
+    return list(groups.values())
 
 
 @app.get("/api/event-groups", response_model=List[EventGroupResponse])
-async def get_event_groups(days: int = Query(30, ge=1, le=90)):
-    if not db.ensure_connected():
-        raise HTTPException(status_code=503, detail="Database connection error")
+async def get_event_groups(
+    request: Request,
+    response: Response,
+    days: int = Query(30, ge=1, le=90),
+    max_points: Optional[int] = Query(None, ge=3, le=10000),
+    include_metrics: bool = Query(True),
+    format: str = Query("json", pattern="^(json|columnar)$"),
+    group_id: Optional[str] = Query(None),
+):
+    columnar = format == "columnar"
+    media_type = _response_media_type(request) if columnar else "application/json"
+    key = ("event-groups", days, max_points, include_metrics, format, media_type, group_id)
+    if columnar:
+        response.headers["Vary"] = "Accept"
+
     try:
-        raw_metrics, instances = db.get_metrics_with_instances(days)
-
-        # instances.created_at の JST 日付でグループ化
-        event_map: dict[str, dict[int, list]] = {}
-        for row in raw_metrics:
-            inst = instances.get(row["instance_id"])
-            if not inst:
-                continue
-            event_key = _event_date_jst(inst["created_at"])
-            event_map.setdefault(event_key, {}).setdefault(row["instance_id"], []).append(
-                _build_metric_response(row)
+        not_modified = await _conditional(request, response, key, window=timedelta(days=days))
+        if not_modified:
+            return not_modified
+        # エンコード済みのバイト列ごとキャッシュする
+        body = await cache.get_or_load(key, lambda: _run_db(
+            lambda conn_db: _encode(
+                _build_event_groups(conn_db, days, max_points, include_metrics, columnar=columnar, group_id=group_id),
+                media_type,
             )
-
-        result = []
-        for event_date, instance_metrics in sorted(event_map.items(), reverse=True):
-            event_instances = []
-            all_timestamps = []
-            for instance_id, metrics_list in instance_metrics.items():
-                inst = instances[instance_id]
-                sorted_metrics = sorted(metrics_list, key=lambda x: x["timestamp"])
-                all_timestamps.extend(m["timestamp"] for m in sorted_metrics)
-                event_instances.append({
-                    "id": inst["id"],
-                    "location": inst["location"],
-                    "name": inst["name"],
-                    "display_name": inst.get("display_name"),
-                    "world_name": inst["world_name"],
-                    "capacity": inst["capacity"],
-                    "world_thumbnail_url": inst.get("world_thumbnail_url"),
-                    "world_image_url": inst.get("world_image_url"),
-                    "instance_type": inst.get("instance_type"),
-                    "region": inst.get("region"),
-                    "created_at": inst["created_at"],
-                    "is_active": inst["is_active"],
-                    "metrics": sorted_metrics,
-                })
-            if event_instances:
-                result.append({
-                    "eventDate": event_date,
-                    "startTime": min(all_timestamps),
-                    "endTime": max(all_timestamps),
-                    "instances": event_instances,
-                })
-
-        return result
+        ))
+        return Response(content=body, media_type=media_type, headers=dict(response.headers))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching event groups: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -275,19 +575,194 @@ async def get_event_groups(days: int = Query(30, ge=1, le=90)):
 
 @app.get("/api/metrics", response_model=List[MetricResponse])
 async def get_metrics(
+    request: Request,
+    response: Response,
     instance_id: Optional[int] = Query(None),
     hours: int = Query(24, ge=1, le=2160),
+    resolution: str = Query("raw", pattern="^(auto|raw|1m|15m|1h)$"),
+    agg: str = Query("max", pattern=f"^({'|'.join(ROLLUP_AGGREGATES)})$"),
+    max_points: Optional[int] = Query(None, ge=3, le=10000),
+    format: str = Query("json", pattern="^(json|columnar)$"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    group_id: Optional[str] = Query(None),
 ):
-    if not db.ensure_connected():
-        raise HTTPException(status_code=503, detail="Database connection error")
+    # since / until / cursor / limit のいずれかを指定すると、生データを (timestamp, instance_id)
+    # 昇順で limit 件ずつ返すキーセットページングになる。続きがあれば X-Next-Cursor を返す
+    keyset = any(v is not None for v in (since, until, cursor, limit))
+    after = None
+    if keyset:
+        if resolution not in ("auto", "raw") or max_points:
+            raise HTTPException(
+                status_code=400,
+                detail="since/until/cursor/limit cannot be combined with rollup resolution or max_points",
+            )
+        resolution = "raw"
+        if cursor:
+            after = _decode_cursor(cursor)
+    elif resolution == "auto":
+        resolution = _pick_resolution(hours, max_points or METRICS_TARGET_POINTS)
+    response.headers["X-Resolution"] = resolution
+
+    def _load(conn_db: Database) -> tuple[list[dict], Optional[str]]:
+        if keyset:
+            page_limit = limit or METRICS_PAGE_LIMIT
+            rows = conn_db.get_metrics_page(
+                instance_id, hours, since, until, after, page_limit + 1, group_id=group_id
+            )
+            next_cursor = _encode_cursor(rows[page_limit - 1]) if len(rows) > page_limit else None
+            return rows[:page_limit], next_cursor
+        if resolution != "raw":
+            rows = conn_db.get_metrics_rollup(instance_id, hours, resolution, group_id, agg)
+        else:
+            rows = conn_db.get_metrics_list(instance_id, hours, group_id)
+        if max_points:
+            rows = downsample_by_instance(rows, max_points)
+        return rows, None
+
+    columnar = format == "columnar"
+    media_type = _response_media_type(request) if columnar else "application/json"
+    key = ("metrics", instance_id, hours, resolution, agg, max_points, format, media_type,
+           since, until, cursor, limit, group_id)
+    if columnar:
+        response.headers["Vary"] = "Accept"
+
     try:
-        rows = db.get_metrics_list(instance_id, hours)
-        return [_build_metric_response(row) for row in rows]
+        not_modified = await _conditional(request, response, key, instance_id, window=timedelta(hours=hours))
+        if not_modified:
+            return not_modified
+
+        def _load_encoded(conn_db: Database) -> tuple[bytes, Optional[str]]:
+            rows, next_cursor = _load(conn_db)
+            return _encode(_metrics_to_columnar(rows) if columnar else rows, media_type), next_cursor
+
+        if keyset:
+            # since / cursor はクライアントごとに値が変わり再利用されないのでキャッシュしない
+            body, next_cursor = await _run_db(_load_encoded)
+        else:
+            body, next_cursor = await cache.get_or_load(key, lambda: _run_db(_load_encoded))
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return Response(content=body, media_type=media_type, headers=dict(response.headers))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching metrics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/metrics/export")
+async def export_metrics(
+    instance_id: Optional[int] = Query(None),
+    hours: int = Query(24, ge=1, le=2160),
+    format: str = Query("ndjson", pattern="^(ndjson|json)$"),
+    group_id: Optional[str] = Query(None),
+):
+    """生メトリクスを全件ストリーミングで返す（timestamp 昇順）
+
+    サーバーサイドカーソルで METRICS_EXPORT_BATCH_ROWS 行ずつ読み、読んだ分から送るため、
+    期間の長さによらずメモリ使用量は一定で、最初のバイトもすぐ返る。
+    値は /api/metrics（resolution=raw）と同じ計算済みの値。
+    format=ndjson は 1 行 1 サンプル、format=json は 1 つの JSON 配列。
+    """
+    # 接続はストリーム開始前に借りる（空きがなければヘッダー送信前に 503 を返せる）
+    stack = ExitStack()
+    try:
+        conn_db = await run_in_threadpool(stack.enter_context, pool.connection())
+    except DatabaseUnavailable as e:
+        logger.error(f"Database unavailable: {e}")
+        raise HTTPException(status_code=503, detail="Database connection error")
+
+    def _encode_row(row: dict) -> str:
+        return orjson.dumps(row, default=_encode_default, option=orjson.OPT_UTC_Z).decode()
+
+    def _chunks() -> Iterator[str]:
+        # 同期ジェネレーターなので StreamingResponse がスレッドプール上で回す
+        with stack:
+            # 名前付きカーソルを閉じてから接続をプールに返す（ExitStack は逆順に閉じる）
+            rows = stack.enter_context(closing(conn_db.iter_metrics(
+                instance_id, hours, itersize=METRICS_EXPORT_BATCH_ROWS, group_id=group_id
+            )))
+            batch: list[str] = []
+            if format == "json":
+                yield "["
+                first = True
+                for row in rows:
+                    batch.append(_encode_row(row) if first else "," + _encode_row(row))
+                    first = False
+                    if len(batch) >= METRICS_EXPORT_BATCH_ROWS:
+                        yield "".join(batch)
+                        batch = []
+                batch.append("]")
+            else:
+                for row in rows:
+                    batch.append(_encode_row(row) + "\n")
+                    if len(batch) >= METRICS_EXPORT_BATCH_ROWS:
+                        yield "".join(batch)
+                        batch = []
+            if batch:
+                yield "".join(batch)
+
+    def _release() -> None:
+        # 最後まで送れた場合は _chunks 内で返却済み。開始前や途中で切断された場合は
+        # ジェネレーターを閉じて返却し、一度も回らなかった場合は stack を直接閉じる（何度呼んでもよい）
+        chunks.close()
+        stack.close()
+
+    chunks = _chunks()
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return _ReleasingStreamingResponse(chunks, release=_release, media_type=media_type)
+
+
+@app.get("/api/stream/metrics")
+async def stream_metrics(
+    request: Request,
+    instance_id: Optional[int] = Query(None),
+    group_id: Optional[str] = Query(None),
+):
+    """新着メトリクスを Server-Sent Events で配信する。
+
+    コレクターが保存するたびに、その回の新しい行（/api/metrics と同じ計算済みの値）を
+    1 つの `metrics` イベント（JSON 配列）として送る。DB を読むのは購読者数によらず 1 回。
+    group_id の絞り込みには /api/instances と共有のキャッシュからグループの instance_id を引く。
+    """
+    queue = await broadcaster.subscribe()
+
+    async def _events():
+        try:
+            yield f"retry: {int(SSE_HEARTBEAT_SECONDS * 1000)}\n\n"
+            while True:
+                try:
+                    rows = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": heartbeat\n\n"
+                    continue
+                if rows is None:
+                    # 読み出しが追いつかず切断された。クライアントは retry 後に再接続する
+                    return
+                if instance_id is not None:
+                    rows = [row for row in rows if row["instance_id"] == instance_id]
+                if group_id is not None and rows:
+                    group_instance_ids = {inst["id"] for inst in await _get_instances_cached(False, group_id)}
+                    rows = [row for row in rows if row["instance_id"] in group_instance_ids]
+                if rows:
+                    # /api/metrics と同じ表記（UTC は "Z"）にそろえる
+                    data = _encode(rows, "application/json").decode()
+                    yield f"event: metrics\ndata: {data}\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("API_PORT", 8000))
@@ -4,14 +4,228 @@ VRChat API からデータを取得して DB に保存する。
 計算・表示ロジックは持たず、API が返す生値をそのまま渡す。
 """
 
+import os
 import json
+import math
 import time
+import socket
 import logging
-from vrc_api import VRChatAPI
-from db import Database
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+from vrc_api import VRChatAPI, RateLimitedError
+from db import Database, MetricSample
+from instrumentation import (
+    COLLECT_CYCLE_SECONDS,
+    COLLECT_LAST_SUCCESS_TIMESTAMP,
+    COLLECT_RATE_LIMITED_TOTAL,
+    COLLECT_CLAIMED_INSTANCES,
+    COLLECTOR_REPLICAS,
+)
 
 logger = logging.getLogger(__name__)
 
+# インスタンス詳細を並列取得するワーカー数。
+# 実際のリクエストレートは VRChatAPI.rate_limiter（トークンバケット）が決めるため、
+# ここはレイテンシを隠すのに十分な数があればよい。
+COLLECT_CONCURRENCY = int(os.environ.get("COLLECT_CONCURRENCY", 4))
+
+# 429 で取得できなかったインスタンスを同じサイクル内で再試行する最大回数
+COLLECT_RATE_LIMIT_RETRIES = int(os.environ.get("COLLECT_RATE_LIMIT_RETRIES", 3))
+# time_budget を渡されなかったときのサイクルの時間予算（秒）。再試行はこの範囲に収まる見込みのときだけ行う
+COLLECT_TIME_BUDGET_SECONDS = float(os.environ.get("COLLECT_TIME_BUDGET_SECONDS", 60))
+
+# 収集後にロールアップを再集計する範囲（分）。この時刻を含むバケットの先頭から集計し直す。
+ROLLUP_LOOKBACK_MINUTES = int(os.environ.get("ROLLUP_LOOKBACK_MINUTES", 60))
+
+# 変化がなくても instances 行を書き直す間隔（分）。取りこぼし・外部更新への保険。
+INSTANCE_META_REFRESH_MINUTES = int(os.environ.get("INSTANCE_META_REFRESH_MINUTES", 30))
+
+# instance_leases の持ち主として記録するレプリカ名（Kubernetes では Pod 名）
+COLLECTOR_REPLICA_ID = os.environ.get("COLLECTOR_REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+# リースをサイクルの時間予算より長く持つ秒数。ハートビートがこれより古いレプリカは落ちたとみなす
+COLLECT_LEASE_GRACE_SECONDS = float(os.environ.get("COLLECT_LEASE_GRACE_SECONDS", 60))
+# 次のポーリング時刻をポーリング間隔より早める秒数（main ループの刻み。ちょうど間隔後のサイクルで取れるように）
+_LEASE_SLACK_SECONDS = 5
+
+
+class LeasePlan(NamedTuple):
+    """1 サイクルでリースするインスタンス数とリースの長さ"""
+    share: int                # 公平な取り分（アクティブ数 / 生存レプリカ数、切り上げ）
+    capacity: int             # このレプリカのレートで time_budget 秒に取得できる数
+    limit: int                # 実際に取る数（share と capacity の小さい方）
+    lease_seconds: float      # リースの期限（time_budget + 猶予）
+    next_poll_seconds: float  # 取得を終えたインスタンスを次に取れるようになるまでの秒数
+
+
+def _plan_leases(
+    active: int, replicas: int, rate: float, time_budget: float, poll_interval: float
+) -> LeasePlan:
+    share = math.ceil(active / max(1, replicas))
+    capacity = max(1, int(rate * time_budget))
+    return LeasePlan(
+        share=share,
+        capacity=capacity,
+        limit=min(share, capacity),
+        lease_seconds=time_budget + COLLECT_LEASE_GRACE_SECONDS,
+        next_poll_seconds=max(poll_interval - _LEASE_SLACK_SECONDS, 0),
+    )
+
+
+class ReplicaHeartbeat:
+    """collector_replicas への生存記録を専用スレッド・専用接続で interval 秒ごとに行う
+
+    収集サイクルはポーリング間隔いっぱいまでメインループを塞ぐことがあるため、
+    メインループから送ると COLLECT_LEASE_GRACE_SECONDS を超えて途絶え、
+    ほかのレプリカから落ちたとみなされる（取り分が崩れる）。
+    """
+
+    def __init__(self, replica_id: str, interval: float):
+        self.replica_id = replica_id
+        self.interval = interval
+        self._db = Database()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """最初の 1 回は同期で送る（直後の収集で自分を生存レプリカに数えるため）"""
+        self._stop.clear()
+        self._db.heartbeat_replica(self.replica_id)
+        self._thread = threading.Thread(target=self._run, name="replica-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """スレッドを止めて接続を閉じる。remove_replica の前に呼ぶ（後から行を作り直さないように）"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self._db.close()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            # 接続が切れていれば heartbeat_replica（ensure_connected）が張り直す
+            self._db.heartbeat_replica(self.replica_id)
+
+
+class InstanceMetaCache:
+    """instances 行に最後に書いた内容を location ごとに覚えておくキャッシュ
+
+    world 名・サムネイル・capacity・type・region などはほぼ変わらないため、
+    前回書いた値（指紋）と同じなら upsert を省いて dead tuple の発生を抑える。
+    refresh_seconds を過ぎたエントリは変化がなくても書き直す。
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._entries: dict[str, tuple[tuple, float]] = {}
+        self.writes = 0
+        self.skipped = 0
+
+    @staticmethod
+    def _fingerprint(fields: dict) -> tuple:
+        return tuple(sorted(fields.items()))
+
+    def is_fresh(self, location: str, fields: dict) -> bool:
+        """前回書いた内容と同じで、強制リフレッシュ期限内なら True"""
+        entry = self._entries.get(location)
+        if entry is None:
+            return False
+        fingerprint, written_at = entry
+        if time.monotonic() - written_at >= self.refresh_seconds:
+            return False
+        return fingerprint == self._fingerprint(fields)
+
+    def mark_written(self, location: str, fields: dict) -> None:
+        self._entries[location] = (self._fingerprint(fields), time.monotonic())
+
+    def retain(self, locations: list[str]) -> None:
+        """指定 location 以外を捨てる。
+
+        非アクティブ化されたインスタンスが再出現したときに
+        upsert（is_active = TRUE）が確実に走るようにするため。
+        """
+        keep = set(locations)
+        for location in list(self._entries):
+            if location not in keep:
+                del self._entries[location]
+
+
+instance_cache = InstanceMetaCache(refresh_seconds=INSTANCE_META_REFRESH_MINUTES * 60)
+
+
+class InstanceStateTable:
+    """インスタンスごとの最新サンプルを保持し、「開いているか」を DB なしで判定する。
+
+    collect_metrics が取得のたびに更新する。プロセス起動直後で一度も収集していない
+    場合は Database.get_latest_metrics の結果で初期化する（seed）。
+    """
+
+    def __init__(self, max_age: timedelta = timedelta(hours=1)):
+        self.max_age = max_age
+        # instance_id -> (n_users, queue_enabled, observed_at)
+        self._states: dict[int, tuple[int, bool, datetime]] = {}
+        self.seeded = False
+
+    def update(self, instance_id: int, n_users: int, queue_enabled: bool, observed_at: datetime) -> None:
+        self._states[instance_id] = (n_users, queue_enabled, observed_at)
+        self.seeded = True
+
+    def merge(self, rows: list[dict]) -> None:
+        """DB から取得したインスタンスごとの最新行のうち、手元より新しいものを取り込む
+
+        複数レプリカで分担しているとき、ほかのレプリカが収集したインスタンスの状態を反映する。
+        """
+        for row in rows:
+            current = self._states.get(row["instance_id"])
+            if current is None or row["timestamp"] > current[2]:
+                self._states[row["instance_id"]] = (
+                    row["n_users"] or 0, bool(row["queue_enabled"]), row["timestamp"]
+                )
+        self.seeded = True
+
+    def seed(self, rows: list[dict]) -> None:
+        """DB から取得したインスタンスごとの最新行で初期化する（既存の値は上書きしない）"""
+        for row in rows:
+            self._states.setdefault(
+                row["instance_id"],
+                (row["n_users"] or 0, bool(row["queue_enabled"]), row["timestamp"]),
+            )
+        self.seeded = True
+
+    def retain(self, instance_ids: list[int]) -> None:
+        """非アクティブになったインスタンスの状態を捨てる"""
+        keep = set(instance_ids)
+        for instance_id in list(self._states):
+            if instance_id not in keep:
+                del self._states[instance_id]
+        self.seeded = True
+
+    def any_open(self) -> bool:
+        """直近 max_age 以内の最新サンプルで n_users > 0 または queue_enabled のものがあれば True"""
+        cutoff = datetime.now(timezone.utc) - self.max_age
+        return any(
+            observed_at > cutoff and (n_users > 0 or queue_enabled)
+            for n_users, queue_enabled, observed_at in self._states.values()
+        )
+
+
+instance_states = InstanceStateTable()
+
+
+def _upsert_instance_cached(db: Database, location: str, **fields) -> bool:
+    """内容が変わったときだけ upsert_instance を呼ぶ。書き込んだら True。"""
+    if instance_cache.is_fresh(location, fields):
+        instance_cache.skipped += 1
+        return False
+    if db.upsert_instance(location=location, **fields) is None:
+        return False
+    instance_cache.mark_written(location, fields)
+    instance_cache.writes += 1
+    return True
+
 
 def _format_instance_summary(inst: dict) -> str:
     world = inst.get("world") or {}
@@ -72,110 +286,252 @@ def _extract_world_images(world: dict | object) -> tuple[str | None, str | None]
     return thumbnail, image
 
 
-def discover_instances(api: VRChatAPI, db: Database, group_id: str) -> None:
-    """グループのアクティブなインスタンスを取得して DB に同期する。"""
-    try:
-        logger.info("Discovering group instances...")
-        group_instances = api.get_group_instances(group_id)
-
-        if not group_instances:
-            logger.info("No group instances found")
-            deactivated = db.deactivate_missing_instances([])
-            if deactivated:
-                logger.info(f"Deactivated {deactivated} old instances")
-            return
-
-        active_locations = []
-        for inst in group_instances:
-            logger.info(_format_instance_summary(inst))
-            location = inst.get("location") or inst.get("instanceId")
-            if not location:
-                continue
-
-            active_locations.append(location)
-            world = inst.get("world", {})
-            world_name = world.get("name", "Unknown") if isinstance(world, dict) else getattr(world, "name", "Unknown")
-            thumbnail, image = _extract_world_images(world)
-
-            db.upsert_instance(
-                location=location,
-                name=inst.get("name", "Unknown"),
-                world_name=world_name,
-                capacity=inst.get("capacity", 0),
-                world_thumbnail_url=thumbnail,
-                world_image_url=image,
-                instance_type=inst.get("type", "unknown"),
-                region=inst.get("region") or inst.get("photonRegion", "unknown"),
-                display_name=inst.get("display_name") or inst.get("displayName") or None,
-            )
+def discover_instances(api: VRChatAPI, db: Database, group_ids: list[str]) -> None:
+    """各グループのアクティブなインスタンスを取得して DB に同期する。
 
-        deactivated = db.deactivate_missing_instances(active_locations)
+    グループごとに取得・非アクティブ化を行い、取得に失敗したグループの行には触れない。
+    すべてのグループを取得できたときは、どのグループにも属さない（group_id 未設定の）
+    古い行も非アクティブにする。
+    """
+    active_locations: list[str] = []
+    changed = False
+    failed = False
+    for group_id in group_ids:
+        try:
+            locations, group_changed = _discover_group_instances(api, db, group_id)
+        except Exception as e:
+            logger.error(f"Error during instance discovery ({group_id}): {e}")
+            failed = True
+            continue
+        active_locations += locations
+        changed = changed or group_changed
+
+    if not failed:
+        deactivated = db.deactivate_missing_instances(active_locations, None)
         if deactivated:
-            logger.info(f"Deactivated {deactivated} old instances")
-        logger.info(f"Discovered {len(group_instances)} instances")
+            logger.info(f"Deactivated {deactivated} old instances without a group")
+            changed = True
+        instance_cache.retain(active_locations)
+    if changed:
+        db.notify_updated(json.dumps({"source": "discover"}))
+
+
+def _discover_group_instances(api: VRChatAPI, db: Database, group_id: str) -> tuple[list[str], bool]:
+    """1 グループ分を同期し、アクティブな location と DB を変更したかを返す"""
+    logger.info(f"Discovering group instances ({group_id})...")
+    group_instances = api.get_group_instances(group_id)
+
+    active_locations = []
+    for inst in group_instances:
+        logger.info(_format_instance_summary(inst))
+        location = inst.get("location") or inst.get("instanceId")
+        if not location:
+            continue
+
+        active_locations.append(location)
+        world = inst.get("world", {})
+        world_name = world.get("name", "Unknown") if isinstance(world, dict) else getattr(world, "name", "Unknown")
+        thumbnail, image = _extract_world_images(world)
+
+        _upsert_instance_cached(
+            db,
+            location=location,
+            name=inst.get("name", "Unknown"),
+            world_name=world_name,
+            capacity=inst.get("capacity", 0),
+            world_thumbnail_url=thumbnail,
+            world_image_url=image,
+            instance_type=inst.get("type", "unknown"),
+            region=inst.get("region") or inst.get("photonRegion", "unknown"),
+            display_name=inst.get("display_name") or inst.get("displayName") or None,
+            group_id=group_id,
+        )
 
-    except Exception as e:
-        logger.error(f"Error during instance discovery: {e}")
+    deactivated = db.deactivate_missing_instances(active_locations, group_id)
+    if deactivated:
+        logger.info(f"Deactivated {deactivated} old instances ({group_id})")
+    if group_instances:
+        logger.info(f"Discovered {len(group_instances)} instances ({group_id})")
+    else:
+        logger.info(f"No group instances found ({group_id})")
+    return active_locations, bool(group_instances) or bool(deactivated)
+
+
+def _fetch_instance_detail(api: VRChatAPI, location: str) -> Optional[dict]:
+    """ワーカースレッドで実行する。VRChat API の呼び出しのみ行い DB には触れない。"""
+    world_id, instance_id = location.split(":", 1)
+    return api.get_instance_detail(world_id, instance_id)
+
+
+def _build_sample(db: Database, inst: dict, detail: dict) -> MetricSample:
+    """取得したインスタンス詳細から instances 行を更新し、保存するサンプルを作る"""
+    location = inst["location"]
+    observed_at = datetime.now(timezone.utc)
+
+    _log_instance_detail(location, detail)
+
+    # --- 生値のみ取得（計算しない） ---
+    n_users: int = detail.get("n_users", 0) or 0
+    queue_size: int = detail.get("queue_size", 0) or 0
+    queue_enabled: bool = bool(detail.get("queue_enabled") or False)
+    capacity: int = detail.get("capacity", 0) or 0
+    pc_users: int = (detail.get("platforms") or {}).get("standalonewindows", 0) or 0
+
+    # インスタンス情報を detail の最新値で上書き（capacity 等が変わることがある）
+    world = detail.get("world") or {}
+    world_name = (
+        world.get("name", inst["world_name"]) if isinstance(world, dict) else inst["world_name"]
+    )
+    thumbnail, image = _extract_world_images(world)
+    _upsert_instance_cached(
+        db,
+        location=location,
+        name=detail.get("name", inst["name"]),
+        world_name=world_name,
+        capacity=capacity,
+        world_thumbnail_url=thumbnail or inst.get("world_thumbnail_url"),
+        world_image_url=image or inst.get("world_image_url"),
+        instance_type=detail.get("type", inst.get("instance_type", "unknown")),
+        region=detail.get("region") or detail.get("photon_region") or inst.get("region", "unknown"),
+        display_name=detail.get("display_name") or detail.get("displayName") or None,
+        group_id=inst.get("group_id"),
+    )
+
+    instance_states.update(inst["id"], n_users, queue_enabled, observed_at)
+    return MetricSample(inst["id"], n_users, queue_size, queue_enabled, pc_users, observed_at)
 
 
-def collect_metrics(api: VRChatAPI, db: Database) -> None:
+def collect_metrics(
+    api: VRChatAPI,
+    db: Database,
+    time_budget: Optional[float] = None,
+    poll_interval: Optional[float] = None,
+    replica_id: str = COLLECTOR_REPLICA_ID,
+) -> None:
     """アクティブなインスタンスの生メトリクスを収集して DB に保存する。
 
     計算（current_users, effective_queue）は API 返却時に行うため、
     ここでは VRChat が返した値をそのまま渡す。
+
+    対象は instance_leases でリースしたインスタンスだけ。複数レプリカで動かしても
+    各インスタンスはポーリング間隔ごとに 1 つのレプリカだけが取得する。1 回に取るのは
+    公平な取り分（アクティブ数 / 生存レプリカ数）と、このレプリカのレートリミッターで
+    time_budget 秒に取得できる数の小さい方。取得を終えたインスタンスは poll_interval 秒
+    （省略時は time_budget）後まで取らない。poll_interval が前のサイクルより短くなったときは、
+    前の間隔で先送りしたインスタンスも今の間隔で取り直す。
+
+    インスタンス詳細の取得は COLLECT_CONCURRENCY 本のスレッドで並列に行い、
+    リクエスト間隔は VRChatAPI のトークンバケットで制御する。
+    DB 書き込みは接続を共有しないよう呼び出し元スレッドでのみ行い、
+    メトリクスはサイクル分をバッファしてから 1 トランザクションで保存する。
+
+    429 で取得できなかったインスタンスは後回しにし、レートリミッターの見積もりで
+    time_budget 秒（省略時は COLLECT_TIME_BUDGET_SECONDS）以内に終わる場合だけ
+    同じサイクル内で再試行する（最大 COLLECT_RATE_LIMIT_RETRIES 回）。
+    再試行しきれなかったものはリースを手放し、次に空いたレプリカに回す。
     """
+    if time_budget is None:
+        time_budget = COLLECT_TIME_BUDGET_SECONDS
+    if poll_interval is None:
+        poll_interval = time_budget
     try:
         active_instances = db.get_active_instances()
+        instance_states.retain([inst["id"] for inst in active_instances])
         if not active_instances:
             logger.info("No active instances, skipping metrics collection")
             return
 
-        logger.info(f"Collecting metrics for {len(active_instances)} instances...")
-        saved = 0
-
-        for inst in active_instances:
-            location = inst["location"]
-            if ":" not in location:
-                continue
-
-            world_id, instance_id = location.split(":", 1)
-            detail = api.get_instance_detail(world_id, instance_id)
-            if not detail:
-                continue
-
-            _log_instance_detail(location, detail)
-
-            # --- 生値のみ取得（計算しない） ---
-            n_users: int = detail.get("n_users", 0) or 0
-            queue_size: int = detail.get("queue_size", 0) or 0
-            queue_enabled: bool = bool(detail.get("queue_enabled") or False)
-            capacity: int = detail.get("capacity", 0) or 0
-            pc_users: int = (detail.get("platforms") or {}).get("standalonewindows", 0) or 0
-
-            # インスタンス情報を detail の最新値で上書き（capacity 等が変わることがある）
-            world = detail.get("world") or {}
-            world_name = (
-                world.get("name", inst["world_name"]) if isinstance(world, dict) else inst["world_name"]
-            )
-            thumbnail, image = _extract_world_images(world)
-            db.upsert_instance(
-                location=location,
-                name=detail.get("name", inst["name"]),
-                world_name=world_name,
-                capacity=capacity,
-                world_thumbnail_url=thumbnail or inst.get("world_thumbnail_url"),
-                world_image_url=image or inst.get("world_image_url"),
-                instance_type=detail.get("type", inst.get("instance_type", "unknown")),
-                region=detail.get("region") or detail.get("photon_region") or inst.get("region", "unknown"),
-                display_name=detail.get("display_name") or detail.get("displayName") or None,
-            )
+        replicas = max(1, db.count_live_replicas(COLLECT_LEASE_GRACE_SECONDS))
+        COLLECTOR_REPLICAS.set(replicas)
+        if replicas > 1:
+            # ほかのレプリカが収集したインスタンスも「開いているか」の判定に含める
+            instance_states.merge(db.get_latest_metrics(hours=1))
 
-            if db.insert_metric(inst["id"], n_users, queue_size, queue_enabled, pc_users):
-                saved += 1
-
-            time.sleep(2.0)
+        plan = _plan_leases(
+            len(active_instances), replicas, api.rate_limiter.budget()["rate"], time_budget, poll_interval
+        )
+        claimed = db.claim_instance_leases(
+            replica_id, plan.limit, plan.lease_seconds, plan.next_poll_seconds
+        )
+        COLLECT_CLAIMED_INSTANCES.set(len(claimed))
+        if not claimed:
+            logger.info(f"No instances due for this replica ({len(active_instances)} active, {replicas} replicas)")
+            return
 
-        logger.info(f"Collection complete: {saved}/{len(active_instances)} saved")
+        targets = [inst for inst in claimed if ":" in inst["location"]]
+        logger.info(
+            f"Collecting metrics for {len(claimed)}/{len(active_instances)} instances "
+            f"(replica {replica_id}, {replicas} replicas, share {plan.share}, capacity {plan.capacity})..."
+        )
+        started = time.monotonic()
+        samples: list[MetricSample] = []
+        skipped_before = instance_cache.skipped
+        # 取得を終えた（次のポーリング時刻を進める）インスタンス。取得できない location も含める
+        polled: list[int] = [inst["id"] for inst in claimed if ":" not in inst["location"]]
+
+        try:
+            workers = max(1, min(COLLECT_CONCURRENCY, len(targets)))
+            pending = targets
+            retries = 0
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="collect") as pool:
+                while pending:
+                    rate_limited: list[dict] = []
+                    futures = {
+                        pool.submit(_fetch_instance_detail, api, inst["location"]): inst
+                        for inst in pending
+                    }
+                    for future in as_completed(futures):
+                        inst = futures[future]
+                        try:
+                            detail = future.result()
+                        except RateLimitedError:
+                            rate_limited.append(inst)
+                            continue
+                        except Exception as e:
+                            logger.error(f"Error fetching instance detail ({inst['location']}): {e}")
+                            polled.append(inst["id"])
+                            continue
+                        polled.append(inst["id"])
+                        if detail:
+                            samples.append(_build_sample(db, inst, detail))
+
+                    pending = []
+                    if not rate_limited:
+                        break
+                    estimated = api.rate_limiter.estimate_wait(len(rate_limited))
+                    remaining = time_budget - (time.monotonic() - started)
+                    if retries < COLLECT_RATE_LIMIT_RETRIES and estimated <= remaining:
+                        retries += 1
+                        COLLECT_RATE_LIMITED_TOTAL.labels("retried").inc(len(rate_limited))
+                        logger.info(
+                            f"Retrying {len(rate_limited)} rate-limited instances in this cycle "
+                            f"(attempt {retries}, estimated wait {estimated:.1f}s, {remaining:.0f}s left, "
+                            f"budget {api.rate_limiter.budget()})"
+                        )
+                        pending = rate_limited
+                    else:
+                        COLLECT_RATE_LIMITED_TOTAL.labels("skipped").inc(len(rate_limited))
+                        logger.warning(
+                            f"Releasing {len(rate_limited)} rate-limited instances to the next free replica "
+                            f"(estimated wait {estimated:.1f}s, {remaining:.0f}s left)"
+                        )
+
+            saved = db.insert_metrics(samples)
+        finally:
+            db.finish_instance_leases(replica_id, polled, plan.next_poll_seconds)
+
+        if saved:
+            db.refresh_rollups(lookback_minutes=ROLLUP_LOOKBACK_MINUTES)
+            # API のレスポンスキャッシュを破棄させる（保存とロールアップ更新のコミット後）
+            db.notify_updated(json.dumps({"source": "collect", "saved": saved}))
+            COLLECT_LAST_SUCCESS_TIMESTAMP.set_to_current_time()
+        elapsed = time.monotonic() - started
+        COLLECT_CYCLE_SECONDS.observe(elapsed)
+        logger.info(f"Collection complete: {saved}/{len(claimed)} saved in {elapsed:.1f}s")
+        logger.info(
+            f"Instance metadata: {instance_cache.skipped - skipped_before} unchanged upserts skipped this cycle "
+            f"(total written={instance_cache.writes} skipped={instance_cache.skipped})"
+        )
 
     except Exception as e:
         logger.error(f"Error during metrics collection: {e}")
@@ -1,12 +1,19 @@
 """Database操作クラス"""
 
 import os
+import re
 import logging
-from typing import Optional
-from datetime import datetime, timezone
+import threading
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple, Optional
+from datetime import datetime, timedelta, timezone
 import psycopg2
 from psycopg2 import extensions
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from instrumentation import timed_query, DB_ROWS_WRITTEN_TOTAL
+from query_profiler import ProfilingConnection
 
 # TIMESTAMP WITHOUT TIME ZONE (OID 1114) をUTC-awareなdatetimeとして返す
 def _cast_timestamp_utc(value, cursor):
@@ -18,25 +25,125 @@ def _cast_timestamp_utc(value, cursor):
 _TS_UTC = extensions.new_type((1114,), "TIMESTAMP_UTC", _cast_timestamp_utc)
 extensions.register_type(_TS_UTC)
 
+
+def _to_naive_utc(dt: datetime) -> datetime:
+    """TIMESTAMP カラム（UTC の naive 値）と比較するパラメータ用に変換する。naive は UTC とみなす。"""
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
 logger = logging.getLogger(__name__)
 
 
+def connect_params() -> dict:
+    """環境変数から接続パラメータを組み立てる"""
+    return {
+        "host": os.environ.get("DB_HOST", "localhost"),
+        "port": int(os.environ.get("DB_PORT", 5432)),
+        "database": os.environ.get("DB_NAME", "vrc_monitor"),
+        "user": os.environ.get("DB_USER", "postgres"),
+        "password": os.environ.get("DB_PASSWORD", "postgres"),
+    }
+
+
+# 表示用の派生値（API が返す current_users / queue_size）を SQL で計算する式。
+# m = metrics, i = instances のエイリアスを前提とする。
+#   - n_users = 0 かつ旧 current_users > 0 は migration 前のデータとして旧値を使う
+#   - n_users が capacity を超えた分は待機列とみなす
+#   - それ以外の queue_size は VRChat が返した値をそのまま信頼する（queue_enabled によるゲートは行わない）
+_DERIVED_CURRENT_USERS_SQL = """
+    CASE
+        WHEN m.n_users = 0 AND COALESCE(m.current_users, 0) > 0 THEN m.current_users
+        WHEN i.capacity > 0 AND m.n_users > i.capacity THEN i.capacity
+        ELSE m.n_users
+    END
+"""
+_DERIVED_QUEUE_SIZE_SQL = """
+    CASE
+        WHEN m.n_users = 0 AND COALESCE(m.current_users, 0) > 0 THEN m.queue_size
+        WHEN i.capacity > 0 AND m.n_users > i.capacity THEN m.n_users - i.capacity
+        ELSE m.queue_size
+    END
+"""
+
+# イベント日付: インスタンス作成時刻（UTC として保存）の JST 日付
+_EVENT_DATE_SQL = "(i.created_at AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Tokyo')::date"
+
+# ロールアップの解像度: 名前 -> (バケット幅[分], テーブル名, バケット開始時刻を求める SQL 式)
+# 式中の {ts} は対象のタイムスタンプ式に置き換える。
+ROLLUP_RESOLUTIONS: dict[str, tuple[int, str, str]] = {
+    "1m":  (1,  "metrics_rollup_1m",  "date_trunc('minute', {ts})"),
+    "15m": (15, "metrics_rollup_15m", "date_bin('15 minutes', {ts}, TIMESTAMP '2000-01-01')"),
+    "1h":  (60, "metrics_rollup_1h",  "date_trunc('hour', {ts})"),
+}
+
+# ロールアップの各バケットが持つ集計（列名の接尾辞 <列>_min / _max / _avg）
+ROLLUP_AGGREGATES = ("min", "max", "avg")
+
+
+# metrics のパーティション単位: off | monthly | weekly
+METRICS_PARTITIONING = os.environ.get("METRICS_PARTITIONING", "off").lower()
+# 何期間先までパーティションを作っておくか
+METRICS_PARTITIONS_AHEAD = int(os.environ.get("METRICS_PARTITIONS_AHEAD", 2))
+# この日数より古いデータだけを含むパーティションを切り離して削除する（0 = 無期限保持）
+METRICS_RETENTION_DAYS = int(os.environ.get("METRICS_RETENTION_DAYS", 0))
+
+_PARTITION_UPPER_RE = re.compile(r"TO \('([^']+)'\)")
+
+
+def _period_start(dt: datetime, interval: str) -> datetime:
+    """dt を含むパーティション期間の開始時刻（weekly は月曜始まり）"""
+    day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "weekly":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def _next_period(start: datetime, interval: str) -> datetime:
+    """期間開始時刻 start の次の期間の開始時刻"""
+    if interval == "weekly":
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+# コレクターがデータ更新を知らせる NOTIFY チャンネル（API がキャッシュ破棄などに使う）
+METRICS_CHANNEL = "vrc_metrics_updated"
+
+# pg_advisory_lock の 2 引数形式で使うキー（第 1 引数はこのアプリの名前空間）
+_ADVISORY_LOCK_NAMESPACE = 0x5651  # "VQ"
+_LOCK_COLLECTOR_LEADER = 1  # セッションロック: 発見・メンテナンスを担当するレプリカ
+_LOCK_MIGRATIONS = 2        # トランザクションロック: 複数レプリカの同時起動で run_migrations を直列化
+_LOCK_ROLLUPS = 3           # トランザクションロック: refresh_rollups を直列化
+
+
+class DatabaseUnavailable(Exception):
+    """プールから接続を借りられなかったときに送出する"""
+
+
+class MetricSample(NamedTuple):
+    """1回の取得で得た生値。observed_at は VRChat API から取得した時刻（UTC aware）。"""
+    instance_id: int
+    n_users: int
+    queue_size: int
+    queue_enabled: bool
+    pc_users: int
+    observed_at: datetime
+
+
 class Database:
     """PostgreSQL接続・操作クラス"""
 
-    def __init__(self):
-        self.conn: Optional[psycopg2.extensions.connection] = None
+    def __init__(self, conn: Optional[psycopg2.extensions.connection] = None):
+        # conn を渡された場合は DatabasePool から借りた接続。再接続・クローズはプールが管理する
+        self.conn: Optional[psycopg2.extensions.connection] = conn
+        self._pooled = conn is not None
 
     def connect(self) -> bool:
         """データベースに接続"""
         try:
-            self.conn = psycopg2.connect(
-                host=os.environ.get("DB_HOST", "localhost"),
-                port=int(os.environ.get("DB_PORT", 5432)),
-                database=os.environ.get("DB_NAME", "vrc_monitor"),
-                user=os.environ.get("DB_USER", "postgres"),
-                password=os.environ.get("DB_PASSWORD", "postgres"),
-            )
+            self.conn = psycopg2.connect(**connect_params(), connection_factory=ProfilingConnection)
             self.conn.autocommit = False
             logger.info("Database connected")
             return True
@@ -46,6 +153,10 @@ class Database:
 
     def ensure_connected(self) -> bool:
         """接続を確認し、必要なら再接続"""
+        if self._pooled:
+            # 壊れた接続はプールへの返却時に破棄されるため、ここでは往復しない
+            return self.conn is not None and not self.conn.closed
+
         if self.conn is None or self.conn.closed:
             return self.connect()
 
@@ -58,6 +169,8 @@ class Database:
 
     def close(self):
         """接続を閉じる"""
+        if self._pooled:
+            return
         if self.conn and not self.conn.closed:
             self.conn.close()
             logger.info("Database connection closed")
@@ -70,6 +183,19 @@ class Database:
         )
         return cur.fetchone() is not None
 
+    def _table_exists(self, cur, table: str) -> bool:
+        """information_schema でテーブル存在確認"""
+        cur.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name=%s",
+            (table,),
+        )
+        return cur.fetchone() is not None
+
+    def _index_exists(self, cur, index: str) -> bool:
+        """pg_class でインデックス存在確認（CREATE INDEX IF NOT EXISTS と違いテーブルロックを取らない）"""
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (index,))
+        return cur.fetchone()[0]
+
     def _column_has_default(self, cur, table: str, column: str) -> bool:
         """カラムに DEFAULT が設定されているか確認"""
         cur.execute(
@@ -79,6 +205,7 @@ class Database:
         row = cur.fetchone()
         return row is not None and row[0] is not None
 
+    @timed_query
     def run_migrations(self) -> bool:
         """スキーママイグレーションを実行（冪等・高速）
 
@@ -96,14 +223,20 @@ class Database:
             ("instances", "instance_type",        "ALTER TABLE instances ADD COLUMN instance_type TEXT"),
             ("instances", "region",               "ALTER TABLE instances ADD COLUMN region TEXT"),
             ("instances", "display_name",         "ALTER TABLE instances ADD COLUMN display_name TEXT"),
+            ("instances", "updated_at",           "ALTER TABLE instances ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT NOW()"),
+            ("instances", "group_id",             "ALTER TABLE instances ADD COLUMN group_id TEXT"),
             ("metrics",   "pc_users",             "ALTER TABLE metrics ADD COLUMN pc_users SMALLINT NOT NULL DEFAULT 0"),
             # 生データ保存用カラム
             ("metrics",   "n_users",              "ALTER TABLE metrics ADD COLUMN n_users SMALLINT NOT NULL DEFAULT 0"),
             ("metrics",   "queue_enabled",        "ALTER TABLE metrics ADD COLUMN queue_enabled BOOLEAN NOT NULL DEFAULT FALSE"),
+            # 書き込み順の番号（metrics_version）。これ以前の行は NULL のまま
+            ("metrics",   "version",              "ALTER TABLE metrics ADD COLUMN version BIGINT"),
         ]
 
         try:
             with self.conn.cursor() as cur:
+                # 先に起動したレプリカの適用が終わるまで待つ（lock_timeout の対象にしない）
+                cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (_ADVISORY_LOCK_NAMESPACE, _LOCK_MIGRATIONS))
                 cur.execute("SET LOCAL lock_timeout = '3s'")
                 cur.execute("SET LOCAL statement_timeout = '10s'")
 
@@ -113,22 +246,329 @@ class Database:
                         cur.execute(sql)
                         applied += 1
 
+                # グループで絞り込むためのインデックス（/api/* の group_id、グループごとの非アクティブ化）
+                if not self._index_exists(cur, "idx_instances_group_active"):
+                    cur.execute(self._INSTANCES_GROUP_INDEX_DDL)
+                    applied += 1
+
                 # current_users に DEFAULT を付与（新規 INSERT で省略できるようにする）
                 if not self._column_has_default(cur, "metrics", "current_users"):
                     cur.execute("ALTER TABLE metrics ALTER COLUMN current_users SET DEFAULT 0")
                     applied += 1
 
+                # 長期間表示用のロールアップテーブル
+                created_rollups = []
+                for _, table, _ in ROLLUP_RESOLUTIONS.values():
+                    if not self._table_exists(cur, table):
+                        cur.execute(self._ROLLUP_TABLE_DDL.format(table=table))
+                        created_rollups.append(table)
+                        applied += 1
+
+                # イベントグループの集計テーブル
+                created_event_groups = False
+                if not self._table_exists(cur, "event_groups"):
+                    cur.execute(self._EVENT_GROUPS_TABLE_DDL)
+                    created_event_groups = True
+                    applied += 1
+
+                # 複数レプリカのコレクターの分担（リースとハートビート）
+                for table, ddl in (("collector_replicas", self._COLLECTOR_REPLICAS_TABLE_DDL),
+                                   ("instance_leases", self._INSTANCE_LEASES_TABLE_DDL)):
+                    if not self._table_exists(cur, table):
+                        cur.execute(ddl)
+                        applied += 1
+
+                # SSE の配信位置・API の ETag に使う書き込み順の番号
+                if not self._table_exists(cur, "metrics_version"):
+                    cur.execute(self._METRICS_VERSION_TABLE_DDL)
+                    applied += 1
+
             self.conn.commit()
+
+            # 番号のインデックスは既存行の走査に時間がかかるため、タイムアウトを外して別トランザクションで作る
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (_ADVISORY_LOCK_NAMESPACE, _LOCK_MIGRATIONS))
+                if not self._index_exists(cur, "idx_metrics_version"):
+                    logger.info("Creating idx_metrics_version...")
+                    cur.execute("SET LOCAL statement_timeout = 0")
+                    cur.execute(self._METRICS_VERSION_INDEX_DDL)
+                    applied += 1
+            self.conn.commit()
+
             if applied:
                 logger.info(f"Migrations applied: {applied} changes")
             else:
                 logger.info("Migrations: already up to date, skipped")
+
+            # 新規作成したロールアップは既存データから埋める（タイムアウトは別枠）
+            if created_rollups:
+                logger.info(f"Backfilling rollups: {', '.join(created_rollups)}")
+                self.refresh_rollups(lookback_minutes=None)
+            if created_event_groups:
+                logger.info("Backfilling event_groups")
+                self.rebuild_event_groups()
+
+            if METRICS_PARTITIONING in ("monthly", "weekly"):
+                if not self.partition_metrics(METRICS_PARTITIONING):
+                    return False
+                self.maintain_metrics_partitions()
             return True
         except Exception as e:
             logger.error(f"Migration failed: {e}")
             self.conn.rollback()
             return False
 
+    def _metrics_is_partitioned(self, cur) -> bool:
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('metrics')")
+        row = cur.fetchone()
+        return row is not None and row[0] == "p"
+
+    @timed_query
+    def partition_metrics(self, interval: str) -> bool:
+        """metrics を timestamp のレンジパーティションテーブルに変換する（冪等）。
+
+        既存テーブルは metrics_legacy に改名し、(MINVALUE, 次の期間の開始) の
+        パーティションとしてそのまま ATTACH する。データのコピーは行わないため、
+        所要時間は既存行の範囲チェック（1 回のスキャン）程度で済む。
+        インデックスは親テーブルに作り直し、既存の同等インデックスはそのまま流用される。
+        """
+        if not self.ensure_connected():
+            return False
+
+        try:
+            with self.conn.cursor() as cur:
+                if self._metrics_is_partitioned(cur):
+                    self.conn.rollback()
+                    return True
+
+                logger.info(f"Converting metrics to a {interval} range-partitioned table...")
+                cur.execute("SET LOCAL lock_timeout = '10s'")
+                cur.execute("SET LOCAL statement_timeout = 0")
+
+                # TIMESTAMP は UTC-aware で返るよう登録しているため、境界値は naive に戻して渡す
+                cur.execute("SELECT LOCALTIMESTAMP")
+                now = cur.fetchone()[0].replace(tzinfo=None)
+                boundary = _next_period(_period_start(now, interval), interval)
+
+                cur.execute("ALTER TABLE metrics RENAME TO metrics_legacy")
+                cur.execute("ALTER INDEX IF EXISTS idx_metrics_instance_timestamp RENAME TO idx_metrics_legacy_instance_timestamp")
+                cur.execute("ALTER INDEX IF EXISTS idx_metrics_timestamp RENAME TO idx_metrics_legacy_timestamp")
+                cur.execute("ALTER INDEX IF EXISTS idx_metrics_version RENAME TO idx_metrics_legacy_version")
+                cur.execute("""
+                    CREATE TABLE metrics (LIKE metrics_legacy INCLUDING DEFAULTS)
+                    PARTITION BY RANGE (timestamp)
+                """)
+                cur.execute("""
+                    ALTER TABLE metrics ADD CONSTRAINT metrics_instance_id_fkey
+                    FOREIGN KEY (instance_id) REFERENCES instances(id) ON DELETE CASCADE
+                """)
+                cur.execute(
+                    "ALTER TABLE metrics ATTACH PARTITION metrics_legacy FOR VALUES FROM (MINVALUE) TO (%s)",
+                    (boundary,),
+                )
+                cur.execute("CREATE INDEX idx_metrics_instance_timestamp ON metrics (instance_id, timestamp DESC)")
+                cur.execute("CREATE INDEX idx_metrics_timestamp ON metrics (timestamp DESC)")
+                cur.execute(self._METRICS_VERSION_INDEX_DDL)
+
+            self.conn.commit()
+            logger.info(f"metrics partitioned ({interval}); legacy rows kept up to {boundary}")
+            return True
+        except Exception as e:
+            logger.error(f"Partitioning metrics failed: {e}")
+            self.conn.rollback()
+            return False
+
+    def _metrics_partitions(self, cur) -> list[tuple[str, Optional[datetime]]]:
+        """metrics のパーティション (名前, 上限) 一覧。上限が MAXVALUE のものは None"""
+        cur.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits inh
+            JOIN pg_class c ON c.oid = inh.inhrelid
+            WHERE inh.inhparent = to_regclass('metrics')
+        """)
+        partitions = []
+        for name, bound in cur.fetchall():
+            match = _PARTITION_UPPER_RE.search(bound or "")
+            partitions.append((name, datetime.fromisoformat(match.group(1)) if match else None))
+        return partitions
+
+    @timed_query
+    def maintain_metrics_partitions(
+        self,
+        interval: str = METRICS_PARTITIONING,
+        ahead: int = METRICS_PARTITIONS_AHEAD,
+        retention_days: int = METRICS_RETENTION_DAYS,
+    ) -> bool:
+        """先の期間のパーティションを作成し、保持期間を過ぎたパーティションを切り離して削除する。
+
+        metrics がパーティションテーブルでなければ何もしない。
+        古いデータの削除は DELETE ではなく DETACH + DROP で行う。
+        ロールアップと event_groups も同じ保持期間で古い行を DELETE する
+        （metrics 側はパーティション単位なので、生データより少し先に消える）。
+        """
+        if not self.ensure_connected():
+            return False
+
+        try:
+            with self.conn.cursor() as cur:
+                if not self._metrics_is_partitioned(cur):
+                    self.conn.rollback()
+                    return True
+                cur.execute("SET LOCAL lock_timeout = '5s'")
+                cur.execute("SELECT LOCALTIMESTAMP")
+                now = cur.fetchone()[0].replace(tzinfo=None)
+                partitions = self._metrics_partitions(cur)
+
+                # 既存パーティションの上限の続きから、now + ahead 期間分まで作る
+                covered = max((upper for _, upper in partitions if upper), default=None)
+                start = _period_start(now, interval)
+                if covered and covered > start:
+                    start = covered
+                horizon = _period_start(now, interval)
+                for _ in range(ahead + 1):
+                    horizon = _next_period(horizon, interval)
+                created = 0
+                while start < horizon:
+                    end = _next_period(start, interval)
+                    cur.execute(
+                        f"CREATE TABLE IF NOT EXISTS metrics_p{start:%Y%m%d} PARTITION OF metrics "
+                        f"FOR VALUES FROM (%s) TO (%s)",
+                        (start, end),
+                    )
+                    created += 1
+                    start = end
+
+                dropped = []
+                pruned = 0
+                if retention_days > 0:
+                    cutoff = now - timedelta(days=retention_days)
+                    for name, upper in partitions:
+                        if upper is not None and upper <= cutoff:
+                            cur.execute(f'ALTER TABLE metrics DETACH PARTITION "{name}"')
+                            cur.execute(f'DROP TABLE "{name}"')
+                            dropped.append(name)
+                    for _, table, _ in ROLLUP_RESOLUTIONS.values():
+                        cur.execute(f"DELETE FROM {table} WHERE bucket < %s", (cutoff,))
+                        pruned += cur.rowcount
+                    # 最後のサンプルが保持期間より古いイベントだけを消す
+                    cur.execute("DELETE FROM event_groups WHERE end_time < %s", (cutoff,))
+                    pruned += cur.rowcount
+
+            self.conn.commit()
+            if created:
+                logger.info(f"Created {created} metrics partitions ahead")
+            if dropped:
+                logger.info(f"Dropped expired metrics partitions: {', '.join(dropped)}")
+            if pruned:
+                logger.info(f"Pruned {pruned} expired rollup/event_groups rows")
+            return True
+        except Exception as e:
+            logger.error(f"Metrics partition maintenance failed: {e}")
+            self.conn.rollback()
+            return False
+
+    _EVENT_GROUPS_TABLE_DDL = """
+        CREATE TABLE IF NOT EXISTS event_groups (
+            event_date DATE NOT NULL,
+            instance_id INTEGER NOT NULL REFERENCES instances(id) ON DELETE CASCADE,
+            start_time TIMESTAMP NOT NULL,
+            end_time TIMESTAMP NOT NULL,
+            peak_queue SMALLINT NOT NULL,
+            peak_users SMALLINT NOT NULL,
+            sample_count INTEGER NOT NULL,
+            PRIMARY KEY (event_date, instance_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_event_groups_end_time ON event_groups (end_time DESC);
+    """
+
+    _COLLECTOR_REPLICAS_TABLE_DDL = """
+        CREATE TABLE IF NOT EXISTS collector_replicas (
+            replica_id TEXT PRIMARY KEY,
+            started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            heartbeat_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+    """
+
+    _INSTANCE_LEASES_TABLE_DDL = """
+        CREATE TABLE IF NOT EXISTS instance_leases (
+            instance_id INTEGER PRIMARY KEY REFERENCES instances(id) ON DELETE CASCADE,
+            owner TEXT,
+            leased_at TIMESTAMP,
+            leased_until TIMESTAMP,
+            next_poll_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+        CREATE INDEX IF NOT EXISTS idx_instance_leases_next_poll ON instance_leases (next_poll_at);
+    """
+
+    # metrics への書き込みごとに 1 つ進む番号（1 行だけ）。INSERT と同じトランザクションで更新するため
+    # 行ロックで書き込みが直列化され、番号の大小がコミット順と一致する。
+    # observed_at（metrics.timestamp）は複数レプリカの間ではコミット順と一致しないので配信位置に使えない
+    _METRICS_VERSION_TABLE_DDL = """
+        CREATE TABLE IF NOT EXISTS metrics_version (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+        INSERT INTO metrics_version (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+    """
+
+    _METRICS_VERSION_INDEX_DDL = """
+        CREATE INDEX IF NOT EXISTS idx_metrics_version ON metrics (version) WHERE version IS NOT NULL
+    """
+
+    @timed_query
+    def rebuild_event_groups(self) -> bool:
+        """event_groups を metrics 全体から作り直す（初回のバックフィル用）"""
+        if not self.ensure_connected():
+            return False
+
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = '5min'")
+                cur.execute("DELETE FROM event_groups")
+                cur.execute(f"""
+                    INSERT INTO event_groups (
+                        event_date, instance_id, start_time, end_time,
+                        peak_queue, peak_users, sample_count
+                    )
+                    SELECT {_EVENT_DATE_SQL}, m.instance_id, MIN(m.timestamp), MAX(m.timestamp),
+                           MAX({_DERIVED_QUEUE_SIZE_SQL}), MAX({_DERIVED_CURRENT_USERS_SQL}), COUNT(*)
+                    FROM metrics m
+                    JOIN instances i ON m.instance_id = i.id
+                    GROUP BY 1, 2
+                """)
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error rebuilding event groups: {e}")
+            self.conn.rollback()
+            return False
+
+    _ROLLUP_TABLE_DDL = """
+        CREATE TABLE IF NOT EXISTS {table} (
+            bucket TIMESTAMP NOT NULL,
+            instance_id INTEGER NOT NULL REFERENCES instances(id) ON DELETE CASCADE,
+            samples INTEGER NOT NULL,
+            queue_size_min SMALLINT NOT NULL,
+            queue_size_max SMALLINT NOT NULL,
+            queue_size_avg REAL NOT NULL,
+            current_users_min SMALLINT NOT NULL,
+            current_users_max SMALLINT NOT NULL,
+            current_users_avg REAL NOT NULL,
+            pc_users_min SMALLINT NOT NULL,
+            pc_users_max SMALLINT NOT NULL,
+            pc_users_avg REAL NOT NULL,
+            PRIMARY KEY (instance_id, bucket)
+        );
+        CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (bucket DESC);
+    """
+
+    _INSTANCES_GROUP_INDEX_DDL = """
+        CREATE INDEX IF NOT EXISTS idx_instances_group_active
+        ON instances (group_id, is_active, created_at DESC)
+    """
+
+    @timed_query
     def upsert_instance(
         self,
         location: str,
@@ -140,10 +580,13 @@ class Database:
         instance_type: Optional[str] = None,
         region: Optional[str] = None,
         display_name: Optional[str] = None,
+        group_id: Optional[str] = None,
     ) -> Optional[int]:
         """
         インスタンスをUpsert（なければ追加、あれば更新）
 
+        group_id が None のときは既存行のグループを変えない。
+
         Returns:
             instance_id または None
         """
@@ -155,9 +598,9 @@ class Database:
                 cur.execute("""
                     INSERT INTO instances (
                         location, name, display_name, world_name, capacity,
-                        world_thumbnail_url, world_image_url, instance_type, region
+                        world_thumbnail_url, world_image_url, instance_type, region, group_id
                     )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                     ON CONFLICT (location) DO UPDATE SET
                         name = EXCLUDED.name,
                         display_name = EXCLUDED.display_name,
@@ -167,15 +610,18 @@ class Database:
                         world_image_url = EXCLUDED.world_image_url,
                         instance_type = EXCLUDED.instance_type,
                         region = EXCLUDED.region,
-                        is_active = TRUE
+                        group_id = COALESCE(EXCLUDED.group_id, instances.group_id),
+                        is_active = TRUE,
+                        updated_at = NOW()
                     RETURNING id
                 """, (location, name, display_name, world_name, capacity,
-                      world_thumbnail_url, world_image_url, instance_type, region))
+                      world_thumbnail_url, world_image_url, instance_type, region, group_id))
 
                 result = cur.fetchone()
                 self.conn.commit()
 
                 if result:
+                    DB_ROWS_WRITTEN_TOTAL.labels("instances").inc()
                     return result[0]
                 return None
 
@@ -184,57 +630,276 @@ class Database:
             self.conn.rollback()
             return None
 
-    def deactivate_missing_instances(self, active_locations: list[str]) -> int:
-        """指定されたlocationリストに含まれないインスタンスを非アクティブにする"""
+    @timed_query
+    def deactivate_missing_instances(self, active_locations: list[str], group_id: Optional[str]) -> int:
+        """グループのインスタンスのうち、指定されたlocationリストに含まれないものを非アクティブにする
+
+        group_id が None のときはグループ未設定（複数グループ対応前に登録された）の行が対象。
+        """
         if not self.ensure_connected():
             return 0
 
         try:
             with self.conn.cursor() as cur:
-                if not active_locations:
-                    cur.execute("UPDATE instances SET is_active = FALSE WHERE is_active = TRUE")
+                where = "is_active = TRUE AND location != ALL(%s)"
+                params: tuple = (active_locations,)
+                if group_id is None:
+                    where += " AND group_id IS NULL"
                 else:
-                    cur.execute("""
-                        UPDATE instances
-                        SET is_active = FALSE
-                        WHERE is_active = TRUE AND location != ALL(%s)
-                    """, (active_locations,))
+                    where += " AND group_id = %s"
+                    params = (active_locations, group_id)
+                cur.execute(f"""
+                    UPDATE instances
+                    SET is_active = FALSE, updated_at = NOW()
+                    WHERE {where}
+                """, params)
 
                 rowcount = cur.rowcount
                 self.conn.commit()
+                DB_ROWS_WRITTEN_TOTAL.labels("instances").inc(rowcount)
                 return rowcount
         except Exception as e:
             logger.error(f"Error deactivating instances: {e}")
             self.conn.rollback()
             return 0
 
-    def insert_metric(
-        self,
-        instance_id: int,
-        n_users: int,
-        queue_size: int,
-        queue_enabled: bool,
-        pc_users: int = 0,
-    ) -> bool:
-        """VRChat API から取得した生値をそのまま記録する。
-        派生値（current_users 等）は API 返却時に計算する。
+    @timed_query
+    def assign_instances_to_group(self, group_id: str) -> int:
+        """グループ未設定のインスタンスをすべて group_id に割り当てる
+
+        単一グループで運用していた頃の行（非アクティブなものを含む）を、
+        group_id での絞り込みに含めるために使う。
         """
         if not self.ensure_connected():
-            return False
+            return 0
 
         try:
             with self.conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO metrics (instance_id, n_users, queue_size, queue_enabled, pc_users)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (instance_id, n_users, queue_size, queue_enabled, pc_users))
+                cur.execute("UPDATE instances SET group_id = %s WHERE group_id IS NULL", (group_id,))
+                rowcount = cur.rowcount
                 self.conn.commit()
-                return True
+                DB_ROWS_WRITTEN_TOTAL.labels("instances").inc(rowcount)
+                return rowcount
         except Exception as e:
-            logger.error(f"Error inserting metric: {e}")
+            logger.error(f"Error assigning instances to group: {e}")
+            self.conn.rollback()
+            return 0
+
+    # timestamptz として渡し、列 (TIMESTAMP) への代入時にセッションの TimeZone で変換させる。
+    # DEFAULT NOW() で記録していた頃と同じ変換規則になる。
+    # 挿入した行はそのまま event_groups の集計に足し込む（同じ文の中なので常に整合する）。
+    _INSERT_METRICS_SQL = f"""
+        WITH m AS (
+            INSERT INTO metrics (instance_id, n_users, queue_size, queue_enabled, pc_users, timestamp, version)
+            VALUES %s
+            RETURNING *
+        )
+        INSERT INTO event_groups (
+            event_date, instance_id, start_time, end_time,
+            peak_queue, peak_users, sample_count
+        )
+        SELECT {_EVENT_DATE_SQL}, m.instance_id, MIN(m.timestamp), MAX(m.timestamp),
+               MAX({_DERIVED_QUEUE_SIZE_SQL}), MAX({_DERIVED_CURRENT_USERS_SQL}), COUNT(*)
+        FROM m
+        JOIN instances i ON m.instance_id = i.id
+        GROUP BY 1, 2
+        ON CONFLICT (event_date, instance_id) DO UPDATE SET
+            start_time = LEAST(event_groups.start_time, EXCLUDED.start_time),
+            end_time = GREATEST(event_groups.end_time, EXCLUDED.end_time),
+            peak_queue = GREATEST(event_groups.peak_queue, EXCLUDED.peak_queue),
+            peak_users = GREATEST(event_groups.peak_users, EXCLUDED.peak_users),
+            sample_count = event_groups.sample_count + EXCLUDED.sample_count
+    """
+    _INSERT_METRICS_TEMPLATE = "(%s, %s, %s, %s, %s, %s::timestamptz, %s)"
+
+    def _bump_metrics_version(self, cur) -> int:
+        """metrics_version を 1 つ進めて新しい番号を返す。
+
+        行ロックはコミットまで保持されるため、他の書き込みはこのトランザクションの終了を待ってから
+        次の番号を得る（番号の順にコミットされる）。行がなければ作る。
+        """
+        cur.execute("""
+            INSERT INTO metrics_version (id, version) VALUES (TRUE, 1)
+            ON CONFLICT (id) DO UPDATE SET
+                version = metrics_version.version + 1,
+                updated_at = clock_timestamp()::timestamp
+            RETURNING version
+        """)
+        return cur.fetchone()[0]
+
+    @timed_query
+    def insert_metrics(self, samples: list[MetricSample]) -> int:
+        """1サイクル分の生値を 1 トランザクション・複数行 INSERT でまとめて記録する。
+
+        同じ文で event_groups（イベント日付 × インスタンスの集計）も更新する。
+
+        一括 INSERT が失敗した場合（削除済みインスタンスへの FK 違反など）は
+        ロールバックし、同じトランザクション内で行ごとに SAVEPOINT を張って再試行する。
+        失敗した行だけを捨て、残りは 1 回の COMMIT で保存する。
+
+        Returns:
+            保存できた行数
+        """
+        if not samples:
+            return 0
+        if not self.ensure_connected():
+            return 0
+
+        try:
+            with self.conn.cursor() as cur:
+                version = self._bump_metrics_version(cur)
+                execute_values(
+                    cur, self._INSERT_METRICS_SQL, [(*sample, version) for sample in samples],
+                    template=self._INSERT_METRICS_TEMPLATE, page_size=len(samples),
+                )
+            self.conn.commit()
+            DB_ROWS_WRITTEN_TOTAL.labels("metrics").inc(len(samples))
+            return len(samples)
+        except Exception as e:
+            logger.warning(f"Batch metric insert failed, retrying row by row: {e}")
+            self.conn.rollback()
+
+        saved = 0
+        try:
+            with self.conn.cursor() as cur:
+                version = self._bump_metrics_version(cur)
+                for sample in samples:
+                    cur.execute("SAVEPOINT metric_row")
+                    try:
+                        execute_values(
+                            cur, self._INSERT_METRICS_SQL, [(*sample, version)],
+                            template=self._INSERT_METRICS_TEMPLATE,
+                        )
+                        cur.execute("RELEASE SAVEPOINT metric_row")
+                        saved += 1
+                    except Exception as e:
+                        logger.error(f"Error inserting metric for instance {sample.instance_id}: {e}")
+                        cur.execute("ROLLBACK TO SAVEPOINT metric_row")
+            self.conn.commit()
+            DB_ROWS_WRITTEN_TOTAL.labels("metrics").inc(saved)
+            return saved
+        except Exception as e:
+            logger.error(f"Error inserting metrics: {e}")
+            self.conn.rollback()
+            return 0
+
+    @timed_query
+    def refresh_rollups(self, lookback_minutes: Optional[int] = 60) -> bool:
+        """生メトリクスからロールアップを再集計する（冪等）。
+
+        各解像度で「NOW() - lookback を含むバケットの先頭」以降を生データから集計し直して
+        upsert する。バケット単位で丸ごと再計算するため、途中のバケットも常に正しい値になる。
+        lookback_minutes=None なら全期間（初回のバックフィル用）。
+        """
+        if not self.ensure_connected():
+            return False
+
+        try:
+            with self.conn.cursor() as cur:
+                # 複数レプリカが同じバケットを同時に upsert しないよう直列化する。
+                # 待ったあとの文は新しいスナップショットで読むため、先に保存された行も集計に入る
+                cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (_ADVISORY_LOCK_NAMESPACE, _LOCK_ROLLUPS))
+                cur.execute("SET LOCAL statement_timeout = '5min'")
+                for _, table, bucket_sql in ROLLUP_RESOLUTIONS.values():
+                    bucket_expr = bucket_sql.format(ts="m.timestamp")
+                    if lookback_minutes is None:
+                        where = "TRUE"
+                        params: tuple = ()
+                    else:
+                        lower = bucket_sql.format(ts="LOCALTIMESTAMP - MAKE_INTERVAL(mins => %s::integer)")
+                        where = f"m.timestamp >= {lower}"
+                        params = (lookback_minutes,)
+                    cur.execute(f"""
+                        INSERT INTO {table} (
+                            bucket, instance_id, samples,
+                            queue_size_min, queue_size_max, queue_size_avg,
+                            current_users_min, current_users_max, current_users_avg,
+                            pc_users_min, pc_users_max, pc_users_avg
+                        )
+                        SELECT bucket, instance_id, COUNT(*),
+                               MIN(queue_size), MAX(queue_size), AVG(queue_size),
+                               MIN(current_users), MAX(current_users), AVG(current_users),
+                               MIN(pc_users), MAX(pc_users), AVG(pc_users)
+                        FROM (
+                            SELECT {bucket_expr} AS bucket,
+                                   m.instance_id,
+                                   {_DERIVED_QUEUE_SIZE_SQL} AS queue_size,
+                                   {_DERIVED_CURRENT_USERS_SQL} AS current_users,
+                                   m.pc_users
+                            FROM metrics m
+                            JOIN instances i ON m.instance_id = i.id
+                            WHERE {where}
+                        ) d
+                        GROUP BY bucket, instance_id
+                        ON CONFLICT (instance_id, bucket) DO UPDATE SET
+                            samples = EXCLUDED.samples,
+                            queue_size_min = EXCLUDED.queue_size_min,
+                            queue_size_max = EXCLUDED.queue_size_max,
+                            queue_size_avg = EXCLUDED.queue_size_avg,
+                            current_users_min = EXCLUDED.current_users_min,
+                            current_users_max = EXCLUDED.current_users_max,
+                            current_users_avg = EXCLUDED.current_users_avg,
+                            pc_users_min = EXCLUDED.pc_users_min,
+                            pc_users_max = EXCLUDED.pc_users_max,
+                            pc_users_avg = EXCLUDED.pc_users_avg
+                    """, params)
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error refreshing rollups: {e}")
+            self.conn.rollback()
+            return False
+
+    @timed_query
+    def notify_updated(self, payload: str = "") -> bool:
+        """METRICS_CHANNEL に NOTIFY を送る（コミット済みの更新を API に知らせる）"""
+        if not self.ensure_connected():
+            return False
+
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT pg_notify(%s, %s)", (METRICS_CHANNEL, payload))
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error sending notification: {e}")
             self.conn.rollback()
             return False
 
+    @timed_query
+    def get_data_version(self, instance_id: Optional[int] = None) -> dict:
+        """レスポンスの検証子に使う書き込み番号と最終更新時刻を返す。
+
+        metrics_version / metrics_updated_at: metrics_version の番号と最後に書き込まれた時刻
+            （コミット順なので、観測時刻が古い行が後から保存されても必ず変わる）
+        instances_updated_at: instances の最終 upsert / 非アクティブ化時刻
+        instance_id を指定すると instances 側だけそのインスタンスに絞る
+        （metrics 側は全体の番号を使うため、他のインスタンスの書き込みでも変わる）。
+        """
+        if not self.ensure_connected():
+            raise DatabaseUnavailable("Database is not connected")
+
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if instance_id is None:
+                    cur.execute("""
+                        SELECT (SELECT version FROM metrics_version) AS metrics_version,
+                               (SELECT updated_at FROM metrics_version) AS metrics_updated_at,
+                               (SELECT MAX(updated_at) FROM instances) AS instances_updated_at
+                    """)
+                else:
+                    cur.execute("""
+                        SELECT (SELECT version FROM metrics_version) AS metrics_version,
+                               (SELECT updated_at FROM metrics_version) AS metrics_updated_at,
+                               (SELECT updated_at FROM instances WHERE id = %s) AS instances_updated_at
+                    """, (instance_id,))
+                return dict(cur.fetchone())
+
+        except Exception as e:
+            logger.error(f"Error getting data version: {e}")
+            raise
+
+    @timed_query
     def get_active_instances(self) -> list[dict]:
         """アクティブなインスタンス一覧を取得"""
         if not self.ensure_connected():
@@ -245,7 +910,7 @@ class Database:
                 cur.execute("""
                     SELECT id, location, name, display_name, world_name, capacity,
                            world_thumbnail_url, world_image_url, instance_type, region,
-                           created_at
+                           group_id, created_at
                     FROM instances
                     WHERE is_active = TRUE
                     ORDER BY created_at DESC
@@ -256,6 +921,49 @@ class Database:
             logger.error(f"Error getting active instances: {e}")
             return []
 
+    @timed_query
+    def get_instances(self, active_only: bool = True, group_id: Optional[str] = None) -> list[dict]:
+        """インスタンス一覧を取得（新しい順）。group_id を指定するとそのグループのみ"""
+        if not self.ensure_connected():
+            raise DatabaseUnavailable("Database is not connected")
+
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                conditions: list[str] = []
+                params: list = []
+                if group_id is not None:
+                    conditions.append("group_id = %s")
+                    params.append(group_id)
+                if active_only:
+                    conditions.append("is_active = TRUE")
+                sql = "SELECT * FROM instances"
+                if conditions:
+                    sql += " WHERE " + " AND ".join(conditions)
+                sql += " ORDER BY created_at DESC"
+                cur.execute(sql, params)
+                return [dict(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.error(f"Error getting instances: {e}")
+            raise
+
+    @timed_query
+    def get_instance(self, instance_id: int) -> Optional[dict]:
+        """ID でインスタンスを 1 件取得"""
+        if not self.ensure_connected():
+            raise DatabaseUnavailable("Database is not connected")
+
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("SELECT * FROM instances WHERE id = %s", (instance_id,))
+                row = cur.fetchone()
+                return dict(row) if row else None
+
+        except Exception as e:
+            logger.error(f"Error getting instance: {e}")
+            raise
+
+    @timed_query
     def get_instance_metrics(self, instance_id: int, hours: int = 3) -> list[dict]:
         """特定インスタンスの直近メトリクスを取得（生値）"""
         if not self.ensure_connected():
@@ -277,35 +985,273 @@ class Database:
             logger.error(f"Error getting instance metrics: {e}")
             return []
 
+    @timed_query
+    def get_latest_metrics(self, hours: int = 1) -> list[dict]:
+        """アクティブなインスタンスごとの直近 N 時間で最新の 1 行を取得（生値）
+
+        idx_metrics_instance_timestamp を使う DISTINCT ON で 1 クエリにまとめる。
+        """
+        if not self.ensure_connected():
+            return []
+
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT DISTINCT ON (m.instance_id)
+                           m.instance_id, m.timestamp, m.n_users, m.queue_enabled
+                    FROM metrics m
+                    JOIN instances i ON i.id = m.instance_id
+                    WHERE i.is_active = TRUE
+                      AND m.timestamp > NOW() - MAKE_INTERVAL(hours => %s::integer)
+                    ORDER BY m.instance_id, m.timestamp DESC
+                """, (hours,))
+                return [dict(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.error(f"Error getting latest metrics: {e}")
+            return []
+
+    # ------------------------------------------------------------------
+    # コレクターの分担（複数レプリカ）
+    # ------------------------------------------------------------------
+
+    @timed_query
+    def try_acquire_leader(self) -> bool:
+        """発見・メンテナンスを担当するレプリカのセッションロックを取る（取れていれば True）
+
+        接続が切れるとロックは外れ、次に呼んだ別のレプリカが引き継ぐ。
+        保持中に呼んでも重ねて取らないよう、pg_locks で自分の保持を先に確認する。
+        """
+        if not self.ensure_connected():
+            return False
+
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("""
+                    SELECT CASE
+                        WHEN EXISTS (
+                            SELECT 1 FROM pg_locks
+                            WHERE locktype = 'advisory' AND pid = pg_backend_pid()
+                              AND classid = %s AND objid = %s AND objsubid = 2
+                        ) THEN TRUE
+                        ELSE pg_try_advisory_lock(%s, %s)
+                    END
+                """, (_ADVISORY_LOCK_NAMESPACE, _LOCK_COLLECTOR_LEADER,
+                      _ADVISORY_LOCK_NAMESPACE, _LOCK_COLLECTOR_LEADER))
+                acquired = cur.fetchone()[0]
+            self.conn.commit()
+            return acquired
+        except Exception as e:
+            logger.error(f"Error acquiring collector leader lock: {e}")
+            self.conn.rollback()
+            return False
+
+    @timed_query
+    def heartbeat_replica(self, replica_id: str) -> bool:
+        """レプリカの生存を記録し、1 日以上応答のないレプリカの行を消す"""
+        if not self.ensure_connected():
+            return False
+
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO collector_replicas (replica_id) VALUES (%s)
+                    ON CONFLICT (replica_id) DO UPDATE SET heartbeat_at = NOW()
+                """, (replica_id,))
+                cur.execute("DELETE FROM collector_replicas WHERE heartbeat_at < NOW() - INTERVAL '1 day'")
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error recording collector heartbeat: {e}")
+            self.conn.rollback()
+            return False
+
+    @timed_query
+    def remove_replica(self, replica_id: str) -> bool:
+        """停止するレプリカの行を消し、持っているリースを手放す（ほかのレプリカがすぐ引き継げる）"""
+        if not self.ensure_connected():
+            return False
+
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("DELETE FROM collector_replicas WHERE replica_id = %s", (replica_id,))
+                cur.execute("""
+                    UPDATE instance_leases SET owner = NULL, leased_at = NULL, leased_until = NULL
+                    WHERE owner = %s
+                """, (replica_id,))
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Error removing collector replica: {e}")
+            self.conn.rollback()
+            return False
+
+    @timed_query
+    def count_live_replicas(self, ttl_seconds: float) -> int:
+        """直近 ttl_seconds 以内にハートビートのあったレプリカ数"""
+        if not self.ensure_connected():
+            return 0
+
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("""
+                    SELECT COUNT(*) FROM collector_replicas
+                    WHERE heartbeat_at > NOW() - MAKE_INTERVAL(secs => %s)
+                """, (ttl_seconds,))
+                count = cur.fetchone()[0]
+            self.conn.commit()
+            return count
+        except Exception as e:
+            logger.error(f"Error counting collector replicas: {e}")
+            self.conn.rollback()
+            return 0
+
+    @timed_query
+    def claim_instance_leases(
+        self, owner: str, limit: int, lease_seconds: float, next_poll_seconds: float
+    ) -> list[dict]:
+        """ポーリング時刻が来たアクティブなインスタンスを最大 limit 件リースして返す（next_poll_at の古い順）
+
+        FOR UPDATE SKIP LOCKED で行を選ぶため、同時に取りに来たレプリカ同士で同じ行を取り合わない。
+        リース期限（leased_until）を過ぎた行は持ち主が落ちたものとみなして取り直す。
+        リース行がまだないアクティブなインスタンスには先に行を作る。
+
+        next_poll_at は取得を終えた時点のポーリング間隔で決まるため、間隔が短くなったとき
+        （開いているインスタンスが出て POLL_INTERVAL_OPEN_MINUTES に切り替わったときなど）は
+        今の間隔（next_poll_seconds）より先の next_poll_at もポーリング時刻が来たものとして扱う。
+        """
+        if not self.ensure_connected():
+            return []
+
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    INSERT INTO instance_leases (instance_id)
+                    SELECT id FROM instances WHERE is_active = TRUE
+                    ON CONFLICT (instance_id) DO NOTHING
+                """)
+                # 期限の比較はこの文の開始時刻で行う。NOW()（トランザクション開始時刻）だと、
+                # 上の INSERT で待たされている間にコミットされた他レプリカの新しい行
+                # （next_poll_at = その開始時刻）がまだ来ていない扱いになり、初回に取りこぼす
+                cur.execute("""
+                    WITH due AS (
+                        SELECT l.instance_id
+                        FROM instance_leases l
+                        JOIN instances i ON i.id = l.instance_id
+                        WHERE i.is_active = TRUE
+                          AND (l.next_poll_at <= statement_timestamp()
+                               OR l.next_poll_at > statement_timestamp() + MAKE_INTERVAL(secs => %s))
+                          AND (l.leased_until IS NULL OR l.leased_until < statement_timestamp())
+                        ORDER BY l.next_poll_at
+                        LIMIT %s
+                        FOR UPDATE OF l SKIP LOCKED
+                    )
+                    UPDATE instance_leases l
+                    SET owner = %s, leased_at = NOW(), leased_until = NOW() + MAKE_INTERVAL(secs => %s)
+                    FROM due, instances i
+                    WHERE l.instance_id = due.instance_id AND i.id = l.instance_id
+                    RETURNING i.id, i.location, i.name, i.display_name, i.world_name, i.capacity,
+                              i.world_thumbnail_url, i.world_image_url, i.instance_type, i.region,
+                              i.group_id, i.created_at
+                """, (next_poll_seconds, limit, owner, lease_seconds))
+                rows = [dict(row) for row in cur.fetchall()]
+            self.conn.commit()
+            return rows
+        except Exception as e:
+            logger.error(f"Error claiming instance leases: {e}")
+            self.conn.rollback()
+            return []
+
+    @timed_query
+    def finish_instance_leases(self, owner: str, polled_ids: list[int], next_poll_seconds: float) -> int:
+        """owner のリースをすべて手放す。
+
+        polled_ids（取得を終えたインスタンス）は次のポーリング時刻をリースした時刻 + next_poll_seconds に進める。
+        それ以外（429 で後回しにしたものなど）は時刻を変えないので、次に空いたレプリカがすぐ取る。
+        """
+        if not self.ensure_connected():
+            return 0
+
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE instance_leases
+                    SET owner = NULL, leased_at = NULL, leased_until = NULL,
+                        next_poll_at = CASE
+                            WHEN instance_id = ANY(%s) THEN leased_at + MAKE_INTERVAL(secs => %s)
+                            ELSE next_poll_at
+                        END
+                    WHERE owner = %s
+                """, (polled_ids, next_poll_seconds, owner))
+                rowcount = cur.rowcount
+            self.conn.commit()
+            return rowcount
+        except Exception as e:
+            logger.error(f"Error releasing instance leases: {e}")
+            self.conn.rollback()
+            return 0
+
     # ------------------------------------------------------------------
     # API エンドポイント向けクエリ
+    #
+    # API の読み取り（get_instances / get_instance / get_data_version もこちらに準じる）は、
+    # 失敗を空の結果に見せるとレスポンスキャッシュに正常値として残るため、
+    # 未接続は DatabaseUnavailable、クエリの失敗は例外をそのまま送出する。
     # ------------------------------------------------------------------
 
-    _METRICS_COLS = """
+    # group_id で絞り込むときの条件（instance_id の列に付ける）。
+    # idx_instances_group_active でグループの id を引き、メトリクス側は instance_id 先頭のインデックスで読む
+    _GROUP_FILTER_SQL = "IN (SELECT id FROM instances WHERE group_id = %s)"
+
+    # MetricResponse と同じ列（派生値は SQL で計算済み）。instances は capacity のためだけに JOIN する
+    _METRICS_COLS = f"""
         m.timestamp,
         m.instance_id,
-        m.n_users,
-        m.queue_size,
-        m.queue_enabled,
-        m.pc_users,
-        COALESCE(m.current_users, 0) AS legacy_current_users,
-        i.capacity,
-        i.location,
-        i.name        AS instance_name,
-        i.display_name,
-        i.world_name,
-        i.world_thumbnail_url,
-        i.world_image_url,
-        i.instance_type,
-        i.region,
-        i.created_at,
-        i.is_active
+        {_DERIVED_QUEUE_SIZE_SQL} AS queue_size,
+        {_DERIVED_CURRENT_USERS_SQL} AS current_users,
+        COALESCE(m.pc_users, 0) AS pc_users
     """
 
-    def get_metrics_with_instances(self, days: int) -> tuple[list[dict], dict[int, dict]]:
-        """イベントグループ用：直近 N 日のメトリクス行と、全インスタンス辞書を返す。"""
+    @timed_query
+    def get_event_group_summaries(self, days: int, group_id: Optional[str] = None) -> list[dict]:
+        """直近 N 日にサンプルがあるイベントグループの集計行（インスタンス情報付き）を返す。
+
+        event_date 降順、同じ日付内では end_time 降順。group_id を指定するとそのグループのみ。
+        """
+        if not self.ensure_connected():
+            raise DatabaseUnavailable("Database is not connected")
+
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                where = "e.end_time > NOW() - MAKE_INTERVAL(days => %s::integer)"
+                params: tuple = (days,)
+                if group_id is not None:
+                    where += " AND i.group_id = %s"
+                    params = (days, group_id)
+                cur.execute(f"""
+                    SELECT e.event_date, e.start_time, e.end_time,
+                           e.peak_queue, e.peak_users, e.sample_count,
+                           i.id, i.location, i.name, i.display_name, i.world_name, i.capacity,
+                           i.world_thumbnail_url, i.world_image_url, i.instance_type, i.region,
+                           i.group_id, i.created_at, i.is_active
+                    FROM event_groups e
+                    JOIN instances i ON e.instance_id = i.id
+                    WHERE {where}
+                    ORDER BY e.event_date DESC, e.end_time DESC
+                """, params)
+                return [dict(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.error(f"Error fetching event group summaries: {e}")
+            raise
+
+    @timed_query
+    def get_metrics_for_instances(self, instance_ids: list[int], days: int) -> list[dict]:
+        """指定インスタンスの直近 N 日のメトリクス行（計算済みの値、timestamp 昇順）を返す。"""
+        if not instance_ids:
+            return []
         if not self.ensure_connected():
-            return [], {}
+            raise DatabaseUnavailable("Database is not connected")
 
         try:
             with self.conn.cursor() as cur:
@@ -313,26 +1259,22 @@ class Database:
                     SELECT {self._METRICS_COLS}
                     FROM metrics m
                     JOIN instances i ON m.instance_id = i.id
-                    WHERE m.timestamp > NOW() - MAKE_INTERVAL(days => %s::integer)
-                    ORDER BY m.timestamp DESC
-                """, (days,))
-                cols = [d[0] for d in cur.description]
-                metrics = [dict(zip(cols, row)) for row in cur.fetchall()]
-
-                cur.execute("SELECT * FROM instances")
+                    WHERE m.instance_id = ANY(%s)
+                      AND m.timestamp > NOW() - MAKE_INTERVAL(days => %s::integer)
+                    ORDER BY m.instance_id, m.timestamp
+                """, (instance_ids, days))
                 cols = [d[0] for d in cur.description]
-                instances = {row[0]: dict(zip(cols, row)) for row in cur.fetchall()}
-
-            return metrics, instances
+                return [dict(zip(cols, row)) for row in cur.fetchall()]
 
         except Exception as e:
-            logger.error(f"Error fetching metrics with instances: {e}")
-            return [], {}
+            logger.error(f"Error fetching metrics for instances: {e}")
+            raise
 
-    def get_metrics_list(self, instance_id: Optional[int], hours: int) -> list[dict]:
-        """メトリクス一覧（instances の capacity 付き）を返す。"""
+    @timed_query
+    def get_metrics_list(self, instance_id: Optional[int], hours: int, group_id: Optional[str] = None) -> list[dict]:
+        """メトリクス一覧（計算済みの値）を返す。"""
         if not self.ensure_connected():
-            return []
+            raise DatabaseUnavailable("Database is not connected")
 
         try:
             with self.conn.cursor() as cur:
@@ -340,7 +1282,10 @@ class Database:
                 params: tuple = (hours,)
                 if instance_id is not None:
                     where += " AND m.instance_id = %s"
-                    params = (hours, instance_id)
+                    params += (instance_id,)
+                if group_id is not None:
+                    where += f" AND m.instance_id {self._GROUP_FILTER_SQL}"
+                    params += (group_id,)
 
                 cur.execute(f"""
                     SELECT {self._METRICS_COLS}
@@ -354,4 +1299,250 @@ class Database:
 
         except Exception as e:
             logger.error(f"Error fetching metrics list: {e}")
-            return []
+            raise
+
+    @timed_query
+    def iter_metrics(
+        self, instance_id: Optional[int], hours: int, itersize: int = 2000, group_id: Optional[str] = None
+    ) -> Iterator[dict]:
+        """直近 N 時間のメトリクス行（計算済みの値、timestamp 昇順）を少しずつ返す。
+
+        名前付き（サーバーサイド）カーソルで itersize 行ずつ取得するため、期間が長くても
+        プロセスのメモリに載るのは 1 バッチ分だけ。呼び出し中はトランザクションを開いたままにする。
+        途中で失敗した場合は欠けたデータを正常終了に見せないよう、例外をそのまま送出する。
+        """
+        if not self.ensure_connected():
+            raise DatabaseUnavailable("Database is not connected")
+
+        where = "m.timestamp > NOW() - MAKE_INTERVAL(hours => %s::integer)"
+        params: tuple = (hours,)
+        if instance_id is not None:
+            where += " AND m.instance_id = %s"
+            params += (instance_id,)
+        if group_id is not None:
+            where += f" AND m.instance_id {self._GROUP_FILTER_SQL}"
+            params += (group_id,)
+
+        try:
+            with self.conn.cursor(name="metrics_export") as cur:
+                cur.itersize = itersize
+                cur.execute(f"""
+                    SELECT {self._METRICS_COLS}
+                    FROM metrics m
+                    JOIN instances i ON m.instance_id = i.id
+                    WHERE {where}
+                    ORDER BY m.timestamp
+                """, params)
+                cols = None
+                for row in cur:
+                    if cols is None:
+                        cols = [d[0] for d in cur.description]
+                    yield dict(zip(cols, row))
+
+        except Exception as e:
+            logger.error(f"Error streaming metrics: {e}")
+            raise
+
+    @timed_query
+    def get_metrics_since(self, after_version: int) -> tuple[int, list[dict]]:
+        """書き込み番号が after_version より後のメトリクス行（計算済みの値、番号・timestamp 昇順）を返す。
+
+        Returns:
+            (読んだ行の最大の番号（行がなければ after_version）, 行)
+        """
+        if not self.ensure_connected():
+            raise DatabaseUnavailable("Database is not connected")
+
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT m.version, {self._METRICS_COLS}
+                    FROM metrics m
+                    JOIN instances i ON m.instance_id = i.id
+                    WHERE m.version > %s
+                    ORDER BY m.version, m.timestamp
+                """, (after_version,))
+                cols = [d[0] for d in cur.description][1:]
+                latest = after_version
+                rows = []
+                for version, *values in cur.fetchall():
+                    latest = version
+                    rows.append(dict(zip(cols, values)))
+                return latest, rows
+
+        except Exception as e:
+            logger.error(f"Error fetching metrics after version {after_version}: {e}")
+            raise
+
+    @timed_query
+    def get_metrics_page(
+        self,
+        instance_id: Optional[int],
+        hours: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        after: Optional[tuple[datetime, int]] = None,
+        limit: int = 1000,
+        group_id: Optional[str] = None,
+    ) -> list[dict]:
+        """(timestamp, instance_id) 昇順のキーセットページ（計算済みの値）を返す。
+
+        下限は after（前ページ最後の (timestamp, instance_id)）、なければ since、
+        どちらもなければ直近 hours 時間。until は上限（含む）。
+        after の行比較に加えて timestamp >= after を付け、timestamp のインデックスで範囲を絞る。
+        """
+        if not self.ensure_connected():
+            raise DatabaseUnavailable("Database is not connected")
+
+        try:
+            with self.conn.cursor() as cur:
+                conditions: list[str] = []
+                params: list = []
+                if instance_id is not None:
+                    conditions.append("m.instance_id = %s")
+                    params.append(instance_id)
+                if group_id is not None:
+                    conditions.append(f"m.instance_id {self._GROUP_FILTER_SQL}")
+                    params.append(group_id)
+                if after is not None:
+                    after_ts = _to_naive_utc(after[0])
+                    conditions.append("m.timestamp >= %s AND (m.timestamp, m.instance_id) > (%s, %s)")
+                    params += [after_ts, after_ts, after[1]]
+                elif since is not None:
+                    conditions.append("m.timestamp > %s")
+                    params.append(_to_naive_utc(since))
+                else:
+                    conditions.append("m.timestamp > NOW() - MAKE_INTERVAL(hours => %s::integer)")
+                    params.append(hours)
+                if until is not None:
+                    conditions.append("m.timestamp <= %s")
+                    params.append(_to_naive_utc(until))
+                params.append(limit)
+
+                cur.execute(f"""
+                    SELECT {self._METRICS_COLS}
+                    FROM metrics m
+                    JOIN instances i ON m.instance_id = i.id
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY m.timestamp, m.instance_id
+                    LIMIT %s
+                """, params)
+                cols = [d[0] for d in cur.description]
+                return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.error(f"Error fetching metrics page: {e}")
+            raise
+
+    @timed_query
+    def get_metrics_rollup(
+        self,
+        instance_id: Optional[int],
+        hours: int,
+        resolution: str,
+        group_id: Optional[str] = None,
+        agg: str = "max",
+    ) -> list[dict]:
+        """ロールアップテーブルからメトリクス一覧を返す（派生値は集計済み）。
+
+        各バケットの代表値は agg（min / max / avg）の列から取る。
+        デフォルトは最大値（待機列のピークを潰さないため）。avg も MetricResponse に合わせて整数に丸める。
+        """
+        _, table, _ = ROLLUP_RESOLUTIONS[resolution]
+        if agg not in ROLLUP_AGGREGATES:
+            raise ValueError(f"Unknown rollup aggregate: {agg}")
+        if not self.ensure_connected():
+            raise DatabaseUnavailable("Database is not connected")
+
+        try:
+            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+                where = "r.bucket > LOCALTIMESTAMP - MAKE_INTERVAL(hours => %s::integer)"
+                params: tuple = (hours,)
+                if instance_id is not None:
+                    where += " AND r.instance_id = %s"
+                    params += (instance_id,)
+                if group_id is not None:
+                    where += f" AND r.instance_id {self._GROUP_FILTER_SQL}"
+                    params += (group_id,)
+
+                # avg は REAL なので、ほかの集計・生データと同じ整数に丸めて返す（レスポンスの型を変えない）
+                col = "ROUND(r.{}_avg)::integer" if agg == "avg" else f"r.{{}}_{agg}"
+                cur.execute(f"""
+                    SELECT r.bucket AS timestamp,
+                           r.instance_id,
+                           {col.format("queue_size")}    AS queue_size,
+                           {col.format("current_users")} AS current_users,
+                           {col.format("pc_users")}      AS pc_users
+                    FROM {table} r
+                    WHERE {where}
+                    ORDER BY r.bucket DESC
+                """, params)
+                return [dict(row) for row in cur.fetchall()]
+
+        except Exception as e:
+            logger.error(f"Error fetching metrics rollup: {e}")
+            raise
+
+
+class DatabasePool:
+    """API サーバー向けのコネクションプール
+
+    リクエストごとに接続を 1 本借り出し、その接続に束ねた Database を渡す。
+    ThreadedConnectionPool は上限到達時に待たずに例外を出すため、
+    セマフォで同時借り出し数を制限し、空きが出るまで待機させる。
+    """
+
+    def __init__(self):
+        self.minconn = int(os.environ.get("DB_POOL_MIN", 1))
+        self.maxconn = int(os.environ.get("DB_POOL_MAX", 10))
+        self.acquire_timeout = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", 10))
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+
+    def open(self) -> bool:
+        """プールを作成する（minconn 本を事前に接続）"""
+        try:
+            self._pool = ThreadedConnectionPool(
+                self.minconn, self.maxconn, **connect_params(), connection_factory=ProfilingConnection
+            )
+            logger.info(f"Database pool opened (min={self.minconn}, max={self.maxconn})")
+            return True
+        except Exception as e:
+            logger.error(f"Database pool creation failed: {e}")
+            return False
+
+    def close(self):
+        """プール内の全接続を閉じる"""
+        if self._pool and not self._pool.closed:
+            self._pool.closeall()
+            logger.info("Database pool closed")
+
+    @contextmanager
+    def connection(self) -> Iterator[Database]:
+        """接続を 1 本借りて Database として渡し、終了時にプールへ返す。
+
+        返却時はトランザクションを必ずロールバックし（読み取り専用のため）、
+        切断済みの接続はプールに戻さず破棄する。
+        """
+        if self._pool is None and not self.open():
+            raise DatabaseUnavailable("Database pool is not available")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise DatabaseUnavailable("Timed out waiting for a database connection")
+
+        conn = None
+        try:
+            try:
+                conn = self._pool.getconn()
+            except Exception as e:
+                raise DatabaseUnavailable(f"Failed to get a database connection: {e}") from e
+            yield Database(conn)
+        finally:
+            if conn is not None:
+                broken = bool(conn.closed)
+                if not broken:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        broken = True
+                self._pool.putconn(conn, close=broken)
+            self._slots.release()
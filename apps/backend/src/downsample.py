@@ -0,0 +1,77 @@
+"""時系列の間引き（Largest-Triangle-Three-Buckets）
+
+チャートに渡す点数を上限までに減らしつつ、待機列のスパイクなど形の特徴を残す。
+"""
+
+from typing import Sequence
+
+# 三角形の面積を合算する値のキー（どちらかの系列が大きく動いた点を優先して残す）
+DEFAULT_VALUE_KEYS = ("queue_size", "current_users")
+
+
+def lttb(points: list[dict], threshold: int, value_keys: Sequence[str] = DEFAULT_VALUE_KEYS) -> list[dict]:
+    """timestamp 昇順の点列を LTTB で threshold 点に間引く。
+
+    先頭と末尾の点は常に残す。各バケットからは、直前に選んだ点と次バケットの平均点とで
+    作る三角形の面積（value_keys ごとの面積の合計）が最大の点を 1 つ選ぶ。
+    点数が threshold 以下、または threshold < 3 の場合はそのまま返す。
+    """
+    n = len(points)
+    if threshold < 3 or n <= threshold:
+        return points
+
+    xs = [p["timestamp"].timestamp() for p in points]
+    ys = [[float(p[key] or 0) for key in value_keys] for p in points]
+    dims = range(len(value_keys))
+
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # 次バケットの平均点
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = [sum(ys[j][d] for j in range(next_start, next_end)) / span for d in dims]
+
+        # 現在バケットから面積最大の点を選ぶ
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = sum(
+                abs((ax - avg_x) * (ys[j][d] - ay[d]) - (ax - xs[j]) * (avg_y[d] - ay[d]))
+                for d in dims
+            )
+            if area > best_area:
+                best, best_area = j, area
+
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def downsample_by_instance(rows: list[dict], max_points: int) -> list[dict]:
+    """複数インスタンスが混在する行をインスタンスごとに max_points 点へ間引く。
+
+    入力の並び順（timestamp 昇順 / 降順）は保ったまま返す。
+    """
+    if not rows:
+        return rows
+    descending = rows[0]["timestamp"] > rows[-1]["timestamp"]
+
+    series: dict[int, list[dict]] = {}
+    for row in rows:
+        series.setdefault(row["instance_id"], []).append(row)
+
+    result = []
+    for points in series.values():
+        points.sort(key=lambda p: p["timestamp"])
+        result.extend(lttb(points, max_points))
+    result.sort(key=lambda p: p["timestamp"], reverse=descending)
+    return result
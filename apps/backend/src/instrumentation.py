@@ -0,0 +1,188 @@
+"""Prometheus 形式の計測値
+
+コレクター・API の両プロセスが同じ定義を使い、それぞれのプロセスで
+テキスト形式のエンドポイントから公開する（コレクターは start_http_server、API は /metrics）。
+"""
+
+import time
+import inspect
+import functools
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+# --- コレクター ---
+
+COLLECT_CYCLE_SECONDS = Histogram(
+    "vrcqm_collect_cycle_seconds",
+    "collect_metrics 1 サイクルの所要時間",
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120, 180, 300, 600),
+)
+COLLECT_LAG_SECONDS = Gauge(
+    "vrcqm_collect_lag_seconds",
+    "前回の収集開始から今回の開始までの間隔がポーリング間隔をどれだけ超えたか",
+)
+COLLECT_POLL_INTERVAL_SECONDS = Gauge(
+    "vrcqm_collect_poll_interval_seconds",
+    "現在のポーリング間隔（開いているインスタンスがあれば短い間隔）",
+)
+COLLECT_RATE_LIMITED_TOTAL = Counter(
+    "vrcqm_collect_rate_limited_total",
+    "429 で取得できなかったインスタンス数（retried: 同じサイクル内で再試行、skipped: 次のサイクルに回した）",
+    ["outcome"],
+)
+COLLECT_LAST_SUCCESS_TIMESTAMP = Gauge(
+    "vrcqm_collect_last_success_timestamp_seconds",
+    "最後にメトリクスを保存できた時刻（UNIX 秒）",
+)
+COLLECT_CLAIMED_INSTANCES = Gauge(
+    "vrcqm_collect_claimed_instances",
+    "直近のサイクルでこのレプリカがリースしたインスタンス数",
+)
+COLLECTOR_REPLICAS = Gauge(
+    "vrcqm_collector_replicas",
+    "ハートビートが生きているコレクターのレプリカ数（リースの取り分の計算に使う）",
+)
+COLLECTOR_LEADER = Gauge(
+    "vrcqm_collector_leader",
+    "このレプリカが発見・メンテナンスの担当なら 1",
+)
+
+VRC_API_REQUEST_SECONDS = Histogram(
+    "vrcqm_vrc_api_request_seconds",
+    "VRChat API 呼び出しのレイテンシ（レート制限の待機を含まない）",
+    ["method"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+VRC_API_ERRORS_TOTAL = Counter(
+    "vrcqm_vrc_api_errors_total",
+    "VRChat API 呼び出しのエラー数（reason は HTTP ステータスまたは例外名）",
+    ["method", "reason"],
+)
+VRC_API_RATE_LIMIT_RPS = Gauge(
+    "vrcqm_vrc_api_rate_limit_rps",
+    "AdaptiveRateLimiter の現在のリクエストレート（429 で下がり、正常な応答で上限まで戻る）",
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "vrcqm_rate_limit_wait_seconds",
+    "レート制限による待機時間（limiter: リクエスト予算と 429 後の停止、retry_after: ログイン前の Retry-After 待ち）",
+    ["reason"],
+    buckets=(0, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 300),
+)
+
+# --- データベース ---
+
+DB_QUERY_SECONDS = Histogram(
+    "vrcqm_db_query_seconds",
+    "Database メソッドごとの所要時間",
+    ["method"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_ROWS_WRITTEN_TOTAL = Counter(
+    "vrcqm_db_rows_written_total",
+    "書き込んだ行数",
+    ["table"],
+)
+
+# --- API ---
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "vrcqm_http_request_seconds",
+    "API のエンドポイントごとのレイテンシ（レスポンス本文の送信完了まで）",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+def timed_query(fn):
+    """Database メソッドの所要時間を DB_QUERY_SECONDS に記録するデコレーター
+
+    ジェネレーターはイテレーションを終えるまでを計る（サーバーサイドカーソルの読み出しを含める）。
+    """
+    histogram = DB_QUERY_SECONDS.labels(fn.__name__)
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                yield from fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+    return wrapper
+
+
+def _error_reason(exc: Exception) -> str:
+    status = getattr(exc, "status", None)
+    return str(status) if status else type(exc).__name__
+
+
+@contextmanager
+def vrc_api_call(method: str):
+    """VRChat API 呼び出しのレイテンシと、例外が出た場合のエラー数を記録する"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        VRC_API_ERRORS_TOTAL.labels(method, _error_reason(e)).inc()
+        raise
+    finally:
+        VRC_API_REQUEST_SECONDS.labels(method).observe(time.perf_counter() - started)
+
+
+def observe_rate_limit_wait(reason: str, seconds: float) -> None:
+    RATE_LIMIT_WAIT_SECONDS.labels(reason).observe(max(0.0, seconds))
+
+
+class MetricsMiddleware:
+    """エンドポイント（ルートのパステンプレート）ごとのレイテンシを記録する ASGI ミドルウェア
+
+    パスパラメーターでラベルが増えないよう、マッチしたルートの path を使う。
+    SSE（text/event-stream）は所要時間が接続時間になるため記録しない。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def _send(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for key, value in message.get("headers", []):
+                    if key.lower() == b"content-type" and value.startswith(b"text/event-stream"):
+                        streaming = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            if not streaming:
+                route = scope.get("route")
+                HTTP_REQUEST_SECONDS.labels(
+                    scope["method"],
+                    getattr(route, "path", "unmatched"),
+                    str(status),
+                ).observe(time.perf_counter() - started)
+
+
+def render_latest() -> tuple[bytes, str]:
+    """現在の計測値をテキスト形式で返す（本文, Content-Type）"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,80 @@
+"""PostgreSQL LISTEN/NOTIFY の受信
+
+専用接続を 1 本だけ持つバックグラウンドスレッドで LISTEN し、
+受け取った通知を asyncio のイベントループ上のコールバックに渡す。
+"""
+
+import select
+import logging
+import threading
+import asyncio
+from typing import Callable, Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+from db import connect_params
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationListener:
+    """指定チャンネルの通知をイベントループに転送するリスナー
+
+    接続が切れた場合は再接続し、その間の通知を取りこぼした可能性があるため
+    callback(None) を呼んで呼び出し側に知らせる。
+    """
+
+    def __init__(self, channel: str, callback: Callable[[Optional[str]], None]):
+        self.channel = channel
+        self.callback = callback
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"listen-{self.channel}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def _dispatch(self, payload: Optional[str]) -> None:
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.callback, payload)
+
+    def _run(self) -> None:
+        backoff = 1.0
+        first = True
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**connect_params())
+                conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel}")
+                logger.info(f"Listening for notifications on '{self.channel}'")
+                if not first:
+                    # 切断中の通知は失われているので、受信側に状態を捨てさせる
+                    self._dispatch(None)
+                first = False
+                backoff = 1.0
+
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._dispatch(notify.payload)
+            except Exception as e:
+                logger.warning(f"Notification listener error ({self.channel}): {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
@@ -3,13 +3,24 @@
 import os
 import sys
 import time
+import signal
 import logging
 from datetime import datetime
 
+from prometheus_client import start_http_server
+
 from vrc_api import VRChatAPI
 from db import Database
 from scheduler import ScheduleConfig
-from collector import discover_instances, collect_metrics
+from collector import (
+    discover_instances,
+    collect_metrics,
+    instance_states,
+    ReplicaHeartbeat,
+    COLLECTOR_REPLICA_ID,
+    COLLECT_LEASE_GRACE_SECONDS,
+)
+from instrumentation import COLLECT_LAG_SECONDS, COLLECT_POLL_INTERVAL_SECONDS, COLLECTOR_LEADER
 
 log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(
@@ -19,10 +30,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# metrics パーティションの先行作成・期限切れ削除を行う間隔（パーティション化していなければ何もしない）
+PARTITION_MAINTENANCE_SECONDS = 6 * 60 * 60
+
+# Prometheus 形式の計測値を公開するポート（0 で無効）
+COLLECTOR_METRICS_PORT = int(os.environ.get("COLLECTOR_METRICS_PORT", 9100))
+
+
+def _raise_keyboard_interrupt(signum, frame) -> None:
+    raise KeyboardInterrupt
+
 
 def main() -> None:
-    group_id = os.environ.get("VRC_GROUP_ID")
-    if not group_id:
+    # カンマ区切りで複数指定できる（ログインセッションとレート制限は全グループで共有）
+    group_ids = [g.strip() for g in os.environ.get("VRC_GROUP_ID", "").split(",") if g.strip()]
+    if not group_ids:
         logger.error("VRC_GROUP_ID environment variable is required")
         sys.exit(1)
 
@@ -34,7 +56,8 @@ def main() -> None:
 
     logger.info("=" * 50)
     logger.info("VRC Queue Monitor - Starting")
-    logger.info(f"Group ID: {group_id}")
+    logger.info(f"Group IDs: {', '.join(group_ids)}")
+    logger.info(f"Replica: {COLLECTOR_REPLICA_ID}")
     logger.info(f"Poll: {poll_interval}min  Discovery: {discovery_interval}min")
     logger.info(f"Schedule: {schedule.get_status_message()}")
     logger.info("=" * 50)
@@ -46,7 +69,17 @@ def main() -> None:
         logger.error("Failed to connect to database")
         sys.exit(1)
 
+    # 複数レプリカが同時に起動しても run_migrations は advisory lock で 1 つずつ実行される
     db.run_migrations()
+    if len(group_ids) == 1:
+        # 単一グループで運用していた頃の行をそのグループに割り当てる（group_id での絞り込みに含める）
+        assigned = db.assign_instances_to_group(group_ids[0])
+        if assigned:
+            logger.info(f"Assigned {assigned} instances without a group to {group_ids[0]}")
+
+    if COLLECTOR_METRICS_PORT:
+        start_http_server(COLLECTOR_METRICS_PORT)
+        logger.info(f"Metrics endpoint listening on :{COLLECTOR_METRICS_PORT}/metrics")
 
     # VRChat 認証（最大3回、レート制限は待機してからリトライ）
     for attempt in range(1, 4):
@@ -67,47 +100,64 @@ def main() -> None:
     poll_open_seconds = poll_interval_open * 60
     discovery_seconds = discovery_interval * 60
     last_discovery = last_metrics = 0.0
+    last_maintenance = time.time()  # 起動時は run_migrations で実施済み
+    # 生存判定（COLLECT_LEASE_GRACE_SECONDS）の間に数回は届くようにする。
+    # 収集中もメインループを待たずに送るよう、専用スレッド・専用接続で行う
+    heartbeat = ReplicaHeartbeat(COLLECTOR_REPLICA_ID, max(5.0, COLLECT_LEASE_GRACE_SECONDS / 3))
+    is_leader = False
 
     def _any_instance_open() -> bool:
         """直近のメトリクスからインスタンスが開いているか判定する。
 
         判定基準:
-          - 直近1時間の最新レコードで `n_users > 0` または `queue_enabled == True`
+          - 直近1時間の最新サンプルで `n_users > 0` または `queue_enabled == True`
+
+        collect_metrics が更新するメモリ上の状態だけを見るため DB にはアクセスしない。
+        起動直後でまだ収集していない場合のみ、DB の最新行（1 クエリ）で初期化する。
         """
-        try:
-            active = db.get_active_instances()
-            if not active:
-                return False
-            for inst in active:
-                iid = inst.get("id")
-                if not iid:
-                    continue
-                metrics = db.get_instance_metrics(iid, hours=1)
-                if not metrics:
-                    continue
-                last = metrics[-1]
-                if (last.get("n_users", 0) or 0) > 0 or bool(last.get("queue_enabled")):
-                    return True
-            return False
-        except Exception:
-            return False
+        if not instance_states.seeded:
+            instance_states.seed(db.get_latest_metrics(hours=1))
+        return instance_states.any_open()
+
+    # Kubernetes の停止（SIGTERM）でも finally でリースを手放す
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
 
+    heartbeat.start()
     try:
         while True:
             now = time.time()
+            # 発見・メンテナンスはロックを持つ 1 レプリカだけが行う（持ち主が落ちると別のレプリカが引き継ぐ）
+            leader = db.try_acquire_leader()
+            if leader != is_leader:
+                logger.info("Acquired collector leadership" if leader else "Lost collector leadership")
+                is_leader = leader
+                # 引き継いだら間隔を待たずに発見する
+                last_discovery = 0.0
+                COLLECTOR_LEADER.set(1 if leader else 0)
+            if is_leader and now - last_maintenance >= PARTITION_MAINTENANCE_SECONDS:
+                db.maintain_metrics_partitions()
+                last_maintenance = now
             if schedule.is_active_now():
-                if now - last_discovery >= discovery_seconds:
-                    discover_instances(api, db, group_id)
+                if is_leader and now - last_discovery >= discovery_seconds:
+                    discover_instances(api, db, group_ids)
                     last_discovery = now
                 # 動的にポーリング間隔を切り替える（インスタンスが開いている場合は短い間隔）
                 current_poll = poll_open_seconds if _any_instance_open() else poll_seconds
+                COLLECT_POLL_INTERVAL_SECONDS.set(current_poll)
                 if now - last_metrics >= current_poll:
-                    collect_metrics(api, db)
+                    if last_metrics:
+                        # ループの刻み（5 秒）と前回サイクルの所要時間の分だけ間隔より遅れる
+                        COLLECT_LAG_SECONDS.set(now - last_metrics - current_poll)
+                    # 429 で後回しにしたインスタンスの再試行は次の収集までに終わる範囲に限る
+                    collect_metrics(api, db, time_budget=current_poll)
                     last_metrics = now
             time.sleep(5)
     except KeyboardInterrupt:
         logger.info("Shutting down...")
     finally:
+        # リースを手放し、ほかのレプリカがリース期限を待たずに引き継げるようにする
+        heartbeat.stop()
+        db.remove_replica(COLLECTOR_REPLICA_ID)
         api.close()
         db.close()
         logger.info("Goodbye!")
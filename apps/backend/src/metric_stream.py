@@ -0,0 +1,93 @@
+"""新着メトリクスのプッシュ配信
+
+コレクターの NOTIFY を受けるたびに前回配信以降の行だけを 1 回読み、
+購読中の全クライアントのキューに同じバッチを配る。
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MetricBroadcaster:
+    """新着メトリクスを購読者ごとの asyncio.Queue にファンアウトする
+
+    fetch_since(version): 書き込み番号が version より後の行を (読んだ最大の番号, 行) で返す（計算済みの値）
+    fetch_latest():       現在の書き込み番号を返す（配信開始位置の初期化用）
+
+    配信位置には行の timestamp（観測時刻）ではなく、コミット順に進む書き込み番号を使う。
+    複数レプリカのコレクターは観測時刻が古い行を後からコミットすることがあり、
+    timestamp で読み進めるとそれらを取りこぼすため。
+
+    通知が連続しても読み込みは同時に 1 つだけ走り、走行中に届いた通知は
+    終了後の 1 回にまとめる。キューが max_queue バッチ分たまった購読者は
+    読み出しが追いついていないとみなして切断する（None を送る）。
+    """
+
+    def __init__(
+        self,
+        fetch_since: Callable[[int], Awaitable[tuple[int, list[dict]]]],
+        fetch_latest: Callable[[], Awaitable[Optional[int]]],
+        max_queue: int = 64,
+    ):
+        self.fetch_since = fetch_since
+        self.fetch_latest = fetch_latest
+        self.max_queue = max_queue
+        self._subscribers: set[asyncio.Queue] = set()
+        self._last_seen = 0
+        self._task: Optional[asyncio.Task] = None
+        self._pending = False
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    async def subscribe(self) -> asyncio.Queue:
+        """購読を開始し、新着バッチ（list[dict]）が届くキューを返す。"""
+        if not self._subscribers:
+            # 購読者がいない間は読み進めていないので、現在の最新行から配信を始める
+            latest = await self.fetch_latest()
+            if latest is not None:
+                self._last_seen = latest
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def notify(self, *_) -> None:
+        """NOTIFY を受けたときにイベントループ上で呼ぶ。購読者がいなければ何もしない。"""
+        if not self._subscribers:
+            return
+        if self._task and not self._task.done():
+            self._pending = True
+            return
+        self._task = asyncio.ensure_future(self._drain())
+
+    async def _drain(self) -> None:
+        while True:
+            self._pending = False
+            try:
+                await self._publish_new()
+            except Exception as e:
+                logger.error(f"Error publishing new metrics: {e}")
+            if not self._pending or not self._subscribers:
+                return
+
+    async def _publish_new(self) -> None:
+        self._last_seen, rows = await self.fetch_since(self._last_seen)
+        if not rows:
+            return
+
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(rows)
+            except asyncio.QueueFull:
+                logger.warning("Dropping slow metric stream subscriber")
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
@@ -0,0 +1,215 @@
+"""クエリのプロファイリング
+
+Database が使う接続のカーソルで execute / executemany を計時し、文ごとの
+所要時間・行数・往復回数を集計する。DB_SLOW_QUERY_MS 以上かかった文はログに出し、
+リングバッファに残す。DB_EXPLAIN_SLOW_QUERIES=true のときは遅い読み取り専用の SELECT を
+EXPLAIN (ANALYZE, BUFFERS) で実行し直してプランも残す（同じクエリがもう 1 回走る）。
+ロック・通知・シーケンスなど副作用のある関数を呼ぶ文は再実行しない。
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional
+
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+# これ以上かかった文をログとリングバッファに残す（ミリ秒、0 で無効）
+DB_SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", 500))
+# 遅い SELECT の EXPLAIN (ANALYZE, BUFFERS) を取る（クエリを再実行するため本番では必要なときだけ有効にする）
+DB_EXPLAIN_SLOW_QUERIES = os.environ.get("DB_EXPLAIN_SLOW_QUERIES", "false").lower() == "true"
+# 遅いクエリを残す件数
+DB_SLOW_QUERY_BUFFER = int(os.environ.get("DB_SLOW_QUERY_BUFFER", 50))
+# 集計する文の種類の上限（超えた分は "(other)" にまとめる）
+_MAX_STATEMENTS = 500
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_VALUES_RE = re.compile(r"VALUES\s*\([^()]*\)(?:\s*,\s*\([^()]*\))*", re.IGNORECASE)
+# 再実行すると副作用が出る SELECT（EXPLAIN ANALYZE は文を実際に実行する）
+#  - pg_advisory_lock 系のセッションロックは ROLLBACK TO SAVEPOINT でも解放されない
+#  - pg_notify は外側のトランザクションのコミットで通知が重複する
+#  - nextval / setval はロールバックしても戻らない
+#  - FOR UPDATE / FOR SHARE は行ロックを待つ・取り直す
+_SIDE_EFFECT_RE = re.compile(
+    r"\bpg_\w*lock\w*\s*\("
+    r"|\b(?:pg_notify|nextval|setval|set_config|pg_cancel_backend|pg_terminate_backend"
+    r"|pg_sleep\w*|lo_\w+|dblink\w*)\s*\("
+    r"|\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE)\b"
+    r"|\bFOR\s+KEY\s+SHARE\b"
+    r"|\bINTO\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_statement(query) -> str:
+    """集計キー用に文を正規化する。
+
+    execute_values などで値が埋め込まれた文もまとめられるよう、
+    リテラルを ? に、VALUES の行リストを 1 つに畳む。
+    """
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    text = _WHITESPACE_RE.sub(" ", str(query)).strip()
+    text = _LITERAL_RE.sub("?", text)
+    text = _VALUES_RE.sub("VALUES (...)", text)
+    return text[:300]
+
+
+def is_explainable(query) -> bool:
+    """EXPLAIN ANALYZE で再実行してよい文か（副作用のない SELECT のみ）"""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    sql = str(query).lstrip()
+    if not sql[:6].upper() == "SELECT":
+        return False
+    # リテラル内の語（'FOR UPDATE' など）で誤判定しないよう文字列を除いてから調べる
+    return not _SIDE_EFFECT_RE.search(_LITERAL_RE.sub("?", sql))
+
+
+class QueryProfiler:
+    """文ごとの集計と遅いクエリのリングバッファ（プロセス全体で 1 つ、スレッドセーフ）"""
+
+    def __init__(self, slow_ms: float, explain: bool, buffer_size: int):
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+        self._slow: deque = deque(maxlen=buffer_size)
+
+    def record(self, cursor, query, vars, seconds: float, round_trips: int = 1, failed: bool = False) -> None:
+        statement = normalize_statement(query)
+        elapsed_ms = seconds * 1000
+        rows = max(cursor.rowcount, 0)
+        with self._lock:
+            key = statement if statement in self._stats or len(self._stats) < _MAX_STATEMENTS else "(other)"
+            stats = self._stats.setdefault(
+                key, {"calls": 0, "round_trips": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0}
+            )
+            stats["calls"] += 1
+            stats["round_trips"] += round_trips
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["rows"] += rows
+
+        if not self.slow_ms or elapsed_ms < self.slow_ms:
+            return
+        logger.warning(f"Slow query ({elapsed_ms:.0f} ms, {rows} rows): {statement[:200]}")
+        # 失敗した文はトランザクションが中断しているので EXPLAIN できない
+        plan = self._explain(cursor, query, vars) if self.explain and not failed else None
+        with self._lock:
+            self._slow.append({
+                "at": datetime.now(timezone.utc).isoformat(),
+                "duration_ms": round(elapsed_ms, 2),
+                "rows": rows,
+                "statement": statement,
+                "plan": plan,
+            })
+
+    def _explain(self, cursor, query, vars) -> Optional[str]:
+        """副作用のない SELECT のみ EXPLAIN (ANALYZE, BUFFERS) を取る。
+
+        書き込みやロック・通知を伴う文は再実行できないため対象外（is_explainable）。呼び出し元のトランザクションを
+        壊さないよう SAVEPOINT の中で実行する（サーバーサイドカーソルは DECLARE の計時なので対象外）。
+        """
+        if getattr(cursor, "name", None):
+            return None
+        sql = query.decode("utf-8", "replace") if isinstance(query, bytes) else str(query)
+        if not is_explainable(sql):
+            return None
+        conn = cursor.connection
+        in_transaction = not conn.autocommit
+        try:
+            bound = cursor.mogrify(sql, vars).decode("utf-8", "replace")
+            # 計測対象にしないよう ProfilingConnection.cursor を経由せずに作る
+            with extensions.connection.cursor(conn, cursor_factory=extensions.cursor) as cur:
+                if in_transaction:
+                    cur.execute("SAVEPOINT query_profiler_explain")
+                try:
+                    cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + bound)
+                    plan = "\n".join(row[0] for row in cur.fetchall())
+                finally:
+                    if in_transaction:
+                        cur.execute("ROLLBACK TO SAVEPOINT query_profiler_explain")
+            return plan
+        except Exception as e:
+            logger.warning(f"Failed to capture query plan: {e}")
+            return None
+
+    def snapshot(self, limit: int = 50) -> dict:
+        """合計時間の長い順の文ごとの集計と、遅いクエリ（新しい順）を返す"""
+        with self._lock:
+            statements = [
+                {"statement": statement, **stats, "total_ms": round(stats["total_ms"], 2),
+                 "max_ms": round(stats["max_ms"], 2)}
+                for statement, stats in self._stats.items()
+            ]
+            slow = list(reversed(self._slow))
+        statements.sort(key=lambda s: s["total_ms"], reverse=True)
+        return {
+            "slow_query_ms": self.slow_ms,
+            "explain": self.explain,
+            "statements": statements[:limit],
+            "slow_queries": slow,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+
+
+profiler = QueryProfiler(DB_SLOW_QUERY_MS, DB_EXPLAIN_SLOW_QUERIES, DB_SLOW_QUERY_BUFFER)
+
+
+class ProfilingCursorMixin:
+    """execute / executemany の所要時間を profiler に記録するカーソルのミックスイン"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, vars)
+            failed = False
+            return result
+        finally:
+            profiler.record(self, query, vars, time.perf_counter() - started, failed=failed)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(query, vars_list)
+            failed = False
+            return result
+        finally:
+            # psycopg2 の executemany は 1 行ごとに往復する
+            profiler.record(
+                self, query, None, time.perf_counter() - started, round_trips=len(vars_list), failed=failed
+            )
+
+
+@lru_cache(maxsize=None)
+def _profiling_cursor_class(base: type) -> type:
+    return type(f"Profiling{base.__name__}", (ProfilingCursorMixin, base), {})
+
+
+class ProfilingConnection(extensions.connection):
+    """cursor() が返すカーソルに ProfilingCursorMixin を被せる接続
+
+    cursor_factory（RealDictCursor など）の指定はそのまま生かす。
+    psycopg2.connect(connection_factory=ProfilingConnection) で使う。
+    """
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+        kwargs["cursor_factory"] = _profiling_cursor_class(base)
+        return super().cursor(*args, **kwargs)
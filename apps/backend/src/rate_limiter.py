@@ -0,0 +1,158 @@
+"""VRChat API 向けレートリミッター
+
+プロセス内のすべての VRChat API 呼び出しで 1 つのバケットを共有し、
+並列収集時でも実際のリクエストレートが設定値を超えないようにする。
+429 を受けたときは AdaptiveRateLimiter がレートを下げ、Retry-After の間は送信を止める。
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+class TokenBucket:
+    """スレッドセーフなトークンバケット
+
+    rate:  1秒あたりに補充するトークン数（= 定常時のリクエスト数/秒）
+    burst: バケット容量（アイドル後に連続で送れるリクエスト数）
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def acquire(self) -> float:
+        """トークンを 1 つ消費する。足りなければ補充まで待機する。
+
+        ロック内ではトークンの予約だけを行い、待機はロック外で行う。
+        これにより複数スレッドが到着順に rate 間隔で払い出される。
+
+        Returns:
+            待機した秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Retry-After ヘッダー（秒数または HTTP 日付）を待機秒数にする。解釈できなければ None。"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """429 に応じてレートを調整するトークンバケット（AIMD）
+
+    max_rate から始め、429 を受けるたびにレートを decrease 倍に下げ（下限 min_rate）、
+    Retry-After（なければ default_pause 秒）の間はすべての acquire() を止める。
+    正常な応答ごとに increase ずつ max_rate まで戻す。
+
+    並列リクエストが同じ制限で続けて 429 を受けても、停止中に届いたものは 1 回と数える。
+    """
+
+    def __init__(
+        self,
+        max_rate: float,
+        burst: int = 1,
+        min_rate: float = 0.1,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+        default_pause: float = 10.0,
+    ):
+        super().__init__(max_rate, burst)
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.default_pause = default_pause
+        self._paused_until = 0.0
+
+    def _wait_for_pause(self) -> float:
+        waited = 0.0
+        while True:
+            with self._lock:
+                pause = self._paused_until - time.monotonic()
+            if pause <= 0:
+                return waited
+            time.sleep(pause)
+            waited += pause
+
+    def acquire(self) -> float:
+        """停止中なら解除まで待ち、トークンを 1 つ消費する。待機した秒数を返す。"""
+        waited = self._wait_for_pause()
+        waited += super().acquire()
+        # トークン待ちの間に 429 を受けていたら、その停止にも従う
+        return waited + self._wait_for_pause()
+
+    def on_success(self) -> None:
+        """正常な応答を受けたときに呼ぶ（加算的にレートを戻す）"""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """429 を受けたときに呼ぶ（レートを乗算的に下げ、Retry-After の間は止める）"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self._paused_until:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+            pause = retry_after if retry_after is not None else self.default_pause
+            self._paused_until = max(self._paused_until, now + pause)
+            # 停止明けにバーストで一気に再送しないよう、貯まっているトークンを捨て、
+            # 停止中は補充しない（_refill は _updated より前の時刻では何もしない）
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = max(self._updated, self._paused_until)
+
+    def estimate_wait(self, requests: int) -> float:
+        """今から requests 件を送り終えるまでの待機秒数の見積もり"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            pause = max(0.0, self._paused_until - now)
+            deficit = max(0.0, requests - self._tokens)
+            return pause + deficit / self.rate
+
+    def budget(self) -> dict:
+        """現在のレート・上限・残りトークン・停止の残り秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "rate": round(self.rate, 3),
+                "max_rate": self.max_rate,
+                "tokens": round(self._tokens, 2),
+                "paused_for": round(max(0.0, self._paused_until - now), 1),
+            }
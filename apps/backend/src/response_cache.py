@@ -0,0 +1,112 @@
+"""API レスポンスキャッシュ
+
+データが変わるのはコレクターの収集サイクルごとだけなので、読み取り系エンドポイントの
+結果をプロセス内に保持し、コレクターの NOTIFY で破棄する。
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Awaitable, Callable, Hashable
+
+_MISS = object()
+
+
+def encoded_size(value: Any) -> int:
+    """エントリが保持するエンコード済み本文のバイト数（bytes と、それを含むタプル）
+
+    行のリストなどエンコード前の値は小さいものしかキャッシュしないので 0 と数える。
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(len(item) for item in value if isinstance(item, (bytes, bytearray)))
+    return 0
+
+
+class ResponseCache:
+    """エンドポイント + パラメータをキーにした LRU キャッシュ
+
+    - max_entries 件か max_bytes バイト（encoded_size の合計、0 で無制限）を超えたら
+      最も使われていないエントリから捨てる。1 件で max_bytes を超える値はキャッシュしない
+    - ttl_seconds は NOTIFY を取りこぼした場合の保険（古くてもこの秒数で失効する）
+    - 同じキーの同時ミスは 1 回の読み込みにまとめ、全員が同じ結果を受け取る
+    - 読み込み中に invalidate された結果はキャッシュしない
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISS
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._evict(key)
+            return _MISS
+        self._entries.move_to_end(key)
+        return value
+
+    def _evict(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        size = encoded_size(value)
+        if key in self._entries:
+            self._evict(key)
+        if self.max_bytes and size > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+            self._evict(next(iter(self._entries)))
+
+    @property
+    def size_bytes(self) -> int:
+        """保持しているエンコード済み本文の合計バイト数"""
+        return self._bytes
+
+    def _on_loaded(self, key: Hashable, generation: int, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        if generation == self._generation:
+            self._store(key, task.result())
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """キャッシュにあれば返し、なければ loader を 1 回だけ実行して結果を共有する。
+
+        読み込みは独立したタスクで行うため、最初に要求したクライアントが切断しても
+        後続の待機者には結果が届く。
+        """
+        value = self._lookup(key)
+        if value is not _MISS:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(loader())
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._on_loaded, key, self._generation))
+        return await asyncio.shield(task)
+
+    def invalidate(self, *_: Any) -> None:
+        """全エントリを破棄する。読み込み中の結果も以後キャッシュしない。"""
+        self._entries.clear()
+        self._bytes = 0
+        self._inflight.clear()
+        self._generation += 1
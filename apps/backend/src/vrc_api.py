@@ -1,8 +1,11 @@
 """VRChat API操作クラス (vrchatapi SDK使用)"""
 
 import os
+import json
 import time
 import logging
+import threading
+from http.cookiejar import Cookie
 from typing import Optional
 from datetime import datetime, timedelta
 
@@ -12,8 +15,32 @@ from vrchatapi.exceptions import UnauthorizedException, ApiException
 from vrchatapi.models.two_factor_auth_code import TwoFactorAuthCode
 import pyotp
 
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from instrumentation import vrc_api_call, observe_rate_limit_wait, VRC_API_RATE_LIMIT_RPS
+
 logger = logging.getLogger(__name__)
 
+USER_AGENT = "vrc-queue-monitor/1.0 (https://github.com/your-repo)"
+
+# ログイン済みセッションの Cookie を保存するファイル（未設定なら保存しない）。
+# 再起動時はこの Cookie で再開し、拒否されたときだけパスワード + 2FA でログインし直す。
+VRC_SESSION_FILE = os.environ.get("VRC_SESSION_FILE", "")
+# 保存する Cookie（auth: セッション、twoFactorAuth: 2FA 済みの記憶）
+_SESSION_COOKIES = ("auth", "twoFactorAuth")
+
+
+class RateLimitedError(ApiException):
+    """VRChat API が 429 を返した。retry_after は Retry-After の秒数（なければ None）。
+
+    呼び出し元は同じサイクル内で後回しにして再試行できる（AdaptiveRateLimiter が停止中は待たせる）。
+    """
+
+    def __init__(self, original: ApiException, retry_after: Optional[float]):
+        super().__init__(status=429, reason=original.reason)
+        self.headers = original.headers
+        self.body = original.body
+        self.retry_after = retry_after
+
 
 class VRChatAPI:
     """VRChat APIクライアント (SDK版)"""
@@ -26,27 +53,164 @@ class VRChatAPI:
         self._authenticated = False
         self._last_login_attempt: Optional[datetime] = None
         self._rate_limit_until: Optional[datetime] = None
+        # ログイン処理は並列収集中の複数スレッドから同時に呼ばれうるため直列化する
+        self._auth_lock = threading.Lock()
+        # 保存済みセッションでの再開はプロセス起動後の最初のログインだけ試す
+        # （認証切れで呼ばれた login() はそのセッションが拒否されたということなので再利用しない）
+        self._try_resume = bool(VRC_SESSION_FILE)
+        # 全 API 呼び出しで共有するリクエスト予算（リクエスト/秒 + バースト）。
+        # VRC_REQUESTS_PER_SECOND は上限で、429 を受けると下げ、正常な応答が続くと戻す
+        self.rate_limiter = AdaptiveRateLimiter(
+            max_rate=float(os.environ.get("VRC_REQUESTS_PER_SECOND", 1.0)),
+            burst=int(os.environ.get("VRC_REQUEST_BURST", 2)),
+            min_rate=float(os.environ.get("VRC_MIN_REQUESTS_PER_SECOND", 0.1)),
+            increase=float(os.environ.get("VRC_RATE_RECOVERY_STEP", 0.05)),
+        )
+        VRC_API_RATE_LIMIT_RPS.set(self.rate_limiter.rate)
 
-    def _extract_retry_after(self, exc) -> Optional[int]:
+    def _extract_retry_after(self, exc) -> Optional[float]:
         """例外の headers から Retry-After 秒数を取り出す。なければ None。"""
         headers = getattr(exc, 'headers', None)
         if not headers:
             return None
-        value = headers.get('Retry-After')
-        if value is None:
-            return None
+        return parse_retry_after(headers.get('Retry-After'))
+
+    def _call(self, method: str, fn, *args, **kwargs):
+        """VRChat API 呼び出しの共通の入口。
+
+        rate_limiter でリクエスト予算を取ってから呼び、結果をリミッターに返す。
+        429 はレートを下げたうえで RateLimitedError（ApiException のサブクラス）にして送出する。
+        """
+        observe_rate_limit_wait("limiter", self.rate_limiter.acquire())
         try:
-            return int(value)
-        except (ValueError, TypeError):
-            return None
+            with vrc_api_call(method):
+                result = fn(*args, **kwargs)
+        except ApiException as e:
+            if e.status != 429:
+                raise
+            retry_after = self._extract_retry_after(e)
+            self.rate_limiter.on_rate_limited(retry_after)
+            VRC_API_RATE_LIMIT_RPS.set(self.rate_limiter.rate)
+            logger.warning(
+                f"Rate limited on {method} (Retry-After: {retry_after}), "
+                f"budget now {self.rate_limiter.budget()}"
+            )
+            raise RateLimitedError(e, retry_after) from e
+        self.rate_limiter.on_success()
+        VRC_API_RATE_LIMIT_RPS.set(self.rate_limiter.rate)
+        return result
+
+    def _build_client(self, configuration: vrchatapi.Configuration) -> None:
+        """APIクライアントと各 API インスタンスを作り直す"""
+        self.api_client = vrchatapi.ApiClient(configuration)
+        self.api_client.user_agent = USER_AGENT
+        self.auth_api = authentication_api.AuthenticationApi(self.api_client)
+        self.groups_api = groups_api.GroupsApi(self.api_client)
+        self.instances_api = instances_api.InstancesApi(self.api_client)
+
+    def _save_session(self) -> None:
+        """現在のセッション Cookie を VRC_SESSION_FILE に保存する（所有者のみ読み書き可）"""
+        if not VRC_SESSION_FILE or self.api_client is None:
+            return
+        cookies = [
+            {**{k: v for k, v in vars(cookie).items() if k != "_rest"}, "rest": cookie._rest}
+            for cookie in self.api_client.rest_client.cookie_jar
+            if cookie.name in _SESSION_COOKIES
+        ]
+        if not cookies:
+            return
+        data = {
+            "username": os.environ.get("VRC_USERNAME"),
+            "host": self.api_client.configuration.host,
+            "saved_at": time.time(),
+            "cookies": cookies,
+        }
+        tmp_path = f"{VRC_SESSION_FILE}.tmp"
+        try:
+            os.makedirs(os.path.dirname(VRC_SESSION_FILE) or ".", exist_ok=True)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, VRC_SESSION_FILE)
+            logger.info(f"Saved VRChat session to {VRC_SESSION_FILE}")
+        except OSError as e:
+            logger.warning(f"Failed to save VRChat session: {e}")
+
+    def _load_session(self, host: str) -> list[Cookie]:
+        """保存済みの Cookie を読む。アカウントや接続先が変わっていれば使わない。"""
+        try:
+            with open(VRC_SESSION_FILE) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable VRChat session file: {e}")
+            return []
+        if data.get("username") != os.environ.get("VRC_USERNAME") or data.get("host") != host:
+            logger.info("Saved VRChat session belongs to another account or host, ignoring")
+            return []
+        now = time.time()
+        try:
+            cookies = [Cookie(**c) for c in data.get("cookies", [])]
+        except TypeError as e:
+            logger.warning(f"Ignoring malformed VRChat session file: {e}")
+            return []
+        return [c for c in cookies if not c.is_expired(now)]
+
+    def _resume_session(self) -> bool:
+        """保存済みの Cookie でセッションを再開し、get_current_user で有効か確かめる。
+
+        資格情報を持たない Configuration を使うため、ここではログイン（Basic 認証）は発生しない。
+        """
+        configuration = vrchatapi.Configuration(host=os.environ.get("VRC_API_BASE_URL") or None)
+        cookies = self._load_session(configuration.host)
+        if not any(c.name == "auth" for c in cookies):
+            return False
+
+        self._build_client(configuration)
+        for cookie in cookies:
+            self.api_client.rest_client.cookie_jar.set_cookie(cookie)
+        try:
+            current_user = self._call("get_current_user", self.auth_api.get_current_user)
+        except UnauthorizedException:
+            logger.info("Saved VRChat session was rejected, logging in again")
+            self.api_client.close()
+            return False
+        except ApiException as e:
+            # 429 なら続くログインも Retry-After まで待たせる
+            retry_after = self._extract_retry_after(e)
+            if retry_after:
+                self._rate_limit_until = datetime.now() + timedelta(seconds=retry_after)
+            logger.warning(f"Could not validate saved VRChat session: {e.status} {e.reason}")
+            self.api_client.close()
+            return False
+        except Exception as e:
+            logger.warning(f"Could not validate saved VRChat session: {e}")
+            self.api_client.close()
+            return False
+
+        self._authenticated = True
+        self._rate_limit_until = None
+        logger.info(f"Resumed saved session as: {current_user.display_name}")
+        return True
 
     def login(self) -> bool:
-        """VRChatにログインし、セッションを確立する"""
+        """VRChatにログインし、セッションを確立する
+
+        VRC_SESSION_FILE があればプロセス起動後の最初の 1 回だけ保存済みセッションでの再開を試し、
+        拒否されたときにパスワード + 2FA でログインする。
+        """
+        if self._try_resume:
+            self._try_resume = False
+            if self._resume_session():
+                return True
+
         # レート制限チェック
         now = datetime.now()
         if self._rate_limit_until and now < self._rate_limit_until:
             wait_seconds = (self._rate_limit_until - now).total_seconds()
             logger.warning(f"Rate limited. Waiting {wait_seconds:.0f} seconds before retry...")
+            observe_rate_limit_wait("retry_after", wait_seconds)
             time.sleep(wait_seconds)
 
         # 最後のログイン試行から最低5秒は待つ
@@ -68,24 +232,19 @@ class VRChatAPI:
             return False
 
         try:
-            # Configuration作成
+            # Configuration作成（VRC_API_BASE_URL で接続先を差し替え可能。負荷試験用のフェイクサーバーなど）
             configuration = vrchatapi.Configuration(
+                host=os.environ.get("VRC_API_BASE_URL") or None,
                 username=username,
                 password=password,
             )
 
-            # APIクライアント作成
-            self.api_client = vrchatapi.ApiClient(configuration)
-            self.api_client.user_agent = "vrc-queue-monitor/1.0 (https://github.com/your-repo)"
-
-            # API インスタンス作成
-            self.auth_api = authentication_api.AuthenticationApi(self.api_client)
-            self.groups_api = groups_api.GroupsApi(self.api_client)
-            self.instances_api = instances_api.InstancesApi(self.api_client)
+            # APIクライアント・API インスタンス作成
+            self._build_client(configuration)
 
             try:
                 # ログイン試行
-                current_user = self.auth_api.get_current_user()
+                current_user = self._call("get_current_user", self.auth_api.get_current_user)
             except UnauthorizedException as e:
                 if e.status == 200:
                     # 2FA必要
@@ -97,10 +256,11 @@ class VRChatAPI:
                         try:
                             totp = pyotp.TOTP(totp_secret)
                             code = totp.now()
-                            self.auth_api.verify2_fa(
-                                two_factor_auth_code=TwoFactorAuthCode(code)
+                            self._call(
+                                "verify2_fa", self.auth_api.verify2_fa,
+                                two_factor_auth_code=TwoFactorAuthCode(code),
                             )
-                            current_user = self.auth_api.get_current_user()
+                            current_user = self._call("get_current_user", self.auth_api.get_current_user)
                         except Exception as e2:
                             logger.error(f"2FA verification failed: {e2}")
                             return False
@@ -120,6 +280,7 @@ class VRChatAPI:
             self._authenticated = True
             self._rate_limit_until = None  # ログイン成功でリセット
             logger.info(f"Logged in as: {current_user.display_name}")
+            self._save_session()
             return True
 
         except ApiException as e:
@@ -140,7 +301,22 @@ class VRChatAPI:
             # 既に認証済みならそのまま返す（毎回チェックしない）
             return True
 
-        return self.login()
+        with self._auth_lock:
+            if self._authenticated and self.auth_api:
+                return True
+            return self.login()
+
+    def _reauthenticate(self, stale_client) -> bool:
+        """認証切れを検知したときに再ログインする。
+
+        並列実行中は複数スレッドが同じ古いセッションで 401 を受け取るため、
+        既に別スレッドがクライアントを作り直していれば再ログインしない。
+        """
+        with self._auth_lock:
+            if self._authenticated and self.api_client is not stale_client:
+                return True
+            self._authenticated = False
+            return self.login()
 
     def get_group_instances(self, group_id: str) -> list[dict]:
         """グループのアクティブなインスタンス一覧を取得"""
@@ -148,10 +324,13 @@ class VRChatAPI:
             return []
 
         try:
-            instances = self.groups_api.get_group_instances(group_id)
+            instances = self._call("get_group_instances", self.groups_api.get_group_instances, group_id)
             logger.info(f"Found {len(instances)} active instances")
             return [inst.to_dict() for inst in instances]
 
+        except RateLimitedError:
+            # 空リストを返すと全インスタンスが非アクティブ化されるため、呼び出し元に知らせる
+            raise
         except ApiException as e:
             logger.error(f"Failed to get group instances: {e}")
             return []
@@ -217,25 +396,35 @@ class VRChatAPI:
         return instance_dict
 
     def get_instance_detail(self, world_id: str, instance_id: str) -> Optional[dict]:
-        """インスタンスの詳細情報（queueSize含む）を取得"""
+        """インスタンスの詳細情報（queueSize含む）を取得
+
+        429 のときは RateLimitedError を送出する（呼び出し元が後で再試行できるように）。
+        それ以外の失敗は None。
+        """
         if not self.ensure_authenticated() or self.instances_api is None:
             return None
+        client = self.api_client
         try:
-            instance = self.instances_api.get_instance(world_id, instance_id)
+            instance = self._call("get_instance_detail", self.instances_api.get_instance, world_id, instance_id)
             return self._normalize_instance_dict(instance)
 
         except UnauthorizedException:
             # 認証切れ → 再ログインして1回だけリトライ
             logger.warning("Authentication expired, re-logging in...")
-            self._authenticated = False
-            if not self.ensure_authenticated() or self.instances_api is None:
+            if not self._reauthenticate(client) or self.instances_api is None:
                 return None
             try:
-                instance = self.instances_api.get_instance(world_id, instance_id)
+                instance = self._call(
+                    "get_instance_detail", self.instances_api.get_instance, world_id, instance_id
+                )
                 return self._normalize_instance_dict(instance)
+            except RateLimitedError:
+                raise
             except Exception as retry_e:
                 logger.error(f"Retry after re-auth failed: {retry_e}")
                 return None
+        except RateLimitedError:
+            raise
         except ApiException as e:
             logger.warning(f"Failed to get instance detail ({world_id}:{instance_id}): {e}")
             return None
@@ -0,0 +1,10 @@
+"""バックエンドの単体テスト（DB 不要）
+
+src/ のモジュールはパッケージではなくフラットに import される前提なので、
+コンテナ内と同じく src/ を import パスに加える。
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from starlette.requests import Request
+
+import api
+from api import _etag_matches, _not_modified, _window_start
+
+
+def make_request(**headers) -> Request:
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+@pytest.mark.parametrize("if_none_match", [
+    'W/"abc"',
+    '"abc"',
+    '"x", W/"abc"',
+    '  W/"abc"  ,"y"',
+    "*",
+])
+def test_etag_matches_weakly(if_none_match):
+    assert _etag_matches(if_none_match, 'W/"abc"')
+
+
+@pytest.mark.parametrize("if_none_match", ['W/"abd"', '"ab"', ""])
+def test_etag_mismatch(if_none_match):
+    assert not _etag_matches(if_none_match, 'W/"abc"')
+
+
+def test_not_modified_by_etag():
+    assert _not_modified(make_request(if_none_match='W/"v1"'), 'W/"v1"', None)
+    assert not _not_modified(make_request(if_none_match='W/"v0"'), 'W/"v1"', None)
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    modified = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+    request = make_request(
+        if_none_match='W/"old"',
+        if_modified_since=format_datetime(modified + timedelta(days=1), usegmt=True),
+    )
+    assert not _not_modified(request, 'W/"new"', modified)
+
+
+def test_not_modified_by_date_ignores_sub_second_part():
+    modified = datetime(2026, 10, 1, 12, 0, 0, 500000, tzinfo=timezone.utc)
+    same_second = make_request(if_modified_since=format_datetime(modified.replace(microsecond=0), usegmt=True))
+    earlier = make_request(if_modified_since=format_datetime(modified - timedelta(seconds=1), usegmt=True))
+    assert _not_modified(same_second, 'W/"v"', modified)
+    assert not _not_modified(earlier, 'W/"v"', modified)
+
+
+def test_unparseable_if_modified_since_is_ignored():
+    modified = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+    assert not _not_modified(make_request(if_modified_since="yesterday"), 'W/"v"', modified)
+    assert not _not_modified(make_request(), 'W/"v"', modified)
+
+
+def test_window_start_moves_in_poll_interval_steps(monkeypatch):
+    monkeypatch.setattr(api, "POLL_INTERVAL_MINUTES", 5)
+    window = timedelta(hours=24)
+    now = datetime(2026, 10, 2, 12, 3, 20, tzinfo=timezone.utc)
+    start = _window_start(window, now)
+    assert start == datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+    # 同じ刻みの中では同じ値（ETag が変わらない）
+    assert _window_start(window, now + timedelta(minutes=1)) == start
+    # 刻みをまたぐと書き込みがなくても変わる
+    assert _window_start(window, now + timedelta(minutes=2)) == start + timedelta(minutes=5)
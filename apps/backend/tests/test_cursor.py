@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from api import _decode_cursor, _encode_cursor
+
+
+def test_round_trip_keeps_microseconds():
+    row = {"timestamp": datetime(2026, 10, 1, 12, 34, 56, 789012, tzinfo=timezone.utc), "instance_id": 42}
+    assert _decode_cursor(_encode_cursor(row)) == (row["timestamp"], 42)
+
+
+def test_round_trip_at_epoch():
+    row = {"timestamp": datetime(1970, 1, 1, tzinfo=timezone.utc), "instance_id": 1}
+    assert _decode_cursor(_encode_cursor(row)) == (row["timestamp"], 1)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "abc",
+        "123",
+        "1-2-3",
+        "-5-1",
+        "1.5-1",
+        "999999999999999999999-1",
+        "1-0",
+        "1-99999999999",
+    ],
+)
+def test_invalid_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        _decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_future_cursor_is_400():
+    future = datetime.now(timezone.utc) + timedelta(days=30)
+    with pytest.raises(HTTPException) as exc:
+        _decode_cursor(_encode_cursor({"timestamp": future, "instance_id": 1}))
+    assert exc.value.status_code == 400
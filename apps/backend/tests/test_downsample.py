@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+from downsample import downsample_by_instance, lttb
+
+T0 = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+
+def series(values, instance_id=1):
+    return [
+        {"timestamp": T0 + timedelta(minutes=i), "instance_id": instance_id, "queue_size": v, "current_users": 0}
+        for i, v in enumerate(values)
+    ]
+
+
+def test_short_series_and_small_threshold_are_unchanged():
+    points = series([1, 2, 3])
+    assert lttb(points, 3) is points
+    assert lttb(points, 2) is points
+    assert lttb([], 10) == []
+
+
+def test_keeps_endpoints_and_threshold_count():
+    points = series([i % 7 for i in range(1000)])
+    sampled = lttb(points, 50)
+    assert len(sampled) == 50
+    assert sampled[0] is points[0] and sampled[-1] is points[-1]
+    assert [p["timestamp"] for p in sampled] == sorted(p["timestamp"] for p in sampled)
+
+
+def test_keeps_isolated_spike():
+    values = [0] * 500
+    values[321] = 90
+    sampled = lttb(series(values), 20)
+    assert any(p["queue_size"] == 90 for p in sampled)
+
+
+def test_spike_in_any_value_key_is_kept():
+    points = series([0] * 300)
+    points[160]["current_users"] = 80
+    assert points[160] in lttb(points, 10)
+    assert points[160] not in lttb(points, 10, value_keys=("queue_size",))
+
+
+def test_null_values_are_treated_as_zero():
+    points = series([None] * 100)
+    assert len(lttb(points, 10)) == 10
+
+
+def test_downsample_by_instance_keeps_order_per_series():
+    rows = series(range(200), instance_id=1) + series(range(50), instance_id=2)
+    rows.sort(key=lambda r: r["timestamp"], reverse=True)
+
+    sampled = downsample_by_instance(rows, 20)
+    assert [r["timestamp"] for r in sampled] == sorted((r["timestamp"] for r in sampled), reverse=True)
+    counts = {1: 0, 2: 0}
+    for row in sampled:
+        counts[row["instance_id"]] += 1
+    assert counts == {1: 20, 2: 20}
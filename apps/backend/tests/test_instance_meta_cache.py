@@ -0,0 +1,28 @@
+from collector import InstanceMetaCache
+
+FIELDS = {"world_name": "World", "capacity": 80, "region": "jp"}
+
+
+def test_unchanged_fields_are_fresh(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("collector.time.monotonic", lambda: now[0])
+    cache = InstanceMetaCache(refresh_seconds=60)
+
+    assert not cache.is_fresh("wrld_a:1", FIELDS)
+    cache.mark_written("wrld_a:1", FIELDS)
+    # キーの順序は指紋に影響しない
+    assert cache.is_fresh("wrld_a:1", dict(reversed(list(FIELDS.items()))))
+    assert not cache.is_fresh("wrld_a:1", {**FIELDS, "capacity": 40})
+
+    now[0] += 60
+    assert not cache.is_fresh("wrld_a:1", FIELDS)
+
+
+def test_retain_evicts_missing_locations():
+    cache = InstanceMetaCache(refresh_seconds=60)
+    cache.mark_written("wrld_a:1", FIELDS)
+    cache.mark_written("wrld_b:2", FIELDS)
+
+    cache.retain(["wrld_b:2"])
+    assert not cache.is_fresh("wrld_a:1", FIELDS)
+    assert cache.is_fresh("wrld_b:2", FIELDS)
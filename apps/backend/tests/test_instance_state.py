@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta, timezone
+
+from collector import InstanceStateTable
+
+
+def ago(minutes: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(minutes=minutes)
+
+
+def db_row(instance_id: int, n_users, queue_enabled, minutes_ago: float) -> dict:
+    """Database.get_latest_metrics の 1 行"""
+    return {
+        "instance_id": instance_id, "n_users": n_users, "queue_enabled": queue_enabled,
+        "timestamp": ago(minutes_ago),
+    }
+
+
+def test_empty_table_is_closed_and_unseeded():
+    table = InstanceStateTable()
+    assert not table.seeded
+    assert not table.any_open()
+
+
+def test_seed_from_db_rows():
+    table = InstanceStateTable()
+    table.seed([db_row(1, None, None, 5), db_row(2, 12, False, 5)])
+    assert table.seeded
+    assert table.any_open()
+
+    closed = InstanceStateTable()
+    closed.seed([db_row(1, 0, False, 5), db_row(2, None, None, 5)])
+    assert closed.seeded
+    assert not closed.any_open()
+
+
+def test_seed_does_not_overwrite_collected_state():
+    table = InstanceStateTable()
+    table.update(1, 0, False, ago(1))
+    table.seed([db_row(1, 30, True, 10)])
+    assert not table.any_open()
+
+
+def test_open_and_close_transitions():
+    table = InstanceStateTable()
+    table.update(1, 0, False, ago(3))
+    assert table.seeded
+    assert not table.any_open()
+
+    table.update(1, 0, True, ago(2))  # 待機列だけ有効でも開いている扱い
+    assert table.any_open()
+    table.update(1, 25, False, ago(1))
+    assert table.any_open()
+    table.update(1, 0, False, ago(0))
+    assert not table.any_open()
+
+
+def test_stale_samples_do_not_count_as_open():
+    table = InstanceStateTable(max_age=timedelta(hours=1))
+    table.update(1, 40, True, ago(61))
+    assert not table.any_open()
+    table.update(2, 1, False, ago(59))
+    assert table.any_open()
+
+
+def test_merge_takes_only_newer_rows():
+    table = InstanceStateTable()
+    table.update(1, 0, False, ago(2))
+    table.merge([db_row(1, 20, True, 5)])  # 手元より古いので無視する
+    assert not table.any_open()
+
+    table.merge([db_row(1, 20, True, 1), db_row(2, 0, False, 1)])
+    assert table.any_open()
+
+
+def test_retain_drops_deactivated_instances():
+    table = InstanceStateTable()
+    table.update(1, 10, False, ago(1))
+    table.update(2, 0, False, ago(1))
+    table.retain([2, 3])
+    assert not table.any_open()
+
+    table.update(1, 10, False, ago(0))
+    assert table.any_open()
+    table.retain([])
+    assert not table.any_open()
+
+
+def test_retain_marks_seeded():
+    table = InstanceStateTable()
+    table.retain([])
+    assert table.seeded
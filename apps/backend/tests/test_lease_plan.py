@@ -0,0 +1,52 @@
+import pytest
+
+from collector import COLLECT_LEASE_GRACE_SECONDS, _plan_leases
+
+
+def test_single_replica_takes_everything_within_rate_budget():
+    plan = _plan_leases(active=40, replicas=1, rate=1.0, time_budget=60, poll_interval=60)
+    assert (plan.share, plan.capacity, plan.limit) == (40, 60, 40)
+
+
+def test_share_is_rounded_up_so_every_instance_is_covered():
+    plan = _plan_leases(active=10, replicas=3, rate=5.0, time_budget=60, poll_interval=60)
+    assert plan.share == 4
+    assert plan.share * 3 >= 10
+
+
+def test_rate_budget_caps_the_share():
+    plan = _plan_leases(active=200, replicas=2, rate=0.5, time_budget=60, poll_interval=300)
+    assert (plan.share, plan.capacity, plan.limit) == (100, 30, 30)
+
+
+@pytest.mark.parametrize("replicas", [0, -1])
+def test_no_live_replicas_counts_as_one(replicas):
+    plan = _plan_leases(active=7, replicas=replicas, rate=1.0, time_budget=60, poll_interval=60)
+    assert plan.share == 7
+
+
+def test_capacity_is_at_least_one_even_when_throttled():
+    plan = _plan_leases(active=5, replicas=1, rate=0.01, time_budget=10, poll_interval=60)
+    assert plan.capacity == 1
+    assert plan.limit == 1
+
+
+def test_lease_and_next_poll_timing():
+    plan = _plan_leases(active=5, replicas=1, rate=1.0, time_budget=60, poll_interval=300)
+    assert plan.lease_seconds == 60 + COLLECT_LEASE_GRACE_SECONDS
+    # main ループの刻みの分だけ早め、ちょうど間隔後のサイクルで取れるようにする
+    assert plan.next_poll_seconds == 295
+    assert _plan_leases(5, 1, 1.0, 3, poll_interval=3).next_poll_seconds == 0
+
+
+def test_switching_to_the_open_interval_shortens_the_due_horizon():
+    # 閉じている間（5 分間隔）に取得したインスタンスは 295 秒先まで先送りされる
+    closed = _plan_leases(active=5, replicas=1, rate=1.0, time_budget=300, poll_interval=300)
+    open_ = _plan_leases(active=5, replicas=1, rate=1.0, time_budget=60, poll_interval=60)
+    # 1 分間隔に切り替わった最初のサイクル（前回の取得から 60 秒後）の時点での残り秒数
+    remaining = closed.next_poll_seconds - 60
+    # claim_instance_leases は今の間隔より先の next_poll_at を「来た」ものとして扱うので、
+    # 切り替え後のサイクルで取り直される
+    assert remaining > open_.next_poll_seconds
+    # 閉じた間隔に戻っても、短い間隔で決めた next_poll_at が先送りされることはない
+    assert open_.next_poll_seconds <= closed.next_poll_seconds
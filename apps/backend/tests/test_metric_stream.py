@@ -0,0 +1,166 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from metric_stream import MetricBroadcaster
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class FakeMetrics:
+    """metrics テーブルの代わり。行は書き込み番号（コミット順）付きで保持する"""
+
+    def __init__(self):
+        self.rows: list[tuple[int, dict]] = []
+        self.version = 0
+        self.fetches: list[int] = []
+        self.gate: asyncio.Event | None = None
+        self.fail = False
+
+    def commit(self, *rows: dict) -> None:
+        self.version += 1
+        self.rows.extend((self.version, row) for row in rows)
+
+    async def fetch_since(self, after_version: int) -> tuple[int, list[dict]]:
+        self.fetches.append(after_version)
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("db down")
+        return self.version, [row for version, row in self.rows if version > after_version]
+
+    async def fetch_latest(self) -> int:
+        return self.version
+
+
+def row(instance_id: int, minute: int) -> dict:
+    return {"instance_id": instance_id, "timestamp": datetime(2026, 10, 1, 12, 0) + timedelta(minutes=minute)}
+
+
+async def settle(broadcaster: MetricBroadcaster) -> None:
+    while broadcaster._task and not broadcaster._task.done():
+        await asyncio.sleep(0)
+
+
+def test_subscribe_starts_at_latest_version_and_advances_by_version():
+    async def main():
+        store = FakeMetrics()
+        store.commit(row(1, 0))
+        broadcaster = MetricBroadcaster(store.fetch_since, store.fetch_latest)
+        queue = await broadcaster.subscribe()
+
+        store.commit(row(1, 10))
+        broadcaster.notify()
+        await settle(broadcaster)
+        assert await queue.get() == [row(1, 10)]
+
+        # 別レプリカが観測時刻の古い行を後からコミットしても、書き込み番号で読むので届く
+        store.commit(row(2, 5))
+        broadcaster.notify()
+        await settle(broadcaster)
+        assert await queue.get() == [row(2, 5)]
+        assert store.fetches == [1, 2]
+
+    run(main())
+
+
+def test_notifies_during_a_fetch_are_coalesced_into_one_more_read():
+    async def main():
+        store = FakeMetrics()
+        broadcaster = MetricBroadcaster(store.fetch_since, store.fetch_latest)
+        queue = await broadcaster.subscribe()
+        store.gate = asyncio.Event()
+
+        store.commit(row(1, 0))
+        broadcaster.notify()
+        await asyncio.sleep(0)
+        for minute in range(1, 4):
+            store.commit(row(1, minute))
+            broadcaster.notify()
+        store.gate.set()
+        await settle(broadcaster)
+
+        # 走行中の 3 回の通知は終了後の 1 回の読み込みにまとまる
+        assert store.fetches == [0, 4]
+        assert await queue.get() == [row(1, m) for m in range(4)]
+        assert queue.empty()
+
+    run(main())
+
+
+def test_slow_subscriber_is_dropped_with_none():
+    async def main():
+        store = FakeMetrics()
+        broadcaster = MetricBroadcaster(store.fetch_since, store.fetch_latest, max_queue=2)
+        slow = await broadcaster.subscribe()
+        fast = await broadcaster.subscribe()
+
+        for minute in range(3):
+            store.commit(row(1, minute))
+            broadcaster.notify()
+            await settle(broadcaster)
+            assert await fast.get() == [row(1, minute)]
+
+        # たまっていたバッチは捨て、切断の合図だけが残る
+        assert slow.get_nowait() is None
+        assert slow.empty()
+        assert broadcaster.subscriber_count == 1
+
+    run(main())
+
+
+def test_notify_without_payload_catches_up_after_reconnect():
+    async def main():
+        store = FakeMetrics()
+        broadcaster = MetricBroadcaster(store.fetch_since, store.fetch_latest)
+        queue = await broadcaster.subscribe()
+
+        # LISTEN 接続が切れている間の書き込みは通知されない
+        store.commit(row(1, 0))
+        store.commit(row(2, 0))
+        # 再接続時は payload なしで呼ばれ、前回の配信位置から読み直す
+        broadcaster.notify(None)
+        await settle(broadcaster)
+        assert await queue.get() == [row(1, 0), row(2, 0)]
+
+    run(main())
+
+
+def test_failed_fetch_keeps_the_watermark():
+    async def main():
+        store = FakeMetrics()
+        broadcaster = MetricBroadcaster(store.fetch_since, store.fetch_latest)
+        queue = await broadcaster.subscribe()
+
+        store.commit(row(1, 0))
+        store.fail = True
+        broadcaster.notify()
+        await settle(broadcaster)
+        assert queue.empty()
+
+        store.fail = False
+        broadcaster.notify()
+        await settle(broadcaster)
+        assert await queue.get() == [row(1, 0)]
+
+    run(main())
+
+
+def test_notify_without_subscribers_does_not_read():
+    async def main():
+        store = FakeMetrics()
+        broadcaster = MetricBroadcaster(store.fetch_since, store.fetch_latest)
+        store.commit(row(1, 0))
+        broadcaster.notify()
+        await settle(broadcaster)
+        assert store.fetches == []
+
+        # 購読者がいない間の行は配信せず、購読開始時点の最新から始める
+        queue = await broadcaster.subscribe()
+        store.commit(row(1, 1))
+        broadcaster.notify()
+        await settle(broadcaster)
+        assert await queue.get() == [row(1, 1)]
+
+    run(main())
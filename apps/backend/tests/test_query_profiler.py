@@ -0,0 +1,56 @@
+import pytest
+
+from query_profiler import is_explainable, normalize_statement
+
+
+def test_normalize_statement_replaces_literals_and_whitespace():
+    query = "SELECT *\n  FROM metrics\n WHERE instance_id = 12 AND note = 'it''s'  AND ratio > 0.5"
+    assert normalize_statement(query) == "SELECT * FROM metrics WHERE instance_id = ? AND note = ? AND ratio > ?"
+
+
+def test_normalize_statement_folds_values_rows():
+    one = normalize_statement("INSERT INTO metrics (a, b) VALUES (1, 'x')")
+    many = normalize_statement(b"INSERT INTO metrics (a, b) VALUES (1, 'x'), (2, 'y'),(3, 'z')")
+    assert one == many == "INSERT INTO metrics (a, b) VALUES (...)"
+
+
+def test_normalize_statement_keeps_identifiers_with_digits():
+    assert normalize_statement("SELECT * FROM metrics_2026_01 WHERE a = 1") == (
+        "SELECT * FROM metrics_2026_01 WHERE a = ?"
+    )
+
+
+def test_normalize_statement_truncates():
+    assert len(normalize_statement("SELECT " + "x, " * 500)) == 300
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM metrics WHERE instance_id = %s",
+    "  select count(*) from instances",
+    b"SELECT m.* FROM metrics m JOIN instances i ON i.id = m.instance_id",
+    "SELECT * FROM event_groups WHERE title = 'FOR UPDATE'",
+    "SELECT 1 FROM pg_locks WHERE locktype = 'advisory'",
+])
+def test_plain_reads_are_explainable(query):
+    assert is_explainable(query)
+
+
+@pytest.mark.parametrize("query", [
+    "INSERT INTO metrics (a) VALUES (1)",
+    "UPDATE instances SET is_active = false",
+    "WITH d AS (DELETE FROM metrics RETURNING *) SELECT count(*) FROM d",
+    "SELECT pg_advisory_xact_lock(%s, %s)",
+    "SELECT pg_try_advisory_lock(%s, %s)",
+    "SELECT CASE WHEN EXISTS (SELECT 1) THEN true ELSE pg_try_advisory_lock(1, 2) END",
+    "SELECT pg_advisory_unlock(%s, %s)",
+    "SELECT pg_notify(%s, %s)",
+    "SELECT nextval('metrics_id_seq')",
+    "SELECT setval('metrics_id_seq', 1)",
+    "SELECT set_config('statement_timeout', '0', false)",
+    "SELECT * FROM instances WHERE id = %s FOR UPDATE",
+    "SELECT * FROM instances FOR NO KEY UPDATE SKIP LOCKED",
+    "SELECT * FROM instances FOR KEY SHARE",
+    "SELECT * INTO metrics_copy FROM metrics",
+])
+def test_side_effecting_statements_are_not_explainable(query):
+    assert not is_explainable(query)
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import rate_limiter
+from rate_limiter import AdaptiveRateLimiter, TokenBucket, parse_retry_after
+
+
+class FakeClock:
+    """time.monotonic / time.sleep の代わり。sleep は時計を進めるだけ"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept += seconds
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(rate_limiter.time, "sleep", fake.sleep)
+    return fake
+
+
+def test_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_burst_then_steady_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # バーストを使い切ったあとは 1 / rate 秒ごと
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert clock.slept == pytest.approx(1.0)
+
+
+def test_idle_refill_is_capped_at_burst(clock):
+    bucket = TokenBucket(rate=1, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 60
+    assert [bucket.acquire() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(1.0)
+
+
+def test_waits_are_reserved_in_arrival_order(monkeypatch, clock):
+    # 待機はロック外で行うため、sleep しなくても後続の予約はさらに 1 / rate 秒後になる
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    bucket = TokenBucket(rate=4, burst=1)
+    waits = [bucket.acquire() for _ in range(4)]
+    assert waits == pytest.approx([0.0, 0.25, 0.5, 0.75])
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [(None, None), ("7", 7.0), (3, 3.0), ("1.5", 1.5), ("-4", 0.0), ("soon", None), ("", None)],
+)
+def test_parse_retry_after_seconds(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=120)
+    assert parse_retry_after(format_datetime(retry_at, usegmt=True)) == pytest.approx(120, abs=2)
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert parse_retry_after(format_datetime(past, usegmt=True)) == 0.0
+
+
+def test_rate_limited_halves_rate_and_pauses(clock):
+    limiter = AdaptiveRateLimiter(max_rate=4, burst=4, min_rate=0.5, default_pause=10)
+    limiter.on_rate_limited(retry_after=3)
+    assert limiter.rate == 2
+    assert limiter.budget()["paused_for"] == 3
+    # 停止明けまで待ち、貯まっていたトークンは捨てられている
+    waited = limiter.acquire()
+    assert waited == pytest.approx(3 + 1 / 2)
+    assert limiter.budget()["paused_for"] == 0
+
+
+def test_429s_during_pause_count_once(clock):
+    limiter = AdaptiveRateLimiter(max_rate=4, min_rate=0.5)
+    limiter.on_rate_limited(retry_after=5)
+    limiter.on_rate_limited(retry_after=2)
+    limiter.on_rate_limited()
+    assert limiter.rate == 2
+    # Retry-After なしは default_pause。長い方の停止を保つ
+    assert limiter.budget()["paused_for"] == 10
+
+
+def test_rate_floor_and_additive_recovery(clock):
+    limiter = AdaptiveRateLimiter(max_rate=1, min_rate=0.2, increase=0.25)
+    for _ in range(5):
+        limiter.on_rate_limited(retry_after=0)
+    assert limiter.rate == 0.2
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate == 1
+
+
+def test_estimate_wait_includes_pause(clock):
+    limiter = AdaptiveRateLimiter(max_rate=2, burst=2)
+    assert limiter.estimate_wait(2) == 0
+    assert limiter.estimate_wait(4) == pytest.approx(1.0)
+    limiter.on_rate_limited(retry_after=5)
+    assert limiter.estimate_wait(2) == pytest.approx(5 + 2 / 1)
@@ -0,0 +1,202 @@
+import asyncio
+
+import pytest
+
+from response_cache import ResponseCache, encoded_size
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_misses_share_one_load():
+    async def main():
+        cache = ResponseCache(max_entries=8, ttl_seconds=60)
+        calls = 0
+        release = asyncio.Event()
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"value": calls}
+
+        waiters = [asyncio.ensure_future(cache.get_or_load("k", loader)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        assert calls == 1
+        assert all(result is results[0] for result in results)
+        assert await cache.get_or_load("k", loader) is results[0]
+        assert (cache.hits, cache.misses) == (1, 5)
+
+    run(main())
+
+
+def test_invalidate_drops_entries():
+    async def main():
+        cache = ResponseCache(max_entries=8, ttl_seconds=60)
+        values = iter([1, 2])
+
+        async def loader():
+            return next(values)
+
+        assert await cache.get_or_load("k", loader) == 1
+        cache.invalidate()
+        assert await cache.get_or_load("k", loader) == 2
+
+    run(main())
+
+
+def test_result_loaded_across_invalidate_is_not_stored():
+    async def main():
+        cache = ResponseCache(max_entries=8, ttl_seconds=60)
+        release = asyncio.Event()
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return calls
+
+        pending = asyncio.ensure_future(cache.get_or_load("k", loader))
+        await asyncio.sleep(0)
+        cache.invalidate()
+        release.set()
+        # 読み込み開始時に待っていた呼び出し元には結果を返すが、キャッシュには残さない
+        assert await pending == 1
+        assert await cache.get_or_load("k", loader) == 2
+
+    run(main())
+
+
+def test_failed_load_is_not_stored():
+    async def main():
+        cache = ResponseCache(max_entries=8, ttl_seconds=60)
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise RuntimeError("db down")
+            return "ok"
+
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load("k", loader)
+        assert await cache.get_or_load("k", loader) == "ok"
+        assert calls == 2
+
+    run(main())
+
+
+def test_waiter_cancel_does_not_cancel_shared_load():
+    async def main():
+        cache = ResponseCache(max_entries=8, ttl_seconds=60)
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return "v"
+
+        first = asyncio.ensure_future(cache.get_or_load("k", loader))
+        second = asyncio.ensure_future(cache.get_or_load("k", loader))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        assert await second == "v"
+
+    run(main())
+
+
+def test_ttl_and_lru_eviction(monkeypatch):
+    async def main():
+        now = [1000.0]
+        monkeypatch.setattr("response_cache.time.monotonic", lambda: now[0])
+        cache = ResponseCache(max_entries=2, ttl_seconds=10)
+        counter = iter(range(100))
+
+        async def loader():
+            return next(counter)
+
+        a = await cache.get_or_load("a", loader)
+        b = await cache.get_or_load("b", loader)
+        assert await cache.get_or_load("a", loader) == a  # a が最近使われた側になる
+        await cache.get_or_load("c", loader)  # 上限 2 件なので b が追い出される
+        assert await cache.get_or_load("a", loader) == a
+        assert await cache.get_or_load("b", loader) != b
+
+        now[0] += 11
+        assert await cache.get_or_load("a", loader) != a
+
+    run(main())
+
+
+def test_byte_budget_evicts_least_recently_used_bodies():
+    async def main():
+        cache = ResponseCache(max_entries=100, ttl_seconds=60, max_bytes=250)
+        loads = []
+
+        def loader_for(key, size):
+            async def loader():
+                loads.append(key)
+                return (b"x" * size, None)
+            return loader
+
+        await cache.get_or_load("a", loader_for("a", 100))
+        await cache.get_or_load("b", loader_for("b", 100))
+        await cache.get_or_load("a", loader_for("a", 100))  # a が最近使われた側になる
+        await cache.get_or_load("c", loader_for("c", 100))  # 300 バイトになるので b が追い出される
+        assert cache.size_bytes == 200
+        await cache.get_or_load("a", loader_for("a", 100))
+        await cache.get_or_load("b", loader_for("b", 100))
+        assert loads == ["a", "b", "c", "b"]
+
+    run(main())
+
+
+def test_body_larger_than_budget_is_not_stored():
+    async def main():
+        cache = ResponseCache(max_entries=100, ttl_seconds=60, max_bytes=50)
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            return b"x" * 51
+
+        await cache.get_or_load("big", loader)
+        await cache.get_or_load("big", loader)
+        assert calls == 2
+        assert cache.size_bytes == 0
+
+    run(main())
+
+
+def test_size_is_released_on_expiry_and_invalidate(monkeypatch):
+    async def main():
+        now = [1000.0]
+        monkeypatch.setattr("response_cache.time.monotonic", lambda: now[0])
+        cache = ResponseCache(max_entries=8, ttl_seconds=10, max_bytes=1000)
+
+        async def loader():
+            return b"x" * 100
+
+        await cache.get_or_load("a", loader)
+        await cache.get_or_load("b", loader)
+        assert cache.size_bytes == 200
+        now[0] += 11
+        await cache.get_or_load("a", loader)  # 期限切れの a を捨てて読み直す
+        assert cache.size_bytes == 200
+        cache.invalidate()
+        assert cache.size_bytes == 0
+
+    run(main())
+
+
+def test_encoded_size():
+    assert encoded_size(b"abc") == 3
+    assert encoded_size((b"abcd", "cursor")) == 4
+    assert encoded_size([{"id": 1}]) == 0
+    assert encoded_size(42) == 0
@@ -0,0 +1,52 @@
+-- Migration: Add rollup tables (1m / 15m / 1h) for long metric ranges
+-- 既存データのバックフィルはコレクター起動時の run_migrations が行う
+CREATE TABLE IF NOT EXISTS metrics_rollup_1m (
+    bucket TIMESTAMP NOT NULL,
+    instance_id INTEGER NOT NULL REFERENCES instances(id) ON DELETE CASCADE,
+    samples INTEGER NOT NULL,
+    queue_size_min SMALLINT NOT NULL,
+    queue_size_max SMALLINT NOT NULL,
+    queue_size_avg REAL NOT NULL,
+    current_users_min SMALLINT NOT NULL,
+    current_users_max SMALLINT NOT NULL,
+    current_users_avg REAL NOT NULL,
+    pc_users_min SMALLINT NOT NULL,
+    pc_users_max SMALLINT NOT NULL,
+    pc_users_avg REAL NOT NULL,
+    PRIMARY KEY (instance_id, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_rollup_1m_bucket ON metrics_rollup_1m (bucket DESC);
+
+CREATE TABLE IF NOT EXISTS metrics_rollup_15m (
+    bucket TIMESTAMP NOT NULL,
+    instance_id INTEGER NOT NULL REFERENCES instances(id) ON DELETE CASCADE,
+    samples INTEGER NOT NULL,
+    queue_size_min SMALLINT NOT NULL,
+    queue_size_max SMALLINT NOT NULL,
+    queue_size_avg REAL NOT NULL,
+    current_users_min SMALLINT NOT NULL,
+    current_users_max SMALLINT NOT NULL,
+    current_users_avg REAL NOT NULL,
+    pc_users_min SMALLINT NOT NULL,
+    pc_users_max SMALLINT NOT NULL,
+    pc_users_avg REAL NOT NULL,
+    PRIMARY KEY (instance_id, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_rollup_15m_bucket ON metrics_rollup_15m (bucket DESC);
+
+CREATE TABLE IF NOT EXISTS metrics_rollup_1h (
+    bucket TIMESTAMP NOT NULL,
+    instance_id INTEGER NOT NULL REFERENCES instances(id) ON DELETE CASCADE,
+    samples INTEGER NOT NULL,
+    queue_size_min SMALLINT NOT NULL,
+    queue_size_max SMALLINT NOT NULL,
+    queue_size_avg REAL NOT NULL,
+    current_users_min SMALLINT NOT NULL,
+    current_users_max SMALLINT NOT NULL,
+    current_users_avg REAL NOT NULL,
+    pc_users_min SMALLINT NOT NULL,
+    pc_users_max SMALLINT NOT NULL,
+    pc_users_avg REAL NOT NULL,
+    PRIMARY KEY (instance_id, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_rollup_1h_bucket ON metrics_rollup_1h (bucket DESC);
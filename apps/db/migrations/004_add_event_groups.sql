@@ -0,0 +1,14 @@
+-- Migration: Add event_groups summary table for /api/event-groups
+-- 既存データのバックフィルはコレクター起動時の run_migrations が行う
+
+CREATE TABLE IF NOT EXISTS event_groups (
+    event_date DATE NOT NULL,
+    instance_id INTEGER NOT NULL REFERENCES instances(id) ON DELETE CASCADE,
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP NOT NULL,
+    peak_queue SMALLINT NOT NULL,
+    peak_users SMALLINT NOT NULL,
+    sample_count INTEGER NOT NULL,
+    PRIMARY KEY (event_date, instance_id)
+);
+CREATE INDEX IF NOT EXISTS idx_event_groups_end_time ON event_groups (end_time DESC);
@@ -0,0 +1,2 @@
+-- Migration: Add instances.updated_at for API conditional responses (ETag / Last-Modified)
+ALTER TABLE instances ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT NOW();
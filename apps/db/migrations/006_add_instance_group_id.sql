@@ -0,0 +1,6 @@
+-- Migration: Add instances.group_id for monitoring multiple groups from one collector
+-- 既存の行は単一グループで起動したコレクターがそのグループに割り当てる
+
+ALTER TABLE instances ADD COLUMN IF NOT EXISTS group_id TEXT;
+CREATE INDEX IF NOT EXISTS idx_instances_group_active
+ON instances (group_id, is_active, created_at DESC);
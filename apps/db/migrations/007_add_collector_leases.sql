@@ -0,0 +1,19 @@
+-- Migration: Add collector_replicas / instance_leases for running several collector replicas
+
+-- コレクターのレプリカ（ハートビートで生存を判定し、リースの取り分を決める）
+CREATE TABLE IF NOT EXISTS collector_replicas (
+    replica_id TEXT PRIMARY KEY,
+    started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    heartbeat_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- インスタンスごとのポーリングのリース（FOR UPDATE SKIP LOCKED で各レプリカが取り合わずに分担する）
+-- leased_until を過ぎたリースは持ち主が落ちたものとみなし、別のレプリカが取り直す
+CREATE TABLE IF NOT EXISTS instance_leases (
+    instance_id INTEGER PRIMARY KEY REFERENCES instances(id) ON DELETE CASCADE,
+    owner TEXT,
+    leased_at TIMESTAMP,
+    leased_until TIMESTAMP,
+    next_poll_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_instance_leases_next_poll ON instance_leases (next_poll_at);
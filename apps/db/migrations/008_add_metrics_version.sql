@@ -0,0 +1,15 @@
+-- Migration: Add a commit-ordered version to metrics (SSE watermark / ETag)
+
+-- metrics への書き込みごとに 1 つ進む番号（1 行だけのテーブル）
+-- コレクターは INSERT と同じトランザクションでこの行を更新するため、行ロックで書き込みが直列化され、
+-- 番号の大小がコミット順と一致する（observed_at の timestamp はレプリカ間でコミット順と一致しない）
+CREATE TABLE IF NOT EXISTS metrics_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+INSERT INTO metrics_version (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+
+-- 各行を書き込んだときの metrics_version.version（これ以前の行は NULL）
+ALTER TABLE metrics ADD COLUMN IF NOT EXISTS version BIGINT;
+CREATE INDEX IF NOT EXISTS idx_metrics_version ON metrics (version) WHERE version IS NOT NULL;
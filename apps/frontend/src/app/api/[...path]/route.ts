@@ -8,9 +8,10 @@
  */
 
 import { NextRequest, NextResponse } from "next/server";
+import { backendRequestHeaders, proxyResponseHeaders } from "@/lib/proxyHeaders";
 
 /** 許可するパスのプレフィックス（バックエンドの既知エンドポイントのみ） */
-const ALLOWED_PATHS = ["instances", "event-groups", "metrics", "config"];
+const ALLOWED_PATHS = ["instances", "event-groups", "metrics", "config", "stream"];
 
 const getBackendUrl = () =>
   process.env.BACKEND_API_URL || "http://localhost:8000";
@@ -29,22 +30,18 @@ export async function GET(
   const backendUrl = `${getBackendUrl()}/api/${path.join("/")}${url.search}`;
 
   try {
-    const reqHeaders = new Headers();
-    // 必要なヘッダーのみ転送（ホストヘッダー等は除外）
-    const accept = request.headers.get("accept");
-    if (accept) reqHeaders.set("accept", accept);
-
     const response = await fetch(backendUrl, {
       method: "GET",
-      headers: reqHeaders,
+      // 必要なヘッダーのみ転送（ホストヘッダー等は除外）
+      // 条件付きリクエストのヘッダーも転送し、バックエンドの 304 をそのまま返す
+      headers: backendRequestHeaders(request.headers),
+      // クライアント切断時にバックエンドへの接続も閉じる（SSE のストリーム用）
+      signal: request.signal,
     });
 
-    const resHeaders = new Headers(response.headers);
-    resHeaders.delete("transfer-encoding");
-
     return new NextResponse(response.body, {
       status: response.status,
-      headers: resHeaders,
+      headers: proxyResponseHeaders(response.headers),
     });
   } catch (error) {
     console.error(`Failed to proxy GET ${backendUrl}:`, error);
@@ -74,7 +74,8 @@ const fetchApi = async (path: string): Promise<Response> => {
   if (typeof window === "undefined") {
     return fetchWithServerFallback(path);
   }
-  return fetch(path, { cache: "no-store" });
+  // ブラウザの HTTP キャッシュを使い、毎回 ETag で再検証する（変化がなければ 304 で本文を転送しない）
+  return fetch(path, { cache: "no-cache" });
 };
 
 /**
@@ -109,6 +110,10 @@ export interface Metric {
 
 export interface InstanceWithMetrics extends Instance {
   metrics: Metric[];
+  /** イベント全体の集計値（メトリクスを間引いても変わらない） */
+  peak_queue?: number | null;
+  peak_users?: number | null;
+  sample_count?: number | null;
 }
 
 export interface EventGroup {
@@ -251,14 +256,22 @@ function generateMockData(): EventGroup[] {
 }
 
 // API呼び出し関数
-export async function fetchEventGroups(days: number = 30): Promise<EventGroup[]> {
+/**
+ * @param maxPoints 指定するとインスタンスごとの系列をサーバー側で最大この点数まで間引く（LTTB）
+ */
+export async function fetchEventGroups(days: number = 30, maxPoints?: number): Promise<EventGroup[]> {
   // モックモード
   if (process.env.NEXT_PUBLIC_USE_MOCK_API === "true") {
     return generateMockData();
   }
 
   try {
-    const res = await fetchApi(`/api/event-groups?days=${days}`);
+    let url = `/api/event-groups?days=${days}`;
+    if (maxPoints) {
+      url += `&max_points=${maxPoints}`;
+    }
+
+    const res = await fetchApi(url);
 
     if (!res.ok) {
       throw new Error(`API error: ${res.status}`);
@@ -296,7 +309,11 @@ export async function fetchInstances(activeOnly: boolean = true): Promise<Instan
   }
 }
 
-export async function fetchMetrics(instanceId?: number, hours: number = 24): Promise<Metric[]> {
+export async function fetchMetrics(
+  instanceId?: number,
+  hours: number = 24,
+  maxPoints?: number,
+): Promise<Metric[]> {
   if (process.env.NEXT_PUBLIC_USE_MOCK_API === "true") {
     return [];
   }
@@ -306,6 +323,9 @@ export async function fetchMetrics(instanceId?: number, hours: number = 24): Pro
     if (instanceId) {
       url += `&instance_id=${instanceId}`;
     }
+    if (maxPoints) {
+      url += `&max_points=${maxPoints}`;
+    }
 
     const res = await fetchApi(url);
 
@@ -320,6 +340,36 @@ export async function fetchMetrics(instanceId?: number, hours: number = 24): Pro
   }
 }
 
+/**
+ * 新着メトリクスを Server-Sent Events で購読する（ブラウザ専用）
+ *
+ * コレクターが保存するたびに、その回の新しいメトリクスが配列で届く。
+ * 接続が切れた場合は EventSource が自動で再接続する。戻り値の関数で購読を終了する。
+ */
+export function subscribeMetrics(
+  onMetrics: (metrics: Metric[]) => void,
+  instanceId?: number,
+): () => void {
+  if (process.env.NEXT_PUBLIC_USE_MOCK_API === "true" || typeof window === "undefined") {
+    return () => {};
+  }
+
+  let url = `/api/stream/metrics`;
+  if (instanceId) {
+    url += `?instance_id=${instanceId}`;
+  }
+
+  const source = new EventSource(url);
+  source.addEventListener("metrics", (event) => {
+    try {
+      onMetrics(JSON.parse((event as MessageEvent<string>).data));
+    } catch (error) {
+      console.error("Failed to parse metrics stream event:", error);
+    }
+  });
+  return () => source.close();
+}
+
 export async function checkApiHealth(): Promise<boolean> {
   if (process.env.NEXT_PUBLIC_USE_MOCK_API === "true") {
     return true;
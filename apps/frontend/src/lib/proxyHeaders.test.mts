@@ -0,0 +1,111 @@
+/**
+ * API プロキシのヘッダー変換のテスト
+ *
+ * gzip で返すバックエンド → fetch + proxyResponseHeaders で中継するプロキシ → クライアント
+ * の 2 段を実際の HTTP サーバーで組み、大きな JSON が壊れずに届くことを確認する。
+ */
+
+import assert from "node:assert/strict";
+import { createServer, type Server } from "node:http";
+import type { AddressInfo } from "node:net";
+import { Readable } from "node:stream";
+import { after, before, test } from "node:test";
+import { gzipSync } from "node:zlib";
+
+import { backendRequestHeaders, proxyResponseHeaders } from "./proxyHeaders.ts";
+
+// 圧縮後の長さと展開後の長さが確実に異なる大きさ
+const rows = Array.from({ length: 20000 }, (_, i) => ({
+  instance_id: i % 40,
+  timestamp: new Date(Date.UTC(2026, 0, 1, 0, i)).toISOString(),
+  total_users: i % 80,
+}));
+const body = JSON.stringify(rows);
+
+let backend: Server;
+let proxy: Server;
+let backendUrl = "";
+let proxyUrl = "";
+let lastAcceptEncoding: string | undefined;
+
+function listen(server: Server): Promise<string> {
+  return new Promise((resolve) => {
+    server.listen(0, "127.0.0.1", () => {
+      const { port } = server.address() as AddressInfo;
+      resolve(`http://127.0.0.1:${port}`);
+    });
+  });
+}
+
+before(async () => {
+  // Accept-Encoding に関係なく gzip で返す（GZipMiddleware が効いた状態を再現）
+  backend = createServer((req, res) => {
+    lastAcceptEncoding = req.headers["accept-encoding"];
+    const compressed = gzipSync(body);
+    res.writeHead(200, {
+      "content-type": "application/json",
+      "content-encoding": "gzip",
+      "content-length": String(compressed.length),
+    });
+    res.end(compressed);
+  });
+  backendUrl = await listen(backend);
+
+  // route.ts と同じ変換で中継する
+  proxy = createServer(async (req, res) => {
+    const incoming = new Headers();
+    for (const [name, value] of Object.entries(req.headers)) {
+      if (typeof value === "string") incoming.set(name, value);
+    }
+    const response = await fetch(backendUrl, { headers: backendRequestHeaders(incoming) });
+    res.writeHead(response.status, Object.fromEntries(proxyResponseHeaders(response.headers)));
+    Readable.fromWeb(response.body!).pipe(res);
+  });
+  proxyUrl = await listen(proxy);
+});
+
+after(() => {
+  backend.closeAllConnections();
+  backend.close();
+  proxy.closeAllConnections();
+  proxy.close();
+});
+
+test("大きな gzip レスポンスを中継しても展開済みの本文として正しく読める", async () => {
+  const response = await fetch(proxyUrl, { headers: { accept: "application/json" } });
+  assert.equal(response.status, 200);
+  assert.equal(response.headers.get("content-encoding"), null);
+  assert.deepEqual(await response.json(), rows);
+});
+
+test("バックエンドには圧縮しないよう求める", async () => {
+  await fetch(proxyUrl);
+  assert.equal(lastAcceptEncoding, "identity");
+});
+
+test("転送するリクエストヘッダーは許可したものだけ", () => {
+  const headers = backendRequestHeaders(
+    new Headers({ host: "example.com", cookie: "a=b", "if-none-match": '"abc"', accept: "text/event-stream" }),
+  );
+  assert.equal(headers.get("host"), null);
+  assert.equal(headers.get("cookie"), null);
+  assert.equal(headers.get("if-none-match"), '"abc"');
+  assert.equal(headers.get("accept"), "text/event-stream");
+});
+
+test("本文の長さと符号化のヘッダーは落とし、それ以外は残す", () => {
+  const headers = proxyResponseHeaders(
+    new Headers({
+      "content-encoding": "gzip",
+      "content-length": "123",
+      "transfer-encoding": "chunked",
+      etag: '"v1"',
+      "cache-control": "no-cache",
+    }),
+  );
+  assert.equal(headers.get("content-encoding"), null);
+  assert.equal(headers.get("content-length"), null);
+  assert.equal(headers.get("transfer-encoding"), null);
+  assert.equal(headers.get("etag"), '"v1"');
+  assert.equal(headers.get("cache-control"), "no-cache");
+});
@@ -0,0 +1,33 @@
+/**
+ * バックエンド API プロキシ（app/api/[...path]/route.ts）のヘッダー変換
+ *
+ * Node の fetch は Accept-Encoding を自動で付け、gzip の本文を展開して返すが、
+ * レスポンスヘッダーの content-encoding / content-length は圧縮時のまま残る。
+ * そのまま転送するとブラウザは展開済みの本文を gzip として読もうとして壊れるため、
+ * バックエンドには圧縮しないよう求め、念のため本文の長さ・符号化のヘッダーも落とす。
+ */
+
+/** ブラウザから転送するリクエストヘッダー（条件付きリクエストを含む） */
+const FORWARDED_REQUEST_HEADERS = ["accept", "if-none-match", "if-modified-since"];
+
+/** 本文をそのまま流さないため転送しないレスポンスヘッダー */
+const DROPPED_RESPONSE_HEADERS = ["transfer-encoding", "content-encoding", "content-length"];
+
+export function backendRequestHeaders(incoming: Headers): Headers {
+  const headers = new Headers();
+  for (const name of FORWARDED_REQUEST_HEADERS) {
+    const value = incoming.get(name);
+    if (value) headers.set(name, value);
+  }
+  // 圧縮は Next.js 側（ブラウザとの間）に任せる
+  headers.set("accept-encoding", "identity");
+  return headers;
+}
+
+export function proxyResponseHeaders(backend: Headers): Headers {
+  const headers = new Headers(backend);
+  for (const name of DROPPED_RESPONSE_HEADERS) {
+    headers.delete(name);
+  }
+  return headers;
+}
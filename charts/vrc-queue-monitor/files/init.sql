@@ -13,7 +13,11 @@ CREATE TABLE IF NOT EXISTS instances (
     instance_type TEXT,
     region TEXT,
     created_at TIMESTAMP NOT NULL DEFAULT NOW(),
-    is_active BOOLEAN NOT NULL DEFAULT TRUE
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    -- 監視対象のグループ（VRC_GROUP_ID）。複数グループ対応前の行は NULL
+    group_id TEXT,
+    -- 最後に upsert / 非アクティブ化された時刻（API の ETag / Last-Modified 用）
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
 -- 既存テーブルへのカラム追加（すでにテーブルが存在していた場合用）
@@ -22,6 +26,12 @@ ALTER TABLE instances ADD COLUMN IF NOT EXISTS world_image_url TEXT;
 ALTER TABLE instances ADD COLUMN IF NOT EXISTS instance_type TEXT;
 ALTER TABLE instances ADD COLUMN IF NOT EXISTS region TEXT;
 ALTER TABLE instances ADD COLUMN IF NOT EXISTS display_name TEXT;
+ALTER TABLE instances ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT NOW();
+ALTER TABLE instances ADD COLUMN IF NOT EXISTS group_id TEXT;
+
+-- グループ単位の絞り込み・非アクティブ化用
+CREATE INDEX IF NOT EXISTS idx_instances_group_active
+ON instances (group_id, is_active, created_at DESC);
 
 -- 時系列メトリクステーブル
 CREATE TABLE IF NOT EXISTS metrics (
@@ -42,3 +52,102 @@ ON metrics (instance_id, timestamp DESC);
 -- タイムスタンプ単体のインデックス（時間範囲クエリ用）
 CREATE INDEX IF NOT EXISTS idx_metrics_timestamp
 ON metrics (timestamp DESC);
+
+-- metrics への書き込みごとに 1 つ進む番号（SSE の配信位置・API の ETag 用）
+-- INSERT と同じトランザクションで更新するため、番号の大小がコミット順と一致する
+CREATE TABLE IF NOT EXISTS metrics_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+INSERT INTO metrics_version (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+
+-- 各行を書き込んだときの metrics_version.version
+ALTER TABLE metrics ADD COLUMN IF NOT EXISTS version BIGINT;
+CREATE INDEX IF NOT EXISTS idx_metrics_version
+ON metrics (version) WHERE version IS NOT NULL;
+
+-- 長期間表示用ロールアップ（コレクターが収集ごとに再集計する）
+-- 値は表示用の派生値（current_users / 有効待機列）のバケット内 min / max / avg
+CREATE TABLE IF NOT EXISTS metrics_rollup_1m (
+    bucket TIMESTAMP NOT NULL,
+    instance_id INTEGER NOT NULL REFERENCES instances(id) ON DELETE CASCADE,
+    samples INTEGER NOT NULL,
+    queue_size_min SMALLINT NOT NULL,
+    queue_size_max SMALLINT NOT NULL,
+    queue_size_avg REAL NOT NULL,
+    current_users_min SMALLINT NOT NULL,
+    current_users_max SMALLINT NOT NULL,
+    current_users_avg REAL NOT NULL,
+    pc_users_min SMALLINT NOT NULL,
+    pc_users_max SMALLINT NOT NULL,
+    pc_users_avg REAL NOT NULL,
+    PRIMARY KEY (instance_id, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_rollup_1m_bucket ON metrics_rollup_1m (bucket DESC);
+
+CREATE TABLE IF NOT EXISTS metrics_rollup_15m (
+    bucket TIMESTAMP NOT NULL,
+    instance_id INTEGER NOT NULL REFERENCES instances(id) ON DELETE CASCADE,
+    samples INTEGER NOT NULL,
+    queue_size_min SMALLINT NOT NULL,
+    queue_size_max SMALLINT NOT NULL,
+    queue_size_avg REAL NOT NULL,
+    current_users_min SMALLINT NOT NULL,
+    current_users_max SMALLINT NOT NULL,
+    current_users_avg REAL NOT NULL,
+    pc_users_min SMALLINT NOT NULL,
+    pc_users_max SMALLINT NOT NULL,
+    pc_users_avg REAL NOT NULL,
+    PRIMARY KEY (instance_id, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_rollup_15m_bucket ON metrics_rollup_15m (bucket DESC);
+
+CREATE TABLE IF NOT EXISTS metrics_rollup_1h (
+    bucket TIMESTAMP NOT NULL,
+    instance_id INTEGER NOT NULL REFERENCES instances(id) ON DELETE CASCADE,
+    samples INTEGER NOT NULL,
+    queue_size_min SMALLINT NOT NULL,
+    queue_size_max SMALLINT NOT NULL,
+    queue_size_avg REAL NOT NULL,
+    current_users_min SMALLINT NOT NULL,
+    current_users_max SMALLINT NOT NULL,
+    current_users_avg REAL NOT NULL,
+    pc_users_min SMALLINT NOT NULL,
+    pc_users_max SMALLINT NOT NULL,
+    pc_users_avg REAL NOT NULL,
+    PRIMARY KEY (instance_id, bucket)
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_rollup_1h_bucket ON metrics_rollup_1h (bucket DESC);
+
+-- イベントグループ集計（イベント日付 = インスタンス作成時刻の JST 日付 × インスタンス）
+-- コレクターが metrics の INSERT と同じ文で更新する
+CREATE TABLE IF NOT EXISTS event_groups (
+    event_date DATE NOT NULL,
+    instance_id INTEGER NOT NULL REFERENCES instances(id) ON DELETE CASCADE,
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP NOT NULL,
+    peak_queue SMALLINT NOT NULL,
+    peak_users SMALLINT NOT NULL,
+    sample_count INTEGER NOT NULL,
+    PRIMARY KEY (event_date, instance_id)
+);
+CREATE INDEX IF NOT EXISTS idx_event_groups_end_time ON event_groups (end_time DESC);
+
+-- コレクターのレプリカ（ハートビートで生存を判定し、リースの取り分を決める）
+CREATE TABLE IF NOT EXISTS collector_replicas (
+    replica_id TEXT PRIMARY KEY,
+    started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    heartbeat_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- インスタンスごとのポーリングのリース（FOR UPDATE SKIP LOCKED で各レプリカが取り合わずに分担する）
+-- leased_until を過ぎたリースは持ち主が落ちたものとみなし、別のレプリカが取り直す
+CREATE TABLE IF NOT EXISTS instance_leases (
+    instance_id INTEGER PRIMARY KEY REFERENCES instances(id) ON DELETE CASCADE,
+    owner TEXT,
+    leased_at TIMESTAMP,
+    leased_until TIMESTAMP,
+    next_poll_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_instance_leases_next_poll ON instance_leases (next_poll_at);